@@ -0,0 +1,96 @@
+"""
+Gunicorn configuration, picked up from the working directory.
+Sized for small containers (the App Runner instance has 0.25 vCPU and 0.5 GB),
+every setting can be overridden via a `GUNICORN_<SETTING>` environment variable,
+e.g. `GUNICORN_WORKERS=2`.
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+import contextlib
+import gc
+import json
+import os
+from pathlib import Path
+
+# resident memory of a worker with the app loaded, which bounds the worker count
+WORKER_MEMORY = 160 * 2**20
+
+
+def env(name, default):
+    """Returns the JSON decoded `GUNICORN_<name>` environment variable."""
+    value = os.environ.get(f"GUNICORN_{name}")
+    return default if value is None else json.loads(value)
+
+
+def get_cpu_limit():
+    """Returns the (possibly fractional) CPUs available, honouring the cgroup quota."""
+    with contextlib.suppress(OSError, ValueError):
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    return os.cpu_count() or 1
+
+
+def get_memory_limit():
+    """Returns the memory available in bytes, honouring the cgroup limit."""
+    with contextlib.suppress(OSError, ValueError):
+        limit = Path("/sys/fs/cgroup/memory.max").read_text().strip()
+        if limit != "max":
+            return int(limit)
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def get_default_workers(cpus, memory):
+    """
+    The usual `2 * CPUs + 1`, capped by how many workers fit in memory.
+    A fraction of a CPU gets a single worker, concurrency then comes from threads.
+    """
+    return max(1, min(int(cpus * 2) + 1, memory // WORKER_MEMORY))
+
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = env("WORKERS", get_default_workers(get_cpu_limit(), get_memory_limit()))
+# requests mostly wait on the database and upstream APIs, threads overlap them
+threads = env("THREADS", 4)
+# loads the app once in the master, workers then share its memory pages
+preload_app = env("PRELOAD_APP", True)
+# keeps the garbage collector of the workers from writing to the objects shared
+# with the master, which would copy their memory pages, see `when_ready()`
+gc_freeze = preload_app and env("GC_FREEZE", True)
+# recycles workers to bound memory growth, the jitter avoids restarting them all
+# at once
+max_requests = env("MAX_REQUESTS", 1000)
+max_requests_jitter = env("MAX_REQUESTS_JITTER", 100)
+timeout = env("TIMEOUT", 30)
+graceful_timeout = env("GRACEFUL_TIMEOUT", 30)
+# longer than the default 2s so the load balancer can reuse connections
+keepalive = env("KEEPALIVE", 5)
+# the heartbeat file, in memory rather than on the container's overlay filesystem
+worker_tmp_dir = os.environ.get(
+    "GUNICORN_WORKER_TMP_DIR", "/dev/shm" if Path("/dev/shm").is_dir() else None
+)
+
+
+if gc_freeze:
+    # not collecting while loading the app avoids leaving freed holes in the
+    # memory pages, later filled in and copied by the workers
+    gc.disable()
+
+
+def when_ready(server):
+    """Called in the master, after loading the app and before forking the workers."""
+    try:
+        # e.g. `--no-preload` on the command line, nothing got loaded to share
+        if not server.cfg.preload_app:
+            return
+        from main.preload import warm_up
+
+        warm_up()
+        if gc_freeze:
+            # moves every tracked object to a permanent generation, ignored by the
+            # collections of the master and its forks
+            gc.freeze()
+    finally:
+        # even if warming up failed, the workers would otherwise never collect
+        gc.enable()
@@ -0,0 +1,140 @@
+"""
+Fires concurrent requests at the async views, served in process via ASGI, with each
+upstream (Stripe, OneSignal and SMTP) stubbed to answer after `LATENCY` seconds.
+Compares the wall time of sending them one at a time, i.e. what a single sync
+worker does, with sending them all at once to the same event loop.
+"""
+
+import asyncio
+import time
+from datetime import date
+from unittest import mock
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from nurse.models import Nurse, Patient, Prescription
+from payment.models import StripeProduct, Subscription
+
+LATENCY = 0.2
+CONCURRENCY = 20
+
+
+def stripe_call(*args, **kwargs):
+    # blocking, like the `requests` based client
+    time.sleep(LATENCY)
+    # expired already, so every request creates a new session
+    return mock.Mock(
+        id="cs_bench", url="https://checkout.stripe.com/pay/cs_bench", expires_at=0
+    )
+
+
+async def onesignal_call(*args, **kwargs):
+    await asyncio.sleep(LATENCY)
+
+
+def smtp_call(*args, **kwargs):
+    # blocking, like the actual SMTP exchange
+    time.sleep(LATENCY)
+
+
+@pytest.fixture
+def upstreams(settings):
+    settings.ONESIGNAL_APP_ID = settings.ONESIGNAL_API_KEY = "bench"
+    stripe_client = mock.Mock()
+    stripe_client.checkout.sessions.create = stripe_call
+    stripe_client.subscriptions.update = stripe_call
+    with mock.patch(
+        "payment.views.get_stripe_client", return_value=stripe_client
+    ), mock.patch(
+        "nurse.management.commands._notifications.get_notification_body",
+        return_value={"include_subscription_ids": ["123"]},
+    ), mock.patch(
+        "onesignal_sdk.client.AsyncClient.send_notification",
+        onesignal_call,
+    ), mock.patch(
+        "nurse.views.send_mail_with_reply", smtp_call
+    ):
+        yield
+
+
+@pytest.fixture
+def token(db):
+    user = User.objects.create(
+        username="nurse@example.com",
+        first_name="John",
+        last_name="Doe",
+        email="nurse@example.com",
+        is_staff=True,
+    )
+    patient = Patient.objects.create(firstname="John", lastname="Leen")
+    Nurse.objects.create(user=user).patients.add(patient)
+    Prescription.objects.create(
+        id=1,
+        prescribing_doctor="Dr Leen",
+        email_doctor="doctor@example.com",
+        start_date=date(2024, 1, 1),
+        end_date=date(2024, 12, 31),
+        patient=patient,
+    )
+    StripeProduct.objects.create(
+        name="Essentiel",
+        monthly_price_id="price_monthly",
+        annual_price_id="price_annual",
+    )
+    Subscription.objects.create(user=user, stripe_subscription_id="sub_bench")
+    return Token.objects.create(user=user).key
+
+
+def get_endpoints():
+    return {
+        "stripe checkout": (
+            reverse("v1:payment:subscription-list"),
+            {"plan": "monthly"},
+        ),
+        "stripe cancel": (reverse("v1:payment:subscription-user-cancel"), {}),
+        "onesignal notify": (reverse("v1:notify"), {}),
+        "smtp send email": (
+            reverse("v1:send-email-to-doctor", kwargs={"pk": 1}),
+            {"additional_info": "Bench"},
+        ),
+    }
+
+
+async def post(client, url, data, token):
+    response = await client.post(
+        url,
+        data,
+        content_type="application/json",
+        headers={"Authorization": f"Token {token}"},
+    )
+    assert response.status_code < 300, response.content
+
+
+async def run_sequential(url, data, token):
+    client = AsyncClient()
+    for _ in range(CONCURRENCY):
+        await post(client, url, data, token)
+
+
+async def run_concurrent(url, data, token):
+    client = AsyncClient()
+    await asyncio.gather(*(post(client, url, data, token) for _ in range(CONCURRENCY)))
+
+
+def test_async_views(upstreams, token):
+    print(f"\n{CONCURRENCY} requests, {LATENCY * 1000:.0f} ms upstream latency")
+    print(f"{'endpoint':<20}{'mode':>12}{'wall (s)':>10}{'req/s':>8}")
+    for name, (url, data) in get_endpoints().items():
+        for mode, run in (
+            ("sequential", run_sequential),
+            ("concurrent", run_concurrent),
+        ):
+            start = time.perf_counter()
+            async_to_sync(run)(url, data, token)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<20}{mode:>12}{elapsed:>10.2f}{CONCURRENCY / elapsed:>8.1f}")
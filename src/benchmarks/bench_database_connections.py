@@ -0,0 +1,95 @@
+"""
+Compares the request latency with a new database connection per request, with
+persistent connections and with a connection pool.
+Requires PostgreSQL, e.g. a local one:
+
+    DATABASE_ENGINE=django.db.backends.postgresql DATABASE_NAME=mynotif \\
+    DATABASE_USER=postgres DATABASE_PASSWORD=postgres DATABASE_HOST=localhost \\
+    pytest -s benchmarks/bench_database_connections.py
+
+The pool mode also requires psycopg 3 (the `pool` extra).
+"""
+
+import copy
+import importlib.util
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+
+from helpers.stats import percentile
+from nurse.models import Nurse, Patient
+
+REQUESTS = 500
+MODES = {
+    "new connection": {"CONN_MAX_AGE": 0},
+    "persistent": {"CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": True},
+    "pool": {"CONN_MAX_AGE": 0, "OPTIONS": {"pool": True}},
+}
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="requires PostgreSQL"
+)
+
+
+@pytest.fixture
+def token(transactional_db):
+    user = User.objects.create(username="nurse@example.com")
+    nurse = Nurse.objects.create(user=user)
+    for index in range(10):
+        nurse.patients.add(Patient.objects.create(firstname=f"Patient {index}"))
+    return Token.objects.create(user=user).key
+
+
+@pytest.fixture
+def settings_dict():
+    """Restores the connection settings altered by the modes."""
+    settings_dict = copy.deepcopy(connection.settings_dict)
+    yield connection.settings_dict
+    connection.close()
+    if hasattr(connection, "close_pool"):
+        connection.close_pool()
+    connection.settings_dict = settings_dict
+
+
+def request(handler, environ):
+    """
+    Goes through the WSGI handler like a server would, as the test client doesn't
+    close the connections at the end of the requests.
+    """
+    response = handler(environ, lambda status, headers: None)
+    b"".join(response)
+    response.close()
+    assert response.status_code == 200, response.content
+
+
+def test_database_connections(token, settings_dict):
+    handler = WSGIHandler()
+    environ = (
+        RequestFactory()
+        .get("/api/v1/patient/", HTTP_AUTHORIZATION=f"Token {token}")
+        .environ
+    )
+    print(f"\n{REQUESTS} requests to /api/v1/patient/")
+    print(f"{'mode':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}")
+    for mode, mode_settings in MODES.items():
+        if "pool" in mode_settings.get("OPTIONS", {}):
+            if importlib.util.find_spec("psycopg_pool") is None:
+                print(f"{mode:<16}skipped, requires psycopg 3 with psycopg_pool")
+                continue
+        connection.close()
+        settings_dict.update(mode_settings)
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            request_start = time.perf_counter()
+            request(handler, environ.copy())
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        print(f"{mode:<16}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}{REQUESTS / elapsed:>9.1f}")
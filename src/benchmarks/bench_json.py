@@ -0,0 +1,70 @@
+"""
+Compares rendering and parsing a patient list, with the nested prescriptions of
+each patient, through DRF's `JSONRenderer`/`JSONParser` (stdlib `json`) and their
+orjson counterparts.
+"""
+
+import io
+import time
+from datetime import date
+
+import pytest
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from main.parsers import ORJSONParser
+from main.renderers import ORJSONRenderer
+from nurse.models import Patient, Prescription
+from nurse.serializers import PatientSerializer
+
+PATIENTS = 100
+PRESCRIPTIONS = 3
+ITERATIONS = 200
+
+
+@pytest.fixture
+def patients(db):
+    for index in range(PATIENTS):
+        patient = Patient.objects.create(
+            firstname=f"Zoé {index}",
+            lastname="Leen",
+            street="1 rue de la Paix",
+            zip_code="75001",
+            city="Paris",
+            phone="0600000000",
+            birthday=date(1950, 1, 1),
+            health_card_number="123456789",
+            ss_provider_code="12345",
+        )
+        Prescription.objects.bulk_create(
+            Prescription(
+                prescribing_doctor="Dr Leen",
+                email_doctor="doctor@example.com",
+                start_date=date(2024, 1, 1),
+                end_date=date(2024, 12, 31),
+                patient=patient,
+            )
+            for _ in range(PRESCRIPTIONS)
+        )
+    return PatientSerializer(Patient.objects.all(), many=True).data
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        function(*args)
+    return (time.perf_counter() - start) / ITERATIONS * 1000
+
+
+def test_json(patients):
+    body = JSONRenderer().render(patients)
+    print(f"\n{PATIENTS} patients, {PRESCRIPTIONS} prescriptions each, {len(body)} B")
+    print(f"{'':<16}{'render ms':>10}{'parse ms':>10}")
+    for name, renderer, parser in (
+        ("json", JSONRenderer(), JSONParser()),
+        ("orjson", ORJSONRenderer(), ORJSONParser()),
+    ):
+        assert renderer.render(patients) == body
+        render = measure(renderer.render, patients)
+        parse = measure(lambda: parser.parse(io.BytesIO(body)))
+        print(f"{name:<16}{render:>10.3f}{parse:>10.3f}")
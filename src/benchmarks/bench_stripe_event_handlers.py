@@ -0,0 +1,81 @@
+"""
+Replays the recorded Stripe event stream through the webhook handlers, reporting
+the number of queries and the time spent per event type.
+"""
+
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from payment.models import StripeEvent
+from payment.stripe_event_handlers import (
+    handle_event,
+    process_pending_events,
+    store_event,
+)
+
+EVENTS_PATH = Path(__file__).parent / "data" / "stripe_events.jsonl"
+ROUNDS = 20
+
+
+@pytest.fixture
+def events(db):
+    """The recorded events, with their `user_id` pointing to actual users."""
+    events = [json.loads(line) for line in EVENTS_PATH.read_text().splitlines()]
+    user_ids = {}
+    for event in events:
+        metadata = event["data"]["object"].get("metadata", {})
+        if "user_id" in metadata:
+            user_id = metadata["user_id"]
+            if user_id not in user_ids:
+                user_ids[user_id] = User.objects.create(
+                    username=f"nurse{user_id}@example.com"
+                ).id
+            metadata["user_id"] = str(user_ids[user_id])
+    return events
+
+
+def report(title, stats):
+    print(f"\n{title}")
+    print(f"{'event type':<32}{'events':>8}{'queries/event':>15}{'ms/event':>10}")
+    for event_type, (count, queries, seconds) in sorted(stats.items()):
+        print(
+            f"{event_type:<32}{count:>8}{queries / count:>15.1f}"
+            f"{seconds * 1000 / count:>10.2f}"
+        )
+
+
+def test_handlers(events):
+    stats = defaultdict(lambda: [0, 0, 0.0])
+    for _ in range(ROUNDS):
+        for event in events:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                handle_event(event)
+                elapsed = time.perf_counter() - start
+            stat = stats[event["type"]]
+            stat[0] += 1
+            stat[1] += len(queries)
+            stat[2] += elapsed
+    report(f"Handlers, {len(events)} events x {ROUNDS} rounds", stats)
+
+
+def test_pipeline(events):
+    """Stores then processes the stream, as the webhook and the worker would."""
+    start = time.perf_counter()
+    for round in range(ROUNDS):
+        for event in events:
+            store_event({**event, "id": f"{event['id']}_{round}"})
+    stored = time.perf_counter() - start
+    start = time.perf_counter()
+    processed = process_pending_events()
+    elapsed = time.perf_counter() - start
+    assert processed == StripeEvent.objects.count() == len(events) * ROUNDS
+    print(f"\nStored {processed} events at {processed / stored:.0f} events/s")
+    print(f"Processed {processed} events at {processed / elapsed:.0f} events/s")
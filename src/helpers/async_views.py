@@ -0,0 +1,55 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.decorators import classonlymethod
+from rest_framework.views import APIView
+
+
+class AsyncDispatchMixin:
+    """
+    Dispatches to coroutine handlers, so waiting on upstream services doesn't tie up
+    a worker when served via ASGI (it's run in an event loop thread under WSGI).
+    The authentication, permission and throttling checks, as well as the remaining
+    synchronous handlers, run in a thread as they query the database synchronously.
+    """
+
+    # rather than Django's check that the handlers are either all sync or all async
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+            if not iscoroutinefunction(handler):
+                handler = sync_to_async(handler)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncDispatchMixin, APIView):
+    """`APIView` with `async def` handlers."""
+
+
+class AsyncViewSetMixin(AsyncDispatchMixin):
+    """
+    Allows viewsets to mix `async def` actions, e.g. calling an upstream service,
+    with regular synchronous ones.
+    """
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        # `ViewSetMixin.as_view()` doesn't mark the view as async like `View` does
+        return markcoroutinefunction(super().as_view(actions, **initkwargs))
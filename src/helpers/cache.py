@@ -0,0 +1,85 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+# how long a lock is held at most, in case its holder died, and waited for by
+# default (in seconds)
+LOCK_TIMEOUT = 10
+# how often the waiting callers check whether the lock got released (in seconds)
+LOCK_POLL_INTERVAL = 0.05
+
+# the local memory cache is per process and the file one per instance
+SHARED_CACHE_BACKENDS = ("database", "redis")
+
+
+def is_cache_shared():
+    """
+    Returns whether the cache is shared by the workers of all the instances, i.e.
+    whether its locks hold across them.
+    """
+    return settings.CACHE_BACKEND in SHARED_CACHE_BACKENDS
+
+
+class CacheNamespace:
+    """
+    The keys of a kind of cached values, prefixed with the namespace `name` and
+    versioned, bumping `version` when the values change shape ignores the ones
+    cached by the previous deployments, the cache being shared and persistent.
+    """
+
+    def __init__(self, name, version=1):
+        self.name = name
+        self.version = version
+
+    def make_key(self, key):
+        return f"{self.name}:{key}"
+
+    def get(self, key, default=None):
+        return cache.get(self.make_key(key), default, version=self.version)
+
+    async def aget(self, key, default=None):
+        return await cache.aget(self.make_key(key), default, version=self.version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        cache.set(self.make_key(key), value, timeout, version=self.version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT):
+        await cache.aset(self.make_key(key), value, timeout, version=self.version)
+
+    def get_many(self, keys):
+        """Returns the cached values of `keys`, in a single round trip, by key."""
+        keys = {self.make_key(key): key for key in keys}
+        values = cache.get_many(keys, version=self.version)
+        return {keys[key]: value for key, value in values.items()}
+
+    def set_many(self, values, timeout=DEFAULT_TIMEOUT):
+        values = {self.make_key(key): value for key, value in values.items()}
+        cache.set_many(values, timeout, version=self.version)
+
+    def delete(self, key):
+        cache.delete(self.make_key(key), version=self.version)
+
+    @contextmanager
+    def lock(self, key, timeout=None):
+        """
+        Holds the lock on `key`, across threads and processes, waiting up to
+        `timeout` seconds (`LOCK_TIMEOUT` by default) for the current holder to
+        release it.
+        Yields whether it got acquired, the lock expiring after `timeout` seconds
+        in case its holder died without releasing it.
+        """
+        timeout = timeout or LOCK_TIMEOUT
+        lock_key = self.make_key(f"{key}:lock")
+        deadline = time.monotonic() + timeout
+        while not (locked := cache.add(lock_key, True, timeout, self.version)):
+            if time.monotonic() > deadline:
+                break
+            time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield locked
+        finally:
+            if locked:
+                cache.delete(lock_key, version=self.version)
@@ -0,0 +1,7 @@
+import math
+
+
+def percentile(values, percent):
+    """Returns the nearest-rank percentile of the sorted `values`."""
+    index = max(math.ceil(len(values) * percent / 100) - 1, 0)
+    return values[index]
@@ -0,0 +1,31 @@
+import contextvars
+
+REPLICA = "replica"
+# read from the primary regardless, e.g. so a token works right after it's issued
+PRIMARY_APP_LABELS = {"authtoken", "sessions"}
+
+# set by `ReplicaRoutingMiddleware` for the requests whose reads may be stale
+use_replica = contextvars.ContextVar("use_replica", default=False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends the reads of the safe (e.g. GET) requests to the replica, everything
+    else goes to the primary, i.e. the `default` database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and model._meta.app_label not in PRIMARY_APP_LABELS:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # the replica gets the schema through replication
+        return db != REPLICA
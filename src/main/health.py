@@ -0,0 +1,69 @@
+"""
+The readiness checks answered on `/readyz` by `HealthCheckMiddleware`.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+
+MISSING = object()
+
+_lock = threading.Lock()
+# `(checked_at, reason)` of the last check, the reason being None when ready
+_result = None
+# the migrations don't get unapplied while the process runs, checked until applied
+_migrated = False
+
+
+def check_database(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def has_unapplied_migrations(connection):
+    executor = MigrationExecutor(connection)
+    return bool(executor.migration_plan(executor.loader.graph.leaf_nodes()))
+
+
+def check_readiness():
+    """Returns why the app can't serve requests, or None if it can."""
+    global _migrated
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        check_database(connection)
+        if not _migrated:
+            if has_unapplied_migrations(connection):
+                return "unapplied migrations"
+            _migrated = True
+    except DatabaseError:
+        return "database unavailable"
+    return None
+
+
+def get_cached_readiness():
+    """
+    Returns the reason of the last check, None if ready, or `MISSING` if it's older
+    than `HEALTH_CHECK_CACHE_SECONDS`.
+    """
+    if _result is None:
+        return MISSING
+    checked_at, reason = _result
+    if time.monotonic() - checked_at > settings.HEALTH_CHECK_CACHE_SECONDS:
+        return MISSING
+    return reason
+
+
+def get_readiness():
+    """
+    Same as `check_readiness()`, cached so the checks of a burst, from several load
+    balancer nodes, query the database once.
+    """
+    global _result
+    with _lock:
+        if (reason := get_cached_readiness()) is MISSING:
+            reason = check_readiness()
+            _result = (time.monotonic(), reason)
+        return reason
@@ -0,0 +1,60 @@
+import http.client
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+def make_connection(url):
+    """Returns a keep-alive connection to the server at `url`."""
+    parts = urlsplit(url)
+    connection_class = (
+        http.client.HTTPSConnection
+        if parts.scheme == "https"
+        else http.client.HTTPConnection
+    )
+    return connection_class(parts.netloc, timeout=30)
+
+
+def get(connection, path, headers):
+    """Sends a GET request over the connection, returns the response status."""
+    try:
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+    except (http.client.HTTPException, OSError):
+        # reconnects on the next request
+        connection.close()
+        return None
+    return response.status
+
+
+def load_test(url, paths, concurrency=1, duration=10, headers=None):
+    """
+    Sends GET requests to the `paths` of the server at `url` in turn, from
+    `concurrency` clients for `duration` seconds, returns the sorted latencies in
+    seconds, the error count and the elapsed time.
+    """
+    headers = headers or {}
+    deadline = time.perf_counter() + duration
+
+    def run_client(_):
+        connection = make_connection(url)
+        latencies = []
+        errors = 0
+        while time.perf_counter() < deadline:
+            path = paths[len(latencies) % len(paths)]
+            start = time.perf_counter()
+            status = get(connection, path, headers)
+            latencies.append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                errors += 1
+        connection.close()
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run_client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for client, _ in results for latency in client)
+    errors = sum(client_errors for _, client_errors in results)
+    return latencies, errors, elapsed
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+PROC = Path("/proc")
+# fields of `smaps_rollup`, in kB
+FIELDS = (
+    "Rss",
+    "Pss",
+    "Shared_Clean",
+    "Shared_Dirty",
+    "Private_Clean",
+    "Private_Dirty",
+)
+
+
+def read_smaps_rollup(pid, proc=PROC):
+    """Returns the memory usage of the process in bytes, per `smaps_rollup` field."""
+    usage = {}
+    for line in (proc / str(pid) / "smaps_rollup").read_text().splitlines():
+        name, _, value = line.partition(":")
+        if name in FIELDS:
+            usage[name] = int(value.split()[0]) * 1024
+    return usage
+
+
+def get_children(pid, proc=PROC):
+    """Returns the ids of the child processes, e.g. the workers of a gunicorn master."""
+    children = []
+    for stat in proc.glob("[0-9]*/stat"):
+        try:
+            # the command name, in between parentheses, may contain spaces
+            fields = stat.read_text().rpartition(")")[2].split()
+        except OSError:
+            # exited in the meantime
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return sorted(children)
+
+
+def get_memory_usage(pid, proc=PROC):
+    """
+    Returns the memory usage of the process and of its children, as a list of
+    `(pid, usage)`, the process coming first.
+    `Pss` accounts the pages shared between processes proportionally, the sum over
+    the processes being the memory they actually use.
+    """
+    return [
+        (process, read_smaps_rollup(process, proc))
+        for process in (pid, *get_children(pid, proc))
+    ]
@@ -0,0 +1,66 @@
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+# what a worker imports before serving its first request
+STARTUP_CODE = """
+from django.urls import get_resolver
+
+from main.wsgi import application
+
+get_resolver().url_patterns
+"""
+# e.g. `import time:      1848 |    1210028 |     stripe`, in microseconds, the
+# nesting level being the indentation
+IMPORT_TIME = re.compile(r"^import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)$")
+
+
+def parse_import_times(output):
+    """
+    Returns the `(module, level, self_us, cumulative_us)` of the `-X importtime`
+    output lines, in the order the imports completed.
+    The modules imported via `importlib.import_module()`, e.g. the settings and the
+    URLconf, aren't reported, the imports they make then come up as top level.
+    """
+    imports = []
+    for line in output.splitlines():
+        if match := IMPORT_TIME.match(line):
+            own, cumulative, indent, module = match.groups()
+            imports.append((module, (len(indent) - 1) // 2, int(own), int(cumulative)))
+    return imports
+
+
+def get_import_time(imports):
+    """Returns the time spent in the reported imports, in microseconds."""
+    return sum(cumulative for _, level, _, cumulative in imports if level == 0)
+
+
+def get_package_times(imports):
+    """Returns the time spent importing each top level package, in microseconds."""
+    times = defaultdict(int)
+    for module, _, own, _ in imports:
+        times[module.partition(".")[0]] += own
+    return dict(times)
+
+
+def profile_startup(code=STARTUP_CODE):
+    """
+    Runs `code` from the app root in a fresh interpreter, returns its imports and
+    how long it took, interpreter startup included, in seconds.
+    """
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        cwd=settings.BASE_DIR,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if process.returncode:
+        raise CommandError(process.stderr.strip().splitlines()[-1])
+    return parse_import_times(process.stderr), elapsed
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from helpers.stats import percentile
+
+from ._load_test import load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests a running server with concurrent GET requests, "
+        "reporting the throughput and latency percentiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="URL of the server, e.g. http://localhost:8000")
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="path requested, can be repeated (default: /api/v1/version/)",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=10, help="number of concurrent clients"
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10, help="duration of the test in seconds"
+        )
+        parser.add_argument("--token", help="authentication token sent along")
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+        latencies, errors, elapsed = load_test(
+            options["url"],
+            options["paths"] or ["/api/v1/version/"],
+            concurrency=options["concurrency"],
+            duration=options["duration"],
+            headers=headers,
+        )
+        if not latencies:
+            self.stdout.write("No request completed")
+            return
+        p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        self.stdout.write(
+            f"{'requests':>10}{'errors':>8}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        )
+        self.stdout.write(
+            f"{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>9.1f}"
+            f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}"
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ._startup_profile import get_import_time, get_package_times, profile_startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the startup time of the app in a fresh interpreter and its import "
+        "time per package or per module, i.e. what a worker goes through before its "
+        "first request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modules",
+            action="store_true",
+            help="reports the modules, with their cumulative time, not the packages",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20, help="number of the slowest reported"
+        )
+        parser.add_argument(
+            "--max-total-ms",
+            type=float,
+            help="fails if the startup time exceeds it, e.g. on CI",
+        )
+
+    def handle(self, *args, **options):
+        imports, elapsed = profile_startup()
+        limit = options["limit"]
+        if options["modules"]:
+            self.stdout.write(f"{'module':<56}{'self ms':>10}{'cumul ms':>10}")
+            slowest = sorted(imports, key=lambda item: item[3], reverse=True)
+            for module, level, own, cumulative in slowest[:limit]:
+                self.stdout.write(
+                    f"{module:<56}{own / 1000:>10.1f}{cumulative / 1000:>10.1f}"
+                )
+        else:
+            self.stdout.write(f"{'package':<56}{'ms':>10}")
+            times = get_package_times(imports)
+            for package in sorted(times, key=times.get, reverse=True)[:limit]:
+                self.stdout.write(f"{package:<56}{times[package] / 1000:>10.1f}")
+        total = elapsed * 1000
+        self.stdout.write(
+            f"Total: {total:.1f} ms, of which {get_import_time(imports) / 1000:.1f} ms "
+            f"importing {len(imports)} reported modules"
+        )
+        if options["max_total_ms"] is not None and total > options["max_total_ms"]:
+            raise CommandError(
+                f"Startup time {total:.1f} ms exceeds {options['max_total_ms']} ms"
+            )
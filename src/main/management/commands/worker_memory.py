@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from ._memory import get_memory_usage
+
+MIB = 2**20
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the memory usage of a running gunicorn master and of its workers, "
+        "telling apart the memory shared via copy-on-write from the private one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("pid", type=int, help="process id of the gunicorn master")
+
+    def handle(self, *args, **options):
+        usages = get_memory_usage(options["pid"])
+        self.stdout.write(
+            f"{'pid':>8}{'role':>8}{'rss MiB':>10}{'pss MiB':>10}"
+            f"{'shared MiB':>12}{'private MiB':>13}"
+        )
+        for index, (pid, usage) in enumerate(usages):
+            shared = usage["Shared_Clean"] + usage["Shared_Dirty"]
+            private = usage["Private_Clean"] + usage["Private_Dirty"]
+            self.stdout.write(
+                f"{pid:>8}{'worker' if index else 'master':>8}"
+                f"{usage['Rss'] / MIB:>10.1f}{usage['Pss'] / MIB:>10.1f}"
+                f"{shared / MIB:>12.1f}{private / MIB:>13.1f}"
+            )
+        workers = usages[1:]
+        total = sum(usage["Pss"] for _, usage in usages)
+        self.stdout.write(f"Total PSS: {total / MIB:.1f} MiB")
+        if workers:
+            private = sum(
+                usage["Private_Clean"] + usage["Private_Dirty"] for _, usage in workers
+            )
+            self.stdout.write(
+                f"Private per worker: {private / len(workers) / MIB:.1f} MiB"
+            )
@@ -0,0 +1,155 @@
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import HttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from helpers.cache import SHARED_CACHE_BACKENDS, is_cache_shared
+from main.db_routers import REPLICA, use_replica
+from main.health import MISSING, get_cached_readiness, get_readiness
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+LIVENESS_PATH = "/healthz"
+READINESS_PATH = "/readyz"
+
+
+def get_readiness_response(reason):
+    if reason is None:
+        return HttpResponse("ok", content_type="text/plain")
+    return HttpResponse(reason, content_type="text/plain", status=503)
+
+
+class HealthCheckMiddleware:
+    """
+    Answers the liveness (`/healthz`) and readiness (`/readyz`) checks, placed first
+    so they skip the rest of the chain, e.g. the sessions, the CSRF and the host
+    validation, the load balancer using the instance address as the host.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info == LIVENESS_PATH:
+            return HttpResponse("ok", content_type="text/plain")
+        if request.path_info == READINESS_PATH:
+            return get_readiness_response(get_readiness())
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path_info == LIVENESS_PATH:
+            return HttpResponse("ok", content_type="text/plain")
+        if request.path_info == READINESS_PATH:
+            # only querying the database in a thread when the last check is stale
+            if (reason := get_cached_readiness()) is MISSING:
+                reason = await sync_to_async(get_readiness)()
+            return get_readiness_response(reason)
+        return await self.get_response(request)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, also usable as async middleware.
+    WhiteNoise isn't async capable, which gets Django to run the rest of the chain
+    in the single thread of `sync_to_async()` when served via ASGI, serializing the
+    async views along with it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(
+                static_file, request
+            )
+        return await self.get_response(request)
+
+
+def get_replica_pin_key(request):
+    """
+    Returns the cache key pinning the client to the primary, derived from its
+    credentials as the middleware runs before the API authentication.
+    """
+    credentials = request.headers.get("Authorization") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credentials:
+        return None
+    return f"replica-pin:{hashlib.sha256(credentials.encode()).hexdigest()}"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets `PrimaryReplicaRouter` send the reads of safe requests to the replica.
+    A client is pinned to the primary for `DATABASE_REPLICA_PIN_SECONDS` after
+    any other request, so it reads its own writes.
+    The pin is kept in the cache, which has to be shared by the workers of all
+    the instances, see `SHARED_CACHE_BACKENDS`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if REPLICA not in settings.DATABASES:
+            raise MiddlewareNotUsed()
+        if not is_cache_shared():
+            raise ImproperlyConfigured(
+                "The read replica requires a cache shared by the instances, "
+                f"got CACHE_BACKEND={settings.CACHE_BACKEND}, expected one of "
+                f"{', '.join(SHARED_CACHE_BACKENDS)}."
+            )
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = get_replica_pin_key(request)
+        safe = request.method in SAFE_METHODS
+        token = use_replica.set(safe and not (key and cache.get(key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if key and not safe:
+            cache.set(key, True, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        key = get_replica_pin_key(request)
+        safe = request.method in SAFE_METHODS
+        token = use_replica.set(safe and not (key and await cache.aget(key)))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if key and not safe:
+            await cache.aset(key, True, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
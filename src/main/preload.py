@@ -0,0 +1,40 @@
+"""
+Loads in the gunicorn master process what the workers would otherwise each load on
+their first requests, so it's shared by the forked workers, see `gunicorn.conf.py`.
+"""
+
+import importlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.template.loader import get_template
+from django.urls import get_resolver
+from django.utils import translation
+from PIL import Image
+
+# lazily imported, on first use
+MODULES = (
+    "boto3",
+    "storages.backends.s3boto3",
+    "onesignal_sdk.client",
+    "stripe",
+    "nurse.serializers",
+    "payment.serializers",
+)
+TEMPLATES = ("emails/email_template.html",)
+
+
+def warm_up():
+    for module in MODULES:
+        importlib.import_module(module)
+    # imports the views and whatever they import, then builds the lookup tables
+    get_resolver().reverse_dict
+    default_storage._setup()
+    for template in TEMPLATES:
+        # compiled once and kept by the cached template loader
+        get_template(template)
+    # loads the translation catalogs
+    with translation.override(settings.LANGUAGE_CODE):
+        pass
+    # otherwise imported on the first photo opened
+    Image.init()
@@ -0,0 +1,30 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+# escaped by `JSONRenderer` so the output can be embedded in a script tag
+LINE_SEPARATORS = (("\u2028".encode(), b"\\u2028"), ("\u2029".encode(), b"\\u2029"))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` serializing via orjson, several times faster than `json` on the
+    nested patient payloads, with the same output.
+    The types orjson doesn't know, or formats differently (e.g. `Decimal`, lazy
+    strings and dates), go through the `JSONRenderer` encoder.
+    """
+
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            # orjson only indents by 2 spaces, the browsable API asks for 4
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=self.option
+        )
+        for separator, escaped in LINE_SEPARATORS:
+            ret = ret.replace(separator, escaped)
+        return ret
@@ -0,0 +1,43 @@
+"""
+Sampling of the transactions traced by Sentry, configured via the
+`SENTRY_TRACES_SAMPLE_RATE(S)` settings.
+This module is imported by the settings, hence doesn't import Django.
+"""
+
+import re
+
+# polled by the load balancer and the monitoring, never traced
+IGNORED_PATHS = re.compile(r"^(/healthz|/readyz|/api/v\d+/version/)$")
+
+
+def get_path(sampling_context):
+    """Returns the path of the request starting the transaction, if any."""
+    if environ := sampling_context.get("wsgi_environ"):
+        return environ.get("PATH_INFO")
+    if scope := sampling_context.get("asgi_scope"):
+        return scope.get("path")
+    return None
+
+
+def get_traces_sampler(default_rate, rates):
+    """
+    Returns a `traces_sampler` applying the rate of the first regex in `rates`
+    matching the request path, `default_rate` otherwise, e.g. for the management
+    commands.
+    The transactions continuing a trace keep the sampling decision of its origin.
+    """
+    rules = [(re.compile(pattern), rate) for pattern, rate in rates.items()]
+
+    def traces_sampler(sampling_context):
+        path = get_path(sampling_context)
+        if path is not None and IGNORED_PATHS.match(path):
+            return 0
+        if (parent_sampled := sampling_context.get("parent_sampled")) is not None:
+            return float(parent_sampled)
+        if path is not None:
+            for pattern, rate in rules:
+                if pattern.search(path):
+                    return rate
+        return default_rate
+
+    return traces_sampler
@@ -12,14 +12,17 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 import json
 import os
+import tempfile
 from pathlib import Path
 
-import sentry_sdk
 from django.core.management.utils import get_random_secret_key
-from dotenv import load_dotenv
-from sentry_sdk.integrations.django import DjangoIntegration
 
-load_dotenv()
+# the .env file is for local development, it's looked up the same way as
+# `load_dotenv()` does, from this directory upwards
+if any((path / ".env").is_file() for path in Path(__file__).resolve().parents):
+    from dotenv import load_dotenv
+
+    load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -73,9 +76,11 @@ CUSTOM_APPS = (
 INSTALLED_APPS = DJANGO_CORE_APP + THIRDPARTY_APP + CUSTOM_APPS
 
 MIDDLEWARE = [
+    "main.middleware.HealthCheckMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "main.middleware.AsyncWhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "main.middleware.ReplicaRoutingMiddleware",
     "django.middleware.common.CommonMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -83,6 +88,10 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
+# the readiness check (`/readyz`) result is reused for that long (in seconds)
+HEALTH_CHECK_CACHE_SECONDS = json.loads(
+    os.environ.get("HEALTH_CHECK_CACHE_SECONDS", "5")
+)
 
 ROOT_URLCONF = "main.urls"
 
@@ -117,6 +126,18 @@ DATABASE_PASSWORD = os.environ.get("DATABASE_PASSWORD")
 DATABASE_HOST = os.environ.get("DATABASE_HOST")
 DATABASE_PORT = os.environ.get("DATABASE_PORT")
 
+# keeps the connections open for reuse by the next requests (in seconds),
+# 0 closes them at the end of each request and null never does
+DATABASE_CONN_MAX_AGE = json.loads(os.environ.get("DATABASE_CONN_MAX_AGE", "60"))
+# checks a reused connection is still usable before the request's first query
+DATABASE_CONN_HEALTH_CHECKS = bool(
+    json.loads(os.environ.get("DATABASE_CONN_HEALTH_CHECKS", "1"))
+)
+# PostgreSQL connection pool shared by the threads of a worker, either true or the
+# `psycopg_pool.ConnectionPool` arguments, e.g. {"min_size": 2, "max_size": 8}
+# requires psycopg 3, i.e. the `pool` extra
+DATABASE_POOL = json.loads(os.environ.get("DATABASE_POOL", "false"))
+
 DATABASES = {
     "default": {
         "ENGINE": DATABASE_ENGINE,
@@ -125,6 +146,68 @@ DATABASES = {
         "PASSWORD": DATABASE_PASSWORD,
         "HOST": DATABASE_HOST,
         "PORT": DATABASE_PORT,
+        "CONN_MAX_AGE": DATABASE_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": DATABASE_CONN_HEALTH_CHECKS,
+    }
+}
+if DATABASE_POOL:
+    # connections get returned to the pool instead, which isn't compatible with
+    # persistent connections
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {"pool": DATABASE_POOL}
+
+# optional read replica, the reads of GET requests go to it, see `main.db_routers`
+DATABASE_REPLICA_HOST = os.environ.get("DATABASE_REPLICA_HOST")
+DATABASE_REPLICA_NAME = os.environ.get("DATABASE_REPLICA_NAME")
+if DATABASE_REPLICA_HOST or DATABASE_REPLICA_NAME:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": DATABASE_REPLICA_NAME or DATABASE_NAME,
+        "USER": os.environ.get("DATABASE_REPLICA_USER", DATABASE_USER),
+        "PASSWORD": os.environ.get("DATABASE_REPLICA_PASSWORD", DATABASE_PASSWORD),
+        "HOST": DATABASE_REPLICA_HOST or DATABASE_HOST,
+        "PORT": os.environ.get("DATABASE_REPLICA_PORT", DATABASE_PORT),
+        # tests run against the primary only
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["main.db_routers.PrimaryReplicaRouter"]
+# clients read from the primary for this long (in seconds) after writing, so they
+# read their own writes despite the replication lag
+DATABASE_REPLICA_PIN_SECONDS = json.loads(
+    os.environ.get("DATABASE_REPLICA_PIN_SECONDS", "5")
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    # requires `manage.py createcachetable`
+    "database": "django.core.cache.backends.db.DatabaseCache",
+    # requires the `redis` extra, any Redis compatible server, e.g. ElastiCache
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHE_DEFAULT_LOCATIONS = {
+    "locmem": "",
+    "file": os.path.join(tempfile.gettempdir(), "mynotif-cache"),
+    "database": "cache",
+    "redis": "redis://localhost:6379/0",
+}
+# the local memory cache is per process, the other backends are shared by the
+# workers and outlive the deployments
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+# the directory, the table or the server URL(s), depending on the backend
+CACHE_LOCATION = os.environ.get(
+    "CACHE_LOCATION", CACHE_DEFAULT_LOCATIONS[CACHE_BACKEND]
+)
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": CACHE_LOCATION,
+        # tells apart the apps sharing a server
+        "KEY_PREFIX": os.environ.get("CACHE_KEY_PREFIX", ""),
     }
 }
 
@@ -187,6 +270,15 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "main.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "main.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
@@ -204,6 +296,36 @@ AWS_STORAGE_BUCKET_NAME = "mynotif-prescription"
 AWS_S3_REGION_NAME = "eu-west-3"
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
+AWS_QUERYSTRING_EXPIRE = json.loads(os.environ.get("AWS_QUERYSTRING_EXPIRE", "3600"))
+# presigned URLs get cached for the expiry minus this margin (in seconds)
+PHOTO_URL_CACHE_MARGIN = 300
+# the photos read back from S3 (e.g. to render them) spill to disk above that size
+# rather than being held in memory (in bytes, Django's upload default)
+AWS_S3_MAX_MEMORY_SIZE = 2621440
+# e.g. a local MinIO or `moto_server` instance for development
+AWS_S3_ENDPOINT_URL = os.environ.get("AWS_S3_ENDPOINT_URL")
+
+# Prescription photos uploads
+PRESCRIPTION_UPLOAD_MAX_SIZE = json.loads(
+    os.environ.get("PRESCRIPTION_UPLOAD_MAX_SIZE", str(15 * 1024 * 1024))
+)
+PRESCRIPTION_UPLOAD_URL_EXPIRE = json.loads(
+    os.environ.get("PRESCRIPTION_UPLOAD_URL_EXPIRE", "600")
+)
+PRESCRIPTION_UPLOAD_CONTENT_TYPES = (
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "image/heic",
+    "image/heif",
+)
+# the photos are rendered by the `process_prescription_photos` worker, unless
+# rendered on upload, once committed, still within the request
+PHOTO_PROCESS_INLINE = bool(json.loads(os.environ.get("PHOTO_PROCESS_INLINE", "0")))
+# streams uploads straight to S3 rather than spooling them in memory or on disk
+PRESCRIPTION_UPLOAD_STREAM_TO_S3 = bool(
+    json.loads(os.environ.get("PRESCRIPTION_UPLOAD_STREAM_TO_S3", "1"))
+)
 
 STORAGES = {
     "default": {
@@ -235,14 +357,36 @@ ONESIGNAL_APP_ID = os.environ.get("ONESIGNAL_APP_ID")
 DOMAIN = os.environ.get("TEMPLATED_MAIL_DOMAIN", "")
 SITE_NAME = os.environ.get("TEMPLATED_SITE_NAME", "")
 
-if SENTRY_DSN := os.environ.get("SENTRY_DSN"):
+# Sentry
+SENTRY_DSN = os.environ.get("SENTRY_DSN")
+# share of the transactions traced, per request path, the first matching regex
+# applies, e.g. {"^/api/v1/payment/stripe/webhook/$": 1.0, "^/api/v1/patient/$": 0.01}
+# and the default rate otherwise, the version checks are never traced
+SENTRY_TRACES_SAMPLE_RATE = json.loads(
+    os.environ.get("SENTRY_TRACES_SAMPLE_RATE", "0.1")
+)
+SENTRY_TRACES_SAMPLE_RATES = json.loads(
+    os.environ.get("SENTRY_TRACES_SAMPLE_RATES", "{}")
+)
+# share of the traced transactions also profiled
+SENTRY_PROFILES_SAMPLE_RATE = json.loads(
+    os.environ.get("SENTRY_PROFILES_SAMPLE_RATE", "0")
+)
+
+if SENTRY_DSN:
+    # imported only when enabled, it takes about as long as Django to import
+    import sentry_sdk
+    from sentry_sdk.integrations.django import DjangoIntegration
+
+    from main.sentry import get_traces_sampler
+
     sentry_sdk.init(
         dsn=SENTRY_DSN,
         integrations=[DjangoIntegration()],
-        # Set traces_sample_rate to 1.0 to capture 100%
-        # of transactions for performance monitoring.
-        # We recommend adjusting this value in production.
-        traces_sample_rate=1.0,
+        traces_sampler=get_traces_sampler(
+            SENTRY_TRACES_SAMPLE_RATE, SENTRY_TRACES_SAMPLE_RATES
+        ),
+        profiles_sample_rate=SENTRY_PROFILES_SAMPLE_RATE,
         # If you wish to associate users to errors (assuming you are using
         # django.contrib.auth) you may enable sending PII data.
         send_default_pii=True,
@@ -251,6 +395,18 @@ if SENTRY_DSN := os.environ.get("SENTRY_DSN"):
 # Stripe
 STRIPE_API_KEY = os.environ.get("STRIPE_API_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
+# per request timeout in seconds, and bounded retries on network errors and 409/5xx
+STRIPE_TIMEOUT = json.loads(os.environ.get("STRIPE_TIMEOUT", "10"))
+STRIPE_MAX_NETWORK_RETRIES = json.loads(
+    os.environ.get("STRIPE_MAX_NETWORK_RETRIES", "2")
+)
+# threads the async views call Stripe from, each keeping its own HTTP connection
+STRIPE_MAX_CONNECTIONS = json.loads(os.environ.get("STRIPE_MAX_CONNECTIONS", "4"))
+# the events are handled by the `process_stripe_events` worker, unless handled in
+# the webhook request, failures still being retried by the worker
+STRIPE_WEBHOOK_PROCESS_INLINE = bool(
+    json.loads(os.environ.get("STRIPE_WEBHOOK_PROCESS_INLINE", "0"))
+)
 
 # Frontend URL, used for the Stripe success/cancel redirect
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:3000")
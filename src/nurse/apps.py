@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NurseConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "nurse"
+
+    def ready(self):
+        from nurse import signals  # noqa: F401
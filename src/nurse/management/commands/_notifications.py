@@ -1,13 +1,17 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from onesignal_sdk.client import Client
 
 from nurse.models import Prescription, UserOneSignalProfile
 
 
-def get_client():
+def get_client(asynchronous=False):
+    # imported on first use rather than at startup, via `nurse.views`
+    from onesignal_sdk.client import AsyncClient, Client
+
+    client_class = AsyncClient if asynchronous else Client
     assert (app_id := settings.ONESIGNAL_APP_ID), "ONESIGNAL_APP_ID must be set"
     assert (api_key := settings.ONESIGNAL_API_KEY), "ONESIGNAL_API_KEY must be set"
-    return Client(app_id=app_id, rest_api_key=api_key)
+    return client_class(app_id=app_id, rest_api_key=api_key)
 
 
 # Define notification messages for different languages
@@ -20,8 +24,11 @@ contents_dict = {
 }
 
 
-def notify():
-    """Notify nurses that have prescriptions to expire soon."""
+def get_notification_body():
+    """
+    Returns the notification for the nurses that have prescriptions to expire soon,
+    or None if none of them subscribed to notifications.
+    """
     prescriptions = Prescription.objects.expiring_soon()
     user_in = [
         nurse.user
@@ -35,15 +42,26 @@ def notify():
         .distinct()
     )
     if not subscription_ids.exists():
-        return
+        return None
     # list for serializing (HTTP request) and ordering for reliable testing
     subscription_ids = list(subscription_ids.order_by("subscription_id"))
-    notification_body = {
+    return {
         "contents": contents_dict,
         "include_subscription_ids": subscription_ids,
         "name": "PRESCRIPTION EXPIRE SOON",
     }
-    get_client().send_notification(notification_body)
+
+
+def notify():
+    """Notify nurses that have prescriptions to expire soon."""
+    if notification_body := get_notification_body():
+        get_client().send_notification(notification_body)
+
+
+async def anotify():
+    """Same as `notify()`, without blocking the event loop on the OneSignal API."""
+    if notification_body := await sync_to_async(get_notification_body)():
+        await get_client(asynchronous=True).send_notification(notification_body)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+import logging
+from pathlib import PurePosixPath
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from PIL import Image
+
+from nurse.models import Prescription
+from nurse.utils.images import normalize_photo
+
+logger = logging.getLogger(__name__)
+
+# e.g. a missing object or S3 being unavailable, retried on the next runs
+STORAGE_ERRORS = (BotoCoreError, ClientError, OSError)
+# e.g. an unsupported format (`UnidentifiedImageError`) or a truncated image,
+# not worth retrying
+DECODING_ERRORS = (OSError, Image.DecompressionBombError)
+
+RENDITION_FIELDS = (
+    "photo_prescription_size",
+    "photo_prescription_web",
+    "photo_prescription_web_size",
+    "photo_prescription_thumbnail",
+    "photo_prescription_thumbnail_size",
+)
+
+
+def process_photo(prescription):
+    """
+    Stores the web sized and thumbnail renditions of the prescription photo and
+    records the sizes of all three.
+    """
+    photo = prescription.photo_prescription
+    # identical photos share the same content addressed name and renditions
+    fields = (
+        Prescription.objects.filter(
+            photo_prescription=photo.name, photo_prescription_size__isnull=False
+        )
+        .values(*RENDITION_FIELDS)
+        .first()
+    )
+    if fields is None:
+        try:
+            fields = render_photo(prescription)
+        except STORAGE_ERRORS:
+            logger.exception("Couldn't read the photo %s", photo.name)
+            Prescription.objects.filter(
+                id=prescription.id, photo_prescription=photo.name
+            ).update(
+                photo_prescription_processing_attempts=F(
+                    "photo_prescription_processing_attempts"
+                )
+                + 1
+            )
+            return
+    # the photo could have been replaced in the meantime
+    Prescription.objects.filter(
+        id=prescription.id, photo_prescription=photo.name
+    ).update(**fields)
+
+
+def render_photo(prescription):
+    """
+    Renders and stores the renditions, returns the fields to update.
+    Raises one of `STORAGE_ERRORS` if the photo can't be read.
+    """
+    photo = prescription.photo_prescription
+    fields = {"photo_prescription_size": photo.size}
+    # decoded straight from the (spooled) file rather than copied in memory
+    with photo.open("rb") as file:
+        try:
+            web, thumbnail = normalize_photo(file)
+        except DECODING_ERRORS:
+            # still records the original size so we don't pick it up again
+            logger.warning("Couldn't decode the photo %s", photo.name, exc_info=True)
+            return fields
+    name = f"{PurePosixPath(photo.name).stem}.jpg"
+    prescription.photo_prescription_web.save(name, ContentFile(web), save=False)
+    prescription.photo_prescription_thumbnail.save(
+        name, ContentFile(thumbnail), save=False
+    )
+    fields.update(
+        photo_prescription_web=prescription.photo_prescription_web.name,
+        photo_prescription_web_size=len(web),
+        photo_prescription_thumbnail=prescription.photo_prescription_thumbnail.name,
+        photo_prescription_thumbnail_size=len(thumbnail),
+    )
+    return fields
+
+
+def process_pending_photos(limit=None):
+    """Processes the photos uploaded since the last run, returns how many were."""
+    # the photos that failed to be read come last, so they don't hold up the others
+    prescriptions = Prescription.objects.pending_photo_processing().order_by(
+        "photo_prescription_processing_attempts", "id"
+    )
+    if limit is not None:
+        prescriptions = prescriptions[:limit]
+    count = 0
+    for prescription in prescriptions:
+        process_photo(prescription)
+        count += 1
+    return count
+
+
+def process_photo_on_commit(prescription):
+    """
+    Processes the newly attached photo once committed, unless left to the
+    `process_prescription_photos` worker, see `PHOTO_PROCESS_INLINE`.
+    """
+    if settings.PHOTO_PROCESS_INLINE:
+        # a failure doesn't fail the upload, the photo stays pending
+        transaction.on_commit(lambda: process_photo(prescription), robust=True)
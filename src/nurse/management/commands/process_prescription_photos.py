@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ._photos import process_pending_photos
+
+
+class Command(BaseCommand):
+    help = "Generates the web sized and thumbnail renditions of uploaded photos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, help="maximum number of photos processed per run"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="keeps running as a worker, polling every given seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = process_pending_photos(limit=options["limit"])
+            self.stdout.write(f"Processed {count} photo(s)")
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
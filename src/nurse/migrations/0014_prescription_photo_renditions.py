@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nurse", "0013_alter_prescription_patient"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="prescription",
+            name="photo_prescription_processing_attempts",
+            field=models.PositiveSmallIntegerField(
+                default=0, help_text="times the photo failed to be read for processing"
+            ),
+        ),
+        migrations.AddField(
+            model_name="prescription",
+            name="photo_prescription_size",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="size of the original photo in bytes", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="prescription",
+            name="photo_prescription_thumbnail",
+            field=models.ImageField(blank=True, upload_to="prescriptions/thumbnails"),
+        ),
+        migrations.AddField(
+            model_name="prescription",
+            name="photo_prescription_thumbnail_size",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="prescription",
+            name="photo_prescription_web",
+            field=models.ImageField(blank=True, upload_to="prescriptions/web"),
+        ),
+        migrations.AddField(
+            model_name="prescription",
+            name="photo_prescription_web_size",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
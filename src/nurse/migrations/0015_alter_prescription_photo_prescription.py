@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nurse", "0014_prescription_photo_renditions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="prescription",
+            name="photo_prescription",
+            field=models.ImageField(db_index=True, upload_to="prescriptions"),
+        ),
+    ]
@@ -6,6 +6,9 @@ from django.db import models
 
 from payment.models import Subscription
 
+# the photos still failing to be read after that are left for investigation
+MAX_PHOTO_PROCESSING_ATTEMPTS = 3
+
 
 def make_street_field():
     return models.CharField(max_length=30, blank=True, default="")
@@ -74,13 +77,40 @@ class PrescriptionManager(models.Manager):
         expiring_soon_date = today + timedelta(days=days)
         return self.filter(end_date__lte=expiring_soon_date, end_date__gte=today)
 
+    def pending_photo_processing(self):
+        """
+        Prescriptions with a photo that didn't go through `normalize_photo()`, and
+        that failed to be read fewer than `MAX_PHOTO_PROCESSING_ATTEMPTS` times.
+        """
+        return self.exclude(photo_prescription="").filter(
+            photo_prescription_size__isnull=True,
+            photo_prescription_processing_attempts__lt=MAX_PHOTO_PROCESSING_ATTEMPTS,
+        )
+
 
 class Prescription(models.Model):
     prescribing_doctor = models.CharField(max_length=300, blank=False)
     email_doctor = models.EmailField(blank=True, null=True)
     start_date = models.DateField(auto_now=False, auto_now_add=False)
     end_date = models.DateField(auto_now=False, auto_now_add=False)
-    photo_prescription = models.ImageField(upload_to="prescriptions")
+    # indexed as photos are content addressed and shared between prescriptions
+    photo_prescription = models.ImageField(upload_to="prescriptions", db_index=True)
+    photo_prescription_size = models.PositiveIntegerField(
+        null=True, blank=True, help_text="size of the original photo in bytes"
+    )
+    photo_prescription_web = models.ImageField(
+        upload_to="prescriptions/web", blank=True
+    )
+    photo_prescription_web_size = models.PositiveIntegerField(null=True, blank=True)
+    photo_prescription_thumbnail = models.ImageField(
+        upload_to="prescriptions/thumbnails", blank=True
+    )
+    photo_prescription_thumbnail_size = models.PositiveIntegerField(
+        null=True, blank=True
+    )
+    photo_prescription_processing_attempts = models.PositiveSmallIntegerField(
+        default=0, help_text="times the photo failed to be read for processing"
+    )
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, null=False)
     objects = PrescriptionManager()
 
@@ -97,6 +127,15 @@ class Prescription(models.Model):
         expiring_soon_date = today + timedelta(days=days)
         return self.end_date <= expiring_soon_date and self.end_date >= today
 
+    def clear_photo_renditions(self):
+        """Flags the photo for processing, to be called when a new one is attached."""
+        self.photo_prescription_size = None
+        self.photo_prescription_web = None
+        self.photo_prescription_web_size = None
+        self.photo_prescription_thumbnail = None
+        self.photo_prescription_thumbnail_size = None
+        self.photo_prescription_processing_attempts = 0
+
 
 class UserOneSignalProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -1,8 +1,21 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core import signing
 from django.core.validators import RegexValidator
+from django.db import models
 from rest_framework import serializers
 
+from nurse.management.commands._photos import process_photo_on_commit
 from nurse.models import Nurse, Patient, Prescription, UserOneSignalProfile
+from nurse.upload_handlers import S3UploadedFile
+from nurse.utils.s3 import (
+    get_photo_url,
+    get_photo_urls,
+    lock_photo,
+    make_content_addressed_name,
+    object_exists,
+    release_photo_on_commit,
+)
 
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
@@ -27,6 +40,58 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
                 self.fields.pop(field_name)
 
 
+class CachedURLImageField(serializers.ImageField):
+    """An `ImageField` represented by its cached presigned URL."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        # fetched along with the other photos of the list, see
+        # `CachedURLImageListSerializer`
+        photo_urls = getattr(self.parent, "photo_urls", {})
+        url = photo_urls.get(value.name) or get_photo_url(value.name)
+        request = self.context.get("request", None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_internal_value(self, data):
+        if isinstance(data, S3UploadedFile):
+            # already stored, the type and size got validated while streaming it
+            return data
+        return super().to_internal_value(data)
+
+
+class CachedURLImageListSerializer(serializers.ListSerializer):
+    """Fetches the cached URLs of all the listed photos at once."""
+
+    def to_representation(self, data):
+        # evaluated once, the queryset caching its results
+        instances = data.all() if isinstance(data, models.manager.BaseManager) else data
+        fields = [
+            field
+            for field in self.child.fields.values()
+            if isinstance(field, CachedURLImageField)
+        ]
+        names = {
+            photo.name
+            for instance in instances
+            for field in fields
+            if (photo := field.get_attribute(instance))
+        }
+        self.child.photo_urls = get_photo_urls(names) if names else {}
+        return super().to_representation(instances)
+
+
+class CachedURLImageFieldMixin:
+    """Maps the model image fields to `CachedURLImageField`."""
+
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: CachedURLImageField,
+    }
+
+
 class PatientSerializer(DynamicFieldsModelSerializer):
     prescriptions = serializers.SerializerMethodField()
     expire_soon_prescriptions = serializers.SerializerMethodField()
@@ -59,14 +124,24 @@ class PrescriptionEmailSerializer(serializers.Serializer):
     )
 
 
-class PrescriptionSerializer(DynamicFieldsModelSerializer):
+class PrescriptionSerializer(CachedURLImageFieldMixin, DynamicFieldsModelSerializer):
     is_valid = serializers.SerializerMethodField()
     expiring_soon = serializers.SerializerMethodField()
 
     class Meta:
         model = Prescription
-        fields = "__all__"
-        read_only_fields = ("id", "photo_prescription")
+        list_serializer_class = CachedURLImageListSerializer
+        # bookkeeping of the photo processing, not part of the API
+        exclude = ("photo_prescription_processing_attempts",)
+        read_only_fields = (
+            "id",
+            "photo_prescription",
+            "photo_prescription_size",
+            "photo_prescription_web",
+            "photo_prescription_web_size",
+            "photo_prescription_thumbnail",
+            "photo_prescription_thumbnail_size",
+        )
 
     def get_is_valid(self, obj):
         return obj.is_valid()
@@ -84,11 +159,75 @@ class ExpandedPrescriptionSerializer(PrescriptionSerializer):
     patient_lastname = serializers.CharField(source="patient.lastname", read_only=True)
 
 
-class PrescriptionFileSerializer(serializers.ModelSerializer):
+class PrescriptionFileSerializer(CachedURLImageFieldMixin, serializers.ModelSerializer):
     class Meta:
         model = Prescription
         fields = ("id", "photo_prescription")
 
+    def validate_photo_prescription(self, value):
+        if not isinstance(value, S3UploadedFile):
+            value.name = make_content_addressed_name(value)
+        return value
+
+    def update(self, instance, validated_data):
+        previous = instance.photo_prescription.name
+        renditions = (
+            instance.photo_prescription_web.name,
+            instance.photo_prescription_thumbnail.name,
+        )
+        if not (photo := validated_data.get("photo_prescription")):
+            return super().update(instance, validated_data)
+        name = instance.photo_prescription.field.generate_filename(instance, photo.name)
+        # a release of the same photo can't delete it until it's referenced
+        with lock_photo(name):
+            if object_exists(name):
+                # the exact same photo is already stored, skips the upload
+                validated_data["photo_prescription"] = name
+            elif isinstance(photo, S3UploadedFile):
+                # released since streamed to the bucket
+                raise serializers.ValidationError(
+                    {"photo_prescription": ["The photo got deleted, upload it again."]}
+                )
+            if name != previous:
+                instance.clear_photo_renditions()
+            instance = super().update(instance, validated_data)
+        if name != previous:
+            release_photo_on_commit(previous, renditions)
+            process_photo_on_commit(instance)
+        return instance
+
+
+class PrescriptionUploadURLSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.ChoiceField(
+        choices=settings.PRESCRIPTION_UPLOAD_CONTENT_TYPES
+    )
+
+
+class PrescriptionUploadConfirmSerializer(serializers.Serializer):
+    """Validates the signed token handed out along with the presigned upload."""
+
+    SALT = "nurse.prescription-upload"
+
+    upload_token = serializers.CharField()
+
+    @classmethod
+    def make_token(cls, prescription_id, key):
+        return signing.dumps(
+            {"prescription": prescription_id, "key": key}, salt=cls.SALT
+        )
+
+    def validate_upload_token(self, value):
+        try:
+            return signing.loads(
+                value,
+                salt=self.SALT,
+                # leaves some room for the upload itself to complete
+                max_age=settings.PRESCRIPTION_UPLOAD_URL_EXPIRE * 2,
+            )
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid or expired upload token.")
+
 
 class NurseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from nurse.models import Prescription
+from nurse.utils.s3 import release_photo_on_commit
+
+
+@receiver(post_delete, sender=Prescription)
+def release_prescription_photo(sender, instance, **kwargs):
+    """Deletes the photo from the bucket once no prescription references it."""
+    name = instance.photo_prescription.name
+    renditions = (
+        instance.photo_prescription_web.name,
+        instance.photo_prescription_thumbnail.name,
+    )
+    release_photo_on_commit(name, renditions)
@@ -0,0 +1,219 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from rest_framework import exceptions, status
+
+from nurse.utils.images import sniff_image_type
+from nurse.utils.s3 import (
+    get_photo_prefix,
+    get_photo_storage,
+    get_s3_client,
+    get_upload_prefix,
+    make_content_addressed_name,
+    object_exists,
+    release_photo_on_commit,
+)
+
+# leaves room for the multipart boundaries and the other form fields
+MULTIPART_OVERHEAD = 64 * 2**10
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "The uploaded file is too large."
+    default_code = "upload_too_large"
+
+
+class ContentHashMixin:
+    """
+    Computes the SHA-256 of the uploaded file chunk by chunk while it's being
+    received, the hex digest is then exposed as `content_hash` on the uploaded file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # set before calling super() which may raise `StopFutureHandlers`
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class S3UploadedFile(UploadedFile):
+    """A file `S3MultipartUploadHandler` already stored in the bucket under `key`."""
+
+    def __init__(self, key, name, content_type, size, charset=None):
+        super().__init__(None, name, content_type, size, charset)
+        self.key = key
+
+
+class S3MultipartUploadHandler(FileUploadHandler):
+    """
+    Streams the uploaded photo straight into an S3 multipart upload, only ever
+    holding one part in memory and never spooling to disk.
+    Oversized requests get rejected before reading the body, and files that turn
+    out too large, or not to be an allowed image type, get aborted on the fly.
+    The file is hashed along the way so the photo ends up stored under its content
+    addressed key, see `make_content_addressed_name()`.
+    """
+
+    # the minimum size of a multipart upload part, but the last one
+    part_size = 5 * 2**20
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        # the names of the photos stored in the bucket, see `release_uploads()`
+        self.stored_names = []
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        max_size = settings.PRESCRIPTION_UPLOAD_MAX_SIZE
+        if content_length and content_length > max_size + MULTIPART_OVERHEAD:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.storage = get_photo_storage()
+        self.client = get_s3_client(self.storage)
+        self.tmp_key = self.storage._normalize_name(
+            f"{get_upload_prefix()}{uuid.uuid4().hex}"
+        )
+        self.sniffed_content_type = None
+        self.hasher = hashlib.sha256()
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.PRESCRIPTION_UPLOAD_MAX_SIZE:
+            self.upload_interrupted()
+            raise UploadTooLarge()
+        if start == 0:
+            self.sniffed_content_type = sniff_image_type(raw_data)
+            if self.sniffed_content_type not in (
+                settings.PRESCRIPTION_UPLOAD_CONTENT_TYPES
+            ):
+                raise exceptions.UnsupportedMediaType(self.content_type)
+        self.hasher.update(raw_data)
+        self.buffer += raw_data
+        if len(self.buffer) >= self.part_size:
+            self.upload_part()
+
+    def upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.storage.bucket_name,
+                Key=self.tmp_key,
+                ContentType=self.sniffed_content_type,
+            )["UploadId"]
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.storage.bucket_name,
+            Key=self.tmp_key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(self.buffer),
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self.buffer.clear()
+
+    def file_complete(self, file_size):
+        # an empty file never gets sniffed, see `receive_data_chunk()`
+        if self.sniffed_content_type is None:
+            raise exceptions.UnsupportedMediaType(self.content_type)
+        file = S3UploadedFile(
+            None, self.file_name, self.sniffed_content_type, file_size, self.charset
+        )
+        file.content_hash = self.hasher.hexdigest()
+        file.name = make_content_addressed_name(file)
+        name = f"{get_photo_prefix()}{file.name}"
+        file.key = self.storage._normalize_name(name)
+        self.stored_names.append(name)
+        bucket = self.storage.bucket_name
+        if object_exists(file.key):
+            # the exact same photo is already stored
+            self.upload_interrupted()
+        elif self.upload_id is None:
+            # small enough to fit in a single request
+            self.client.put_object(
+                Bucket=bucket,
+                Key=file.key,
+                Body=bytes(self.buffer),
+                ContentType=self.sniffed_content_type,
+            )
+        else:
+            self.upload_part()
+            self.client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=self.tmp_key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+            # server side copy to the content addressed key
+            self.client.copy_object(
+                Bucket=bucket,
+                Key=file.key,
+                CopySource={"Bucket": bucket, "Key": self.tmp_key},
+            )
+            self.client.delete_object(Bucket=bucket, Key=self.tmp_key)
+        self.buffer = bytearray()
+        return file
+
+    def upload_interrupted(self):
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.storage.bucket_name,
+                Key=self.tmp_key,
+                UploadId=self.upload_id,
+            )
+            self.upload_id = None
+
+
+def release_uploads(request):
+    """
+    Releases the photos the request streamed to the bucket, the ones it didn't end
+    up referencing, e.g. failing validation, get deleted.
+    """
+    for handler in request.upload_handlers:
+        for name in getattr(handler, "stored_names", ()):
+            release_photo_on_commit(name)
+
+
+def get_hashing_upload_handlers(request):
+    """Same as Django's default `FILE_UPLOAD_HANDLERS`, with content hashing."""
+    return [
+        HashingMemoryFileUploadHandler(request),
+        HashingTemporaryFileUploadHandler(request),
+    ]
+
+
+def get_prescription_upload_handlers(request):
+    """Returns the upload handlers of the prescription photo upload route."""
+    if settings.PRESCRIPTION_UPLOAD_STREAM_TO_S3:
+        return [S3MultipartUploadHandler(request)]
+    return get_hashing_upload_handlers(request)
@@ -6,6 +6,8 @@ from nurse.views import (
     NurseViewSet,
     PatientViewSet,
     PrescriptionFileView,
+    PrescriptionUploadConfirmView,
+    PrescriptionUploadURLView,
     PrescriptionViewSet,
     ProfileView,
     SendEmailToDoctorView,
@@ -27,6 +29,16 @@ urlpatterns = [
         PrescriptionFileView.as_view(),
         name="prescription-upload",
     ),
+    path(
+        "prescription/<int:pk>/upload-url/",
+        PrescriptionUploadURLView.as_view(),
+        name="prescription-upload-url",
+    ),
+    path(
+        "prescription/<int:pk>/upload-confirm/",
+        PrescriptionUploadConfirmView.as_view(),
+        name="prescription-upload-confirm",
+    ),
     path("notify/", AdminNotificationView.as_view(), name="notify"),
     path(
         "prescription/<int:pk>/send-email/",
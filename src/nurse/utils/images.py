@@ -0,0 +1,67 @@
+import contextlib
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# HEIC/HEIF decoding (iPhone photos) requires the optional `pillow-heif` plugin
+with contextlib.suppress(ImportError):
+    from pillow_heif import register_heif_opener
+
+    register_heif_opener()
+
+# container "brands" identifying HEIF images (ISO/IEC 23008-12)
+HEIC_BRANDS = {b"heic", b"heix", b"hevc", b"hevx"}
+HEIF_BRANDS = {b"mif1", b"msf1"}
+
+WEB_MAX_SIZE = (1600, 1600)
+WEB_QUALITY = 80
+THUMBNAIL_MAX_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 70
+
+
+def sniff_image_type(header):
+    """
+    Returns the content type of the image from its first bytes (magic numbers),
+    or None if it's not one of the formats we accept for prescription photos.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand in HEIC_BRANDS:
+            return "image/heic"
+        if brand in HEIF_BRANDS:
+            return "image/heif"
+    return None
+
+
+def render_jpeg(image, max_size, quality):
+    """
+    Returns the JPEG bytes of `image` downscaled to fit within `max_size`.
+    No EXIF or other metadata is carried over to the output.
+    """
+    image = image.copy()
+    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def normalize_photo(file):
+    """
+    Returns the web sized and thumbnail JPEG renditions of the given photo file.
+    The orientation from the EXIF data is applied to the pixels before dropping it.
+    """
+    with Image.open(file) as image:
+        # lets the JPEG decoder downscale while decoding, which saves most of the
+        # memory needed for full resolution phone photos
+        image.draft("RGB", WEB_MAX_SIZE)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGB")
+    web = render_jpeg(image, WEB_MAX_SIZE, WEB_QUALITY)
+    thumbnail = render_jpeg(image, THUMBNAIL_MAX_SIZE, THUMBNAIL_QUALITY)
+    return web, thumbnail
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import uuid
+from pathlib import PurePosixPath
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import transaction
+
+from helpers.cache import CacheNamespace, is_cache_shared
+from nurse.models import Prescription
+
+logger = logging.getLogger(__name__)
+
+# read at once from S3 while hashing an uploaded photo (in bytes)
+HASH_CHUNK_SIZE = 2**20
+
+photo_urls = CacheNamespace("photo-url")
+photo_locks = CacheNamespace("photo-lock")
+
+
+def get_photo_storage():
+    """Returns the storage backing `Prescription.photo_prescription`."""
+    return Prescription._meta.get_field("photo_prescription").storage
+
+
+def get_photo_prefix():
+    """Returns the key prefix prescription photos are stored under."""
+    upload_to = Prescription._meta.get_field("photo_prescription").upload_to
+    return f"{upload_to}/"
+
+
+def get_upload_prefix():
+    """
+    Returns the key prefix of the photos being uploaded, before getting moved to
+    their content addressed key. The bucket expires what's left there.
+    """
+    return f"{get_photo_prefix()}uploads/"
+
+
+def get_s3_client(storage=None):
+    """Returns the low level boto3 client used by the given S3 storage."""
+    storage = storage or get_photo_storage()
+    return storage.connection.meta.client
+
+
+def get_photo_url(name):
+    """
+    Returns the presigned URL of the photo, cached for slightly less than the
+    signature expiry so serializing a list doesn't sign every single row.
+    Names are content addressed hence never point to different content.
+    """
+    return get_photo_urls([name])[name]
+
+
+def get_photo_urls(names):
+    """
+    Same as `get_photo_url()` for several photos at once, returns their URLs by
+    name. The cached ones are read in a single round trip, and the others cached
+    in another.
+    """
+    urls = photo_urls.get_many(set(names))
+    if missing := set(names) - urls.keys():
+        storage = get_photo_storage()
+        signed = {name: storage.url(name) for name in missing}
+        timeout = storage.querystring_expire - settings.PHOTO_URL_CACHE_MARGIN
+        photo_urls.set_many(signed, timeout=max(timeout, 0))
+        urls.update(signed)
+    return urls
+
+
+def make_upload_key(filename):
+    """Returns a fresh, unguessable key under the uploads prefix."""
+    extension = PurePosixPath(filename).suffix.lower()
+    return f"{get_upload_prefix()}{uuid.uuid4().hex}{extension}"
+
+
+def get_object_hash(key):
+    """Returns the SHA-256 hex digest of the object, streamed chunk by chunk."""
+    storage = get_photo_storage()
+    body = get_s3_client(storage).get_object(
+        Bucket=storage.bucket_name, Key=storage._normalize_name(key)
+    )["Body"]
+    hasher = hashlib.sha256()
+    for chunk in body.iter_chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def make_upload_name(key):
+    """Returns the content addressed name of the photo uploaded to `key`."""
+    extension = PurePosixPath(key).suffix
+    return f"{get_photo_prefix()}{get_object_hash(key)}{extension}"
+
+
+def move_upload(key, name):
+    """
+    Server side copies the uploaded object to `name`, unless the exact same photo
+    is already stored, then deletes it.
+    To be called holding the lock on `name`, see `lock_photo()`.
+    """
+    storage = get_photo_storage()
+    client = get_s3_client(storage)
+    source = storage._normalize_name(key)
+    if not object_exists(name):
+        client.copy_object(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(name),
+            CopySource={"Bucket": storage.bucket_name, "Key": source},
+        )
+    client.delete_object(Bucket=storage.bucket_name, Key=source)
+
+
+def get_content_hash(file):
+    """
+    Returns the SHA-256 hex digest of the uploaded file, reusing the one computed by
+    `ContentHashMixin` while receiving it, or hashing it chunk by chunk otherwise.
+    """
+    if content_hash := getattr(file, "content_hash", None):
+        return content_hash
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def make_content_addressed_name(file):
+    """Returns the file name identical uploads share, e.g. `<sha256>.jpg`."""
+    extension = PurePosixPath(file.name).suffix.lower()
+    return f"{get_content_hash(file)}{extension}"
+
+
+def generate_presigned_post(key, content_type):
+    """
+    Returns the URL and form fields allowing a client to POST a prescription photo
+    directly to S3 under `key`.
+    The policy pins the content type and enforces the maximum upload size.
+    """
+    storage = get_photo_storage()
+    return get_s3_client(storage).generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(key),
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.PRESCRIPTION_UPLOAD_MAX_SIZE],
+        ],
+        ExpiresIn=settings.PRESCRIPTION_UPLOAD_URL_EXPIRE,
+    )
+
+
+def object_exists(key):
+    """
+    Returns True if `key` exists in the bucket.
+    Note that `S3Boto3Storage.exists()` can't be used as it always returns False
+    when `AWS_S3_FILE_OVERWRITE` is enabled.
+    """
+    storage = get_photo_storage()
+    try:
+        get_s3_client(storage).head_object(
+            Bucket=storage.bucket_name, Key=storage._normalize_name(key)
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
+
+
+def lock_photo(name):
+    """
+    Locks the (content addressed) photo, see `release_photo()`.
+    Uploads hold it from checking the photo is already stored until it's referenced.
+    It only holds across the instances with a shared cache, see `is_cache_shared()`.
+    """
+    return photo_locks.lock(name)
+
+
+def release_photo(name, renditions=()):
+    """
+    Deletes the photo and its renditions from the bucket, unless another prescription
+    still references the same (content addressed) photo.
+    To be called once the change is committed, the check being made under the lock
+    so a concurrent upload of the same photo can't start referencing it meanwhile.
+    Nothing gets deleted unless the cache is shared, the lock not holding otherwise.
+    """
+    if not name:
+        return
+    if not is_cache_shared():
+        logger.warning("Leaving the photo %s, the cache isn't shared", name)
+        return
+    with lock_photo(name) as locked:
+        # left in the bucket rather than risking deleting a referenced photo
+        if not locked or Prescription.objects.filter(photo_prescription=name).exists():
+            return
+        storage = get_photo_storage()
+        for key in (name, *renditions):
+            if key:
+                storage.delete(key)
+
+
+def release_photo_on_commit(name, renditions=()):
+    transaction.on_commit(lambda: release_photo(name, renditions))
@@ -1,6 +1,7 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from django.template.loader import render_to_string
 from rest_framework import generics, mixins, status, viewsets
 from rest_framework.exceptions import PermissionDenied
@@ -8,7 +9,9 @@ from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from nurse.management.commands._notifications import notify
+from helpers.async_views import AsyncAPIView
+from nurse.management.commands._notifications import anotify
+from nurse.management.commands._photos import process_photo_on_commit
 from nurse.models import Nurse, Patient, Prescription, UserOneSignalProfile
 from nurse.serializers import (
     ExpandedPrescriptionSerializer,
@@ -16,12 +19,27 @@ from nurse.serializers import (
     PatientSerializer,
     PrescriptionEmailSerializer,
     PrescriptionFileSerializer,
+    PrescriptionUploadConfirmSerializer,
+    PrescriptionUploadURLSerializer,
     UserOneSignalProfileSerializer,
     UserSerializer,
     UserSerializerV2,
 )
+from nurse.upload_handlers import (
+    get_prescription_upload_handlers,
+    release_uploads,
+)
 from nurse.utils.constants import FREE_LIMIT_MESSAGE
 from nurse.utils.email import send_mail_with_reply
+from nurse.utils.s3 import (
+    generate_presigned_post,
+    lock_photo,
+    make_upload_key,
+    make_upload_name,
+    move_upload,
+    object_exists,
+    release_photo_on_commit,
+)
 
 
 class DynamicFieldsMixin:
@@ -52,12 +70,14 @@ class DynamicFieldsMixin:
         return super().get_serializer(*args, **kwargs)
 
 
-class SendEmailToDoctorView(APIView):
-    def post(self, request, pk):
+class SendEmailToDoctorView(AsyncAPIView):
+    async def post(self, request, pk):
         serializer = PrescriptionEmailSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        prescription = get_object_or_404(Prescription, id=pk)
+        prescription = await aget_object_or_404(
+            Prescription.objects.select_related("patient"), id=pk
+        )
         patient = prescription.patient
         email_doctor = prescription.email_doctor
         if not email_doctor:
@@ -66,9 +86,9 @@ class SendEmailToDoctorView(APIView):
             )
 
         user = request.user
-        nurse, _ = Nurse.objects.get_or_create(user=user)
+        nurse, _ = await Nurse.objects.aget_or_create(user=user)
 
-        if not nurse.patients.filter(id=patient.id).exists():
+        if not await nurse.patients.filter(id=patient.id).aexists():
             return Response(
                 {"error": "You are not authorized to send emails to this patient"},
                 status=status.HTTP_403_FORBIDDEN,
@@ -97,7 +117,9 @@ class SendEmailToDoctorView(APIView):
             },
         )
         try:
-            send_mail_with_reply(
+            # the SMTP exchange runs in a thread of its own, leaving the one
+            # serializing the database queries available
+            await sync_to_async(send_mail_with_reply, thread_sensitive=False)(
                 subject,
                 "",
                 settings.EMAIL_HOST_USER,
@@ -172,6 +194,94 @@ class PrescriptionFileView(generics.UpdateAPIView):
     queryset = Prescription.objects.all()
     serializer_class = PrescriptionFileSerializer
 
+    def initialize_request(self, request, *args, **kwargs):
+        # streams (and hashes) the photo to S3 while it's being received
+        request.upload_handlers = get_prescription_upload_handlers(request)
+        return super().initialize_request(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        finally:
+            # the photo got streamed to the bucket before being validated
+            release_uploads(request)
+
+
+class NursePrescriptionMixin:
+    """Looks up the prescription from the URL among the logged in nurse's ones."""
+
+    def get_prescription(self, request, pk):
+        queryset = Prescription.objects.filter(patient__nurse__user=request.user)
+        return get_object_or_404(queryset, id=pk)
+
+
+class PrescriptionUploadURLView(NursePrescriptionMixin, APIView):
+    """
+    Issues a presigned POST so the client uploads the prescription photo straight
+    to S3, the image bytes never go through the backend.
+    The returned `upload_token` is then to be sent to `PrescriptionUploadConfirmView`.
+    """
+
+    def post(self, request, pk):
+        prescription = self.get_prescription(request, pk)
+        serializer = PrescriptionUploadURLSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key = make_upload_key(serializer.validated_data["filename"])
+        presigned_post = generate_presigned_post(
+            key, serializer.validated_data["content_type"]
+        )
+        upload_token = PrescriptionUploadConfirmSerializer.make_token(
+            prescription.id, key
+        )
+        return Response(
+            {
+                "url": presigned_post["url"],
+                "fields": presigned_post["fields"],
+                "key": key,
+                "upload_token": upload_token,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class PrescriptionUploadConfirmView(NursePrescriptionMixin, APIView):
+    """Attaches a photo uploaded via `PrescriptionUploadURLView` to the prescription."""
+
+    def post(self, request, pk):
+        prescription = self.get_prescription(request, pk)
+        serializer = PrescriptionUploadConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["upload_token"]
+        if upload["prescription"] != prescription.id:
+            return Response(
+                {"upload_token": ["Upload token issued for another prescription."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not object_exists(upload["key"]):
+            return Response(
+                {"upload_token": ["The file wasn't uploaded."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        name = make_upload_name(upload["key"])
+        # stops the same photo from being released meanwhile, see `release_photo()`
+        with lock_photo(name):
+            move_upload(upload["key"], name)
+            # unless the same photo is uploaded again
+            if (previous := prescription.photo_prescription.name) != name:
+                renditions = (
+                    prescription.photo_prescription_web.name,
+                    prescription.photo_prescription_thumbnail.name,
+                )
+                prescription.photo_prescription.name = name
+                prescription.clear_photo_renditions()
+                prescription.save()
+                release_photo_on_commit(previous, renditions)
+                process_photo_on_commit(prescription)
+        serializer = PrescriptionFileSerializer(
+            prescription, context={"request": request}
+        )
+        return Response(serializer.data)
+
 
 class NurseViewSet(viewsets.ModelViewSet):
     queryset = Nurse.objects.all()
@@ -273,11 +383,11 @@ class UserCreateV2(UserCreate):
         Nurse.objects.get_or_create(user=user)
 
 
-class AdminNotificationView(APIView):
+class AdminNotificationView(AsyncAPIView):
     """The view dealing with sending push notifications."""
 
     permission_classes = [IsAdminUser]
 
-    def post(self, request):
-        notify()
+    async def post(self, request):
+        await anotify()
         return Response(status=status.HTTP_204_NO_CONTENT)
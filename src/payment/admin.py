@@ -1,6 +1,12 @@
 from django.contrib import admin
 
-from payment.models import CustomerDetail, StripeProduct, Subscription
+from payment.models import (
+    CustomerDetail,
+    Invoice,
+    StripeEvent,
+    StripeProduct,
+    Subscription,
+)
 
 
 @admin.register(StripeProduct)
@@ -31,3 +37,30 @@ class CustomerDetailAdmin(admin.ModelAdmin):
         "postal_code",
         "email",
     )
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "event_id",
+        "type",
+        "received_at",
+        "processed_at",
+        "attempts",
+        "last_error",
+    )
+    list_filter = ("type",)
+    search_fields = ("event_id",)
+
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = (
+        "stripe_invoice_id",
+        "user",
+        "amount_paid",
+        "currency",
+        "status",
+        "created",
+    )
+    search_fields = ("stripe_invoice_id", "user__username")
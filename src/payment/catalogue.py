@@ -0,0 +1,72 @@
+import threading
+import time
+import uuid
+
+from django.http import Http404
+
+from helpers.cache import CacheNamespace
+from payment.models import StripeProduct
+
+# the changes made without invalidating the catalogue (e.g. via the shell) show up
+# after that many seconds at the latest
+CATALOGUE_TTL = 300
+# how often a process checks whether another one invalidated the catalogue, e.g.
+# on an admin save (in seconds)
+CATALOGUE_CHECK_INTERVAL = 10
+
+# only the version of the catalogue is shared by the processes, the products are
+# kept in process so a checkout doesn't pay for a cache round trip
+stripe_products = CacheNamespace("stripe-products")
+
+_lock = threading.Lock()
+_catalogue = None
+_version = None
+_loaded_at = None
+_checked_at = None
+
+
+def get_catalogue():
+    """
+    Returns the Stripe products keyed by name.
+    They're all loaded at once then kept in process, as they almost never change.
+    """
+    global _catalogue, _version, _loaded_at, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _catalogue is not None and now - _checked_at > CATALOGUE_CHECK_INTERVAL:
+            _checked_at = now
+            if stripe_products.get("version") != _version:
+                _catalogue = None
+        if _catalogue is None or now - _loaded_at > CATALOGUE_TTL:
+            # read first, so an invalidation made while loading isn't missed
+            _version = stripe_products.get("version")
+            _catalogue = {
+                product.name: product for product in StripeProduct.objects.all()
+            }
+            _loaded_at = _checked_at = now
+        return _catalogue
+
+
+def invalidate_catalogue():
+    """
+    Drops the catalogue so it gets reloaded on next access, by the other processes
+    within `CATALOGUE_CHECK_INTERVAL` seconds.
+    """
+    global _catalogue
+    with _lock:
+        _catalogue = None
+    stripe_products.set("version", uuid.uuid4().hex, timeout=None)
+
+
+def get_product(name):
+    """Returns the product from the catalogue, raises `Http404` if there's none."""
+    try:
+        return get_catalogue()[name]
+    except KeyError:
+        raise Http404(f"No {StripeProduct._meta.object_name} matches the given query.")
+
+
+def get_price_id(name, plan):
+    """Returns the Stripe price of the product for the "monthly" or "annual" plan."""
+    product = get_product(name)
+    return product.monthly_price_id if plan == "monthly" else product.annual_price_id
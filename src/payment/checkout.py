@@ -0,0 +1,56 @@
+import time
+
+from helpers.cache import CacheNamespace
+from payment import constants
+
+checkout_sessions = CacheNamespace("checkout-session")
+
+
+def get_checkout_session_cache_key(user_id, plan):
+    return f"{user_id}:{plan}"
+
+
+def get_open_checkout_session(user_id, plan):
+    """Returns the cached open Checkout session of the user for the plan, if any."""
+    return checkout_sessions.get(get_checkout_session_cache_key(user_id, plan))
+
+
+async def aget_open_checkout_session(user_id, plan):
+    return await checkout_sessions.aget(get_checkout_session_cache_key(user_id, plan))
+
+
+def get_checkout_session_timeout(checkout_session):
+    return (
+        checkout_session.expires_at
+        - int(time.time())
+        - constants.CHECKOUT_SESSION_CACHE_MARGIN
+    )
+
+
+def cache_checkout_session(user_id, plan, checkout_session):
+    """
+    Caches the Checkout session until shortly before it expires, so double taps and
+    back navigation reuse it rather than creating orphan sessions.
+    """
+    timeout = get_checkout_session_timeout(checkout_session)
+    if timeout > 0:
+        checkout_sessions.set(
+            get_checkout_session_cache_key(user_id, plan),
+            {"id": checkout_session.id, "url": checkout_session.url},
+            timeout=timeout,
+        )
+
+
+async def acache_checkout_session(user_id, plan, checkout_session):
+    timeout = get_checkout_session_timeout(checkout_session)
+    if timeout > 0:
+        await checkout_sessions.aset(
+            get_checkout_session_cache_key(user_id, plan),
+            {"id": checkout_session.id, "url": checkout_session.url},
+            timeout=timeout,
+        )
+
+
+def forget_checkout_session(user_id, plan):
+    """Drops the cached session, e.g. once completed or expired."""
+    checkout_sessions.delete(get_checkout_session_cache_key(user_id, plan))
@@ -1 +1,14 @@
 STRIPE_API_VERSION = "2024-10-28.acacia"
+# Checkout sessions expire after 35 minutes, Stripe rejecting less than 30 from the
+# time it receives the request
+CHECKOUT_SESSION_EXPIRE = 35 * 60
+# stops handing out a cached session that long before it expires (in seconds)
+CHECKOUT_SESSION_CACHE_MARGIN = 60
+# the status of a deleted subscription, which can't be reactivated
+STRIPE_SUBSCRIPTION_CANCELED = "canceled"
+# the statuses of the subscriptions giving access to the paid plan
+STRIPE_SUBSCRIPTION_ACTIVE_STATUSES = ("active", "trialing")
+# the status of the subscription created by a completed Checkout session, per
+# payment status of the session, the session status not being one of a subscription
+CHECKOUT_SUBSCRIPTION_STATUSES = {"paid": "active", "no_payment_required": "trialing"}
+CHECKOUT_SUBSCRIPTION_DEFAULT_STATUS = "incomplete"
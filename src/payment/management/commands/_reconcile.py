@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils import timezone
+
+from payment.models import Subscription
+from payment.stripe_client import get_stripe_client
+from payment.stripe_event_handlers import get_subscription_fields
+
+# the `Subscription` fields reconciled with Stripe
+FIELDS = (
+    "status",
+    "active",
+    "cancel_at_period_end",
+    "current_period_start",
+    "current_period_end",
+    "trial_end",
+)
+# used to partition the listing when fetching pages in parallel
+STATUSES = (
+    "active",
+    "canceled",
+    "incomplete",
+    "incomplete_expired",
+    "past_due",
+    "paused",
+    "trialing",
+    "unpaid",
+)
+BATCH_SIZE = 500
+PAGE_SIZE = 100
+
+
+def get_fields(stripe_subscription):
+    """Returns the local values of the Stripe subscription, in `FIELDS` order."""
+    fields = get_subscription_fields(stripe_subscription)
+    return tuple(fields[field] for field in FIELDS)
+
+
+def list_subscriptions(status="all"):
+    """Yields the id and local values of the Stripe subscriptions, page by page."""
+    subscriptions = get_stripe_client().subscriptions.list(
+        params={"status": status, "limit": PAGE_SIZE}
+    )
+    for stripe_subscription in subscriptions.auto_paging_iter():
+        yield stripe_subscription["id"], get_fields(stripe_subscription)
+
+
+def fetch_subscriptions(workers=None):
+    """
+    Yields the id and local values of all the Stripe subscriptions.
+    Given `workers`, the listing is partitioned by status and the partitions are
+    fetched in parallel.
+    """
+    if not workers:
+        yield from list_subscriptions()
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        partitions = executor.map(
+            lambda status: list(list_subscriptions(status)), STATUSES
+        )
+        for partition in partitions:
+            yield from partition
+
+
+def reconcile_subscriptions(workers=None, batch_size=BATCH_SIZE):
+    """
+    Updates the local subscriptions drifting from their Stripe counterpart, e.g.
+    following missed webhooks, returns the number of rows scanned and changed.
+    Local rows are held in memory as plain tuples keyed by Stripe id and only the
+    changed ones get written, in batches.
+    """
+    local = {
+        stripe_subscription_id: (pk, values)
+        for pk, stripe_subscription_id, *values in Subscription.objects.values_list(
+            "id", "stripe_subscription_id", *FIELDS
+        ).iterator()
+    }
+    scanned = changed = 0
+    batch = []
+    for stripe_subscription_id, fields in fetch_subscriptions(workers):
+        scanned += 1
+        pk, values = local.get(stripe_subscription_id, (None, None))
+        # subscriptions unknown locally are created by the webhooks
+        if pk is None or tuple(values) == fields:
+            continue
+        changed += 1
+        batch.append(
+            Subscription(id=pk, updated_at=timezone.now(), **dict(zip(FIELDS, fields)))
+        )
+        if len(batch) >= batch_size:
+            Subscription.objects.bulk_update(batch, (*FIELDS, "updated_at"))
+            batch = []
+    if batch:
+        Subscription.objects.bulk_update(batch, (*FIELDS, "updated_at"))
+    return scanned, changed
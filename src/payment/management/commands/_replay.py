@@ -0,0 +1,100 @@
+import hashlib
+import hmac
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import reverse
+
+from payment import webhooks
+
+
+def read_events(path):
+    """Returns the events of the JSONL file, one event per line."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Returns the `Stripe-Signature` header Stripe would send for `payload`."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def post_http(url, payload, signature):
+    """Posts the payload to a running server, returns the response status."""
+    request = urllib.request.Request(
+        url,
+        data=payload.encode(),
+        headers={"Content-Type": "application/json", "Stripe-Signature": signature},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def post_in_process(payload, signature):
+    """Invokes the webhook view directly, returns the response status."""
+    request = RequestFactory().post(
+        reverse("v1:payment:stripe-webhook"),
+        data=payload,
+        content_type="application/json",
+        HTTP_STRIPE_SIGNATURE=signature,
+    )
+    return webhooks.stripe_webhook(request).status_code
+
+
+def replay(events, secret, url=None, concurrency=1, repeat=1, unique_ids=False):
+    """
+    Signs and delivers the events to the webhook, either over HTTP to `url` or
+    in-process, returns the latencies in seconds per event type along with the
+    error count per event type and the total elapsed time.
+    """
+
+    def deliver(delivery):
+        event_round, event = delivery
+        if unique_ids:
+            # otherwise deduplicated after the first round
+            event = {**event, "id": f"{event['id']}_{event_round}"}
+        payload = json.dumps(event)
+        signature = sign_payload(payload, secret)
+        start = time.perf_counter()
+        if url:
+            status = post_http(url, payload, signature)
+        else:
+            status = post_in_process(payload, signature)
+        latency = time.perf_counter() - start
+        if not url and concurrency > 1:
+            # worker threads get their own database connection, closed as it would
+            # be at the end of the request by the server
+            connection.close()
+        return event["type"], status, latency
+
+    deliveries = [
+        (event_round, event) for event_round in range(repeat) for event in events
+    ]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = (
+            executor.map(deliver, deliveries)
+            if concurrency > 1
+            else map(deliver, deliveries)
+        )
+        for event_type, status, latency in results:
+            latencies[event_type].append(latency)
+            if status != 200:
+                errors[event_type] += 1
+    return latencies, errors, time.perf_counter() - start
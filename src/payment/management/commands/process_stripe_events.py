@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment.stripe_event_handlers import process_pending_events
+
+
+class Command(BaseCommand):
+    help = "Processes the Stripe events stored by the webhook"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, help="maximum number of events processed per run"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="keeps running as a worker, polling every given seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = process_pending_events(limit=options["limit"])
+            self.stdout.write(f"Processed {count} event(s)")
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ._reconcile import BATCH_SIZE, reconcile_subscriptions
+
+
+class Command(BaseCommand):
+    help = "Updates the local subscriptions drifting from Stripe"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="fetches the pages in parallel, partitioned by subscription status",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="number of rows updated per query",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        scanned, changed = reconcile_subscriptions(
+            workers=options["workers"], batch_size=options["batch_size"]
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Scanned {scanned} subscription(s), changed {changed} in {elapsed:.2f}s "
+            f"({scanned / elapsed:.1f} scanned/s, {changed / elapsed:.1f} changed/s)"
+        )
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from helpers.stats import percentile
+
+from ._replay import read_events, replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays Stripe events from a JSONL file against the webhook, "
+        "reporting the latency percentiles and throughput per event type"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file with one Stripe event per line")
+        parser.add_argument(
+            "--url",
+            help=(
+                "webhook URL of a running server, "
+                "e.g. http://localhost:8000/api/v1/payment/stripe/webhook/ "
+                "the view is invoked in-process otherwise"
+            ),
+        )
+        parser.add_argument(
+            "--secret",
+            default=settings.STRIPE_WEBHOOK_SECRET,
+            help="webhook secret the events are signed with",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=1, help="number of concurrent requests"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=1, help="number of times the file is replayed"
+        )
+        parser.add_argument(
+            "--unique-ids",
+            action="store_true",
+            help="suffixes the event ids with the round so repeats aren't duplicates",
+        )
+
+    def handle(self, *args, **options):
+        events = read_events(options["path"])
+        latencies, errors, elapsed = replay(
+            events,
+            options["secret"],
+            url=options["url"],
+            concurrency=options["concurrency"],
+            repeat=options["repeat"],
+            unique_ids=options["unique_ids"],
+        )
+        self.stdout.write(
+            f"{'event type':<32}{'events':>8}{'errors':>8}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'events/s':>10}"
+        )
+        total = 0
+        for event_type, values in sorted(latencies.items()):
+            values.sort()
+            total += len(values)
+            p50, p95, p99 = (percentile(values, p) * 1000 for p in (50, 95, 99))
+            self.stdout.write(
+                f"{event_type:<32}{len(values):>8}{errors[event_type]:>8}"
+                f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{len(values) / elapsed:>10.1f}"
+            )
+        self.stdout.write(
+            f"Replayed {total} event(s) in {elapsed:.2f}s, "
+            f"{total / elapsed:.1f} events/s, {sum(errors.values())} error(s)"
+        )
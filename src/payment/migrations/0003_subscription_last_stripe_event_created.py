@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0002_stripeevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="last_stripe_event_created",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                help_text="Stripe timestamp of the last subscription event applied",
+                null=True,
+            ),
+        ),
+    ]
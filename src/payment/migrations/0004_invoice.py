@@ -0,0 +1,66 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0003_subscription_last_stripe_event_created"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Invoice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("stripe_invoice_id", models.CharField(max_length=255, unique=True)),
+                (
+                    "stripe_subscription_id",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("number", models.CharField(blank=True, max_length=255, null=True)),
+                ("amount_paid", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("currency", models.CharField(max_length=3)),
+                ("status", models.CharField(max_length=50)),
+                (
+                    "hosted_invoice_url",
+                    models.URLField(blank=True, max_length=500, null=True),
+                ),
+                ("invoice_pdf", models.URLField(blank=True, max_length=500, null=True)),
+                (
+                    "created",
+                    models.DateTimeField(
+                        help_text="when the invoice was created on Stripe"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invoices",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-created", "-id"],
+                        name="payment_invoice_history_idx",
+                    )
+                ],
+            },
+        ),
+    ]
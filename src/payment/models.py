@@ -24,6 +24,11 @@ class Subscription(models.Model):
     )
     hosted_invoice_url = models.URLField(max_length=500, null=True, blank=True)
     invoice_pdf = models.URLField(max_length=500, null=True, blank=True)
+    last_stripe_event_created = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Stripe timestamp of the last subscription event applied",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -70,3 +75,61 @@ class StripeProduct(models.Model):
 
     def __str__(self):
         return f"StripeProduct for {self.name}"
+
+
+class StripeEventManager(models.Manager):
+    # gives up on events failing that many times, leaving them for investigation
+    MAX_ATTEMPTS = 5
+
+    def pending(self):
+        """Events not yet successfully processed, that are still worth retrying."""
+        return self.filter(processed_at__isnull=True, attempts__lt=self.MAX_ATTEMPTS)
+
+
+class StripeEvent(models.Model):
+    """
+    Verified Stripe webhook events, stored as received and processed asynchronously
+    so the webhook can be acknowledged right away.
+    """
+
+    # Stripe delivers events at least once, redeliveries are ignored on insert
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    payload = models.JSONField()
+    created = models.PositiveBigIntegerField(
+        null=True, blank=True, help_text="Stripe creation timestamp of the event"
+    )
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    objects = StripeEventManager()
+
+    def __str__(self):
+        return f"StripeEvent {self.event_id} ({self.type})"
+
+
+class Invoice(models.Model):
+    """Paid Stripe invoices, stored from the webhooks for the billing history."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="invoices")
+    stripe_invoice_id = models.CharField(max_length=255, unique=True)
+    stripe_subscription_id = models.CharField(max_length=255, null=True, blank=True)
+    number = models.CharField(max_length=255, null=True, blank=True)
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    status = models.CharField(max_length=50)
+    hosted_invoice_url = models.URLField(max_length=500, null=True, blank=True)
+    invoice_pdf = models.URLField(max_length=500, null=True, blank=True)
+    created = models.DateTimeField(help_text="when the invoice was created on Stripe")
+
+    class Meta:
+        indexes = [
+            # the billing history is listed per user, most recent first
+            models.Index(
+                fields=["user", "-created", "-id"], name="payment_invoice_history_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Invoice {self.stripe_invoice_id} of {self.user.username}"
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from payment.models import Subscription
+from payment.models import Invoice, Subscription
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -11,3 +11,19 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             "user": {"read_only": True},
             "stripe_subscription_id": {"required": False},
         }
+
+
+class InvoiceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Invoice
+        fields = (
+            "id",
+            "stripe_invoice_id",
+            "number",
+            "amount_paid",
+            "currency",
+            "status",
+            "hosted_invoice_url",
+            "invoice_pdf",
+            "created",
+        )
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from payment.catalogue import invalidate_catalogue
+from payment.models import StripeProduct
+
+
+@receiver(post_save, sender=StripeProduct)
+@receiver(post_delete, sender=StripeProduct)
+def invalidate_stripe_product_catalogue(sender, **kwargs):
+    invalidate_catalogue()
+    # in case it got reloaded by another thread before the change was committed
+    transaction.on_commit(invalidate_catalogue)
@@ -0,0 +1,50 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from payment import constants
+
+# `stripe` is imported on first use rather than at startup, it takes longer to
+# import than the rest of the app, see the `startup_profile` command
+
+# the threads of the process calling Stripe for the async views, see `acall_stripe()`,
+# outliving the event loops so their `requests` sessions do too
+STRIPE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.STRIPE_MAX_CONNECTIONS, thread_name_prefix="stripe"
+)
+
+
+@functools.cache
+def get_stripe_client():
+    """
+    Returns the Stripe client shared by the process.
+    Reusing it keeps the HTTP connections to the API alive between requests rather
+    than paying for a new TLS handshake on every call, the `requests` session
+    being per thread.
+    It's configured explicitly, leaving the global `stripe` module state untouched.
+    The async views call it in a thread, see `acall_stripe()`.
+    """
+    import stripe
+
+    return stripe.StripeClient(
+        settings.STRIPE_API_KEY,
+        stripe_version=constants.STRIPE_API_VERSION,
+        http_client=stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT),
+        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+    )
+
+
+async def acall_stripe(method, *args, **kwargs):
+    """
+    Calls the method of the shared client, e.g. `client.subscriptions.update`,
+    in one of the `STRIPE_EXECUTOR` threads.
+    Rather than the `*_async()` methods, whose httpx client is bound to an event
+    loop, while under WSGI every async view runs in a loop of its own, which would
+    pay for a new client and TLS handshake every time. For the same reason the
+    threads aren't the loop's default executor ones.
+    """
+    return await sync_to_async(
+        method, thread_sensitive=False, executor=STRIPE_EXECUTOR
+    )(*args, **kwargs)
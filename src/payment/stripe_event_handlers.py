@@ -1,9 +1,61 @@
+import logging
 from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
 
+from django.core.exceptions import BadRequest
+from django.db import transaction
+from django.db.models import Q, Subquery
 from django.utils import timezone
 
 from helpers.model_utils import get_object_or_400
-from payment.models import CustomerDetail, Subscription, User
+from payment import constants
+from payment.checkout import forget_checkout_session
+from payment.models import (
+    CustomerDetail,
+    Invoice,
+    StripeEvent,
+    Subscription,
+    User,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def from_timestamp(timestamp):
+    """Returns the aware datetime of the Stripe timestamp, None if unset."""
+    if not timestamp or timestamp == "null":
+        return None
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def is_subscription_active(status):
+    """Returns whether the Stripe subscription status gives access to the paid plan."""
+    return status in constants.STRIPE_SUBSCRIPTION_ACTIVE_STATUSES
+
+
+def get_subscription_fields(stripe_subscription):
+    """
+    Returns the local `Subscription` fields of the Stripe subscription object, the
+    one mapping shared by the webhooks and the reconciliation, see `_reconcile`.
+    """
+    return {
+        "status": stripe_subscription["status"],
+        "active": is_subscription_active(stripe_subscription["status"]),
+        "cancel_at_period_end": stripe_subscription["cancel_at_period_end"],
+        "current_period_start": from_timestamp(
+            stripe_subscription["current_period_start"]
+        ),
+        "current_period_end": from_timestamp(stripe_subscription["current_period_end"]),
+        "trial_end": from_timestamp(stripe_subscription["trial_end"]),
+    }
+
+
+def get_checkout_subscription_status(session):
+    """Returns the status of the subscription the completed Checkout session created."""
+    return constants.CHECKOUT_SUBSCRIPTION_STATUSES.get(
+        session["payment_status"], constants.CHECKOUT_SUBSCRIPTION_DEFAULT_STATUS
+    )
 
 
 def handle_checkout_session_completed(event):
@@ -13,6 +65,7 @@ def handle_checkout_session_completed(event):
     """
     session = event["data"]["object"]
     user = get_object_or_400(User, id=session["metadata"]["user_id"])
+    forget_checkout_session_of(session)
     CustomerDetail.objects.update_or_create(
         user=user,
         defaults={
@@ -24,11 +77,13 @@ def handle_checkout_session_completed(event):
             "email": session["customer_details"]["email"],
         },
     )
+    status = get_checkout_subscription_status(session)
     Subscription.objects.update_or_create(
         user=user,
         defaults={
             "stripe_subscription_id": session["subscription"],
-            "status": session["status"],
+            "status": status,
+            "active": is_subscription_active(status),
             "payment_status": session["payment_status"],
             "product_name": session["metadata"]["product_name"],
             "total_price": session["amount_total"] / 100,
@@ -36,49 +91,108 @@ def handle_checkout_session_completed(event):
     )
 
 
+def handle_checkout_session_expired(event):
+    """
+    Handles the "checkout.session.expired" Stripe event.
+    Stops handing out the expired session to the user.
+    """
+    forget_checkout_session_of(event["data"]["object"])
+
+
+def forget_checkout_session_of(session):
+    """Drops the session from the open sessions cache, see `payment.checkout`."""
+    metadata = session["metadata"]
+    # sessions created before the plan got added to the metadata weren't cached
+    if "plan" in metadata:
+        forget_checkout_session(metadata["user_id"], metadata["plan"])
+
+
+def update_customer_subscription(stripe_customer_id, event=None, **fields):
+    """
+    Updates the subscription of the Stripe customer in a single UPDATE statement,
+    joined on `stripe_customer_id` through a subquery.
+    Given the subscription `event`, the update is conditional to no newer event
+    having already been applied, so events delivered out of order don't overwrite
+    a more recent state. Of the events created within the same second, the ones
+    applied after the subscription got canceled are ignored.
+    Returns the number of updated rows.
+
+    Raises:
+    BadRequest: If the customer does not exist.
+    """
+    subscriptions = Subscription.objects.filter(
+        user__customer_details__stripe_customer_id=stripe_customer_id
+    )
+    if event is not None and (created := event.get("created")) is not None:
+        subscriptions = subscriptions.filter(
+            Q(last_stripe_event_created__isnull=True)
+            | Q(last_stripe_event_created__lt=created)
+            # `created` has a one second resolution, a deletion being final
+            | Q(last_stripe_event_created=created)
+            & ~Q(status=constants.STRIPE_SUBSCRIPTION_CANCELED)
+        )
+        fields["last_stripe_event_created"] = created
+    updated = subscriptions.update(**fields)
+    # only pays for the existence check when nothing got updated
+    if (
+        not updated
+        and not CustomerDetail.objects.filter(
+            stripe_customer_id=stripe_customer_id
+        ).exists()
+    ):
+        raise BadRequest(f"{CustomerDetail.__name__} does not exist.")
+    return updated
+
+
 def handle_customer_subscription_updated(event):
     """
     Handles the "customer.subscription.updated" Stripe event.
     Updates the subscription information for the user.
     """
     subscription_updated = event["data"]["object"]
-    customer = get_object_or_400(
-        CustomerDetail, stripe_customer_id=subscription_updated["customer"]
-    )
-    user = customer.user
-    Subscription.objects.filter(user=user).update(
-        cancel_at_period_end=subscription_updated["cancel_at_period_end"],
-        current_period_start=timezone.make_aware(
-            datetime.fromtimestamp(subscription_updated["current_period_start"])
-        ),
-        current_period_end=timezone.make_aware(
-            datetime.fromtimestamp(subscription_updated["current_period_end"])
-        ),
-        trial_end=(
-            timezone.make_aware(
-                datetime.fromtimestamp(subscription_updated["trial_end"])
-            )
-            if subscription_updated["trial_end"]
-            and subscription_updated["trial_end"] != "null"
-            else None
-        ),
-        active=bool(subscription_updated["items"]["data"][0]["plan"]["active"]),
+    update_customer_subscription(
+        subscription_updated["customer"],
+        event,
+        **get_subscription_fields(subscription_updated),
     )
 
 
 def handle_invoice_paid(event):
     """
     Handles the "invoice.paid" Stripe event.
-    Updates the invoice information for the user's subscription.
+    Records the invoice in the user's billing history and updates the latest
+    invoice information of the subscription.
     """
     invoice_paid = event["data"]["object"]
-    customer = get_object_or_400(
-        CustomerDetail, stripe_customer_id=invoice_paid["customer"]
+    # also raises if the customer doesn't exist, before inserting the invoice
+    update_customer_subscription(
+        invoice_paid["customer"],
+        hosted_invoice_url=invoice_paid["hosted_invoice_url"],
+        invoice_pdf=invoice_paid["invoice_pdf"],
     )
-    user = customer.user
-    Subscription.objects.filter(user=user).update(
+    invoice = Invoice(
+        # the user gets looked up in the INSERT statement itself
+        user_id=Subquery(
+            CustomerDetail.objects.filter(
+                stripe_customer_id=invoice_paid["customer"]
+            ).values("user_id")[:1]
+        ),
+        stripe_invoice_id=invoice_paid["id"],
+        stripe_subscription_id=invoice_paid.get("subscription"),
+        number=invoice_paid.get("number"),
+        amount_paid=Decimal(invoice_paid["amount_paid"]) / 100,
+        currency=invoice_paid["currency"],
+        status=invoice_paid["status"],
         hosted_invoice_url=invoice_paid["hosted_invoice_url"],
         invoice_pdf=invoice_paid["invoice_pdf"],
+        created=timezone.make_aware(datetime.fromtimestamp(invoice_paid["created"])),
+    )
+    # upserts, as the invoice could be updated after being stored
+    Invoice.objects.bulk_create(
+        [invoice],
+        update_conflicts=True,
+        unique_fields=["stripe_invoice_id"],
+        update_fields=["status", "hosted_invoice_url", "invoice_pdf"],
     )
 
 
@@ -88,15 +202,96 @@ def handle_customer_subscription_deleted(event):
     Updates the subscription status and active state for the user.
     """
     subscription_deleted = event["data"]["object"]
-    customer = get_object_or_400(
-        CustomerDetail, stripe_customer_id=subscription_deleted["customer"]
-    )
-    user = customer.user
-    Subscription.objects.filter(user=user).update(
-        status=subscription_deleted.get("status"), active=False
+    update_customer_subscription(
+        subscription_deleted["customer"],
+        event,
+        status=subscription_deleted["status"],
+        active=is_subscription_active(subscription_deleted["status"]),
     )
 
 
 def handle_default(event):
     """No operation for unhandled events"""
     pass
+
+
+HANDLERS = {
+    "checkout.session.completed": handle_checkout_session_completed,
+    "checkout.session.expired": handle_checkout_session_expired,
+    "customer.subscription.updated": handle_customer_subscription_updated,
+    "invoice.paid": handle_invoice_paid,
+    "customer.subscription.deleted": handle_customer_subscription_deleted,
+}
+
+
+def handle_event(event):
+    """Dispatches the Stripe event to its handler."""
+    handler = HANDLERS.get(event["type"], handle_default)
+    handler(event)
+
+
+def store_event(event):
+    """
+    Persists the verified Stripe event for `process_event()` to handle it.
+    Redeliveries of an already stored event are skipped by the unique index on
+    `event_id` in a single insert-or-ignore statement.
+    """
+    StripeEvent.objects.bulk_create(
+        [
+            StripeEvent(
+                event_id=event["id"],
+                type=event["type"],
+                payload=event,
+                created=event.get("created"),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def process_event(stripe_event, raise_errors=()):
+    """
+    Runs the handler of the stored event, returns True if it succeeded.
+    Failures are recorded on the event so it gets retried on the next run, the
+    `raise_errors` exceptions being raised again once recorded.
+    """
+    stripe_event.attempts += 1
+    error = None
+    try:
+        # so a failing handler doesn't leave partial changes behind
+        with transaction.atomic():
+            handle_event(stripe_event.payload)
+    except Exception as e:
+        logger.exception("Failed processing Stripe event %s", stripe_event.event_id)
+        stripe_event.last_error = f"{type(e).__name__}: {e}"
+        error = e
+    else:
+        stripe_event.processed_at = timezone.now()
+        stripe_event.last_error = ""
+    stripe_event.save(update_fields=["attempts", "processed_at", "last_error"])
+    if isinstance(error, raise_errors):
+        raise error
+    return stripe_event.processed_at is not None
+
+
+def process_pending_events(limit=None):
+    """
+    Processes the stored events in the order Stripe created them,
+    returns how many were successfully.
+    """
+    pending = StripeEvent.objects.pending().order_by("created", "id")
+    if limit is not None:
+        pending = pending[:limit]
+    count = 0
+    for pk in pending.values_list("id", flat=True):
+        with transaction.atomic():
+            # skips events another worker is already processing
+            stripe_event = (
+                StripeEvent.objects.pending()
+                .select_for_update(skip_locked=True)
+                .filter(id=pk)
+                .first()
+            )
+            if stripe_event is not None:
+                count += process_event(stripe_event)
+    return count
@@ -1,12 +1,17 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from payment.views import SubscriptionUserCancelView, SubscriptionViewSet
+from payment.views import (
+    InvoiceViewSet,
+    SubscriptionUserCancelView,
+    SubscriptionViewSet,
+)
 
 from . import webhooks
 
 router = routers.DefaultRouter()
 router.register("subscription", SubscriptionViewSet)
+router.register("invoice", InvoiceViewSet)
 
 app_name = "payment"
 
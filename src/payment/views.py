@@ -1,20 +1,23 @@
-import stripe
+import time
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.shortcuts import get_object_or_404
-from rest_framework import status, viewsets
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from rest_framework import pagination, status, viewsets
 from rest_framework.response import Response
-from rest_framework.views import APIView
 
+from helpers.async_views import AsyncAPIView, AsyncViewSetMixin
 from payment import constants
-from payment.models import StripeProduct, Subscription
-from payment.serializers import SubscriptionSerializer
+from payment.catalogue import get_price_id, get_product
+from payment.checkout import acache_checkout_session, aget_open_checkout_session
+from payment.models import Invoice, Subscription
+from payment.serializers import InvoiceSerializer, SubscriptionSerializer
+from payment.stripe_client import acall_stripe, get_stripe_client
 
 ESSENTIAL_PLAN_NAME = "Essentiel"
 
 
-class SubscriptionViewSet(viewsets.ModelViewSet):
-    stripe.api_key = settings.STRIPE_API_KEY
-    stripe.api_version = constants.STRIPE_API_VERSION
+class SubscriptionViewSet(AsyncViewSetMixin, viewsets.ModelViewSet):
     plan_name = ESSENTIAL_PLAN_NAME
 
     queryset = Subscription.objects.all()
@@ -23,28 +26,42 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
 
-    def create(self, request, *args, **kwargs):
+    async def create(self, request, *args, **kwargs):
         user = request.user
-        plan = request.data.get("plan")  # "monthly" ou "annual"
-        product = get_object_or_404(StripeProduct, name=self.plan_name)
-        price_id = (
-            product.monthly_price_id if plan == "monthly" else product.annual_price_id
-        )
-
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            customer_email=user.email,
-            line_items=[{"price": price_id, "quantity": 1}],
-            mode="subscription",
-            billing_address_collection="required",
-            currency="eur",
-            success_url=f"{settings.FRONTEND_URL}/success?checkout=true",
-            cancel_url=f"{settings.FRONTEND_URL}/cancel?checkout=true",
-            metadata={
-                "user_id": user.id,
-                "product_name": product.name,
+        plan = "monthly" if request.data.get("plan") == "monthly" else "annual"
+        if checkout_session := await aget_open_checkout_session(user.id, plan):
+            # saves the Stripe round trip and an orphan session on repeat requests
+            return Response(
+                {
+                    "sessionId": checkout_session["id"],
+                    "checkout_url": checkout_session["url"],
+                },
+                status=status.HTTP_201_CREATED,
+            )
+        # from the catalogue kept in process, in a thread as it may get reloaded
+        product = await sync_to_async(get_product)(self.plan_name)
+        price_id = await sync_to_async(get_price_id)(self.plan_name, plan)
+
+        checkout_session = await acall_stripe(
+            get_stripe_client().checkout.sessions.create,
+            params={
+                "payment_method_types": ["card"],
+                "customer_email": user.email,
+                "line_items": [{"price": price_id, "quantity": 1}],
+                "mode": "subscription",
+                "billing_address_collection": "required",
+                "currency": "eur",
+                "success_url": f"{settings.FRONTEND_URL}/success?checkout=true",
+                "cancel_url": f"{settings.FRONTEND_URL}/cancel?checkout=true",
+                "expires_at": int(time.time()) + constants.CHECKOUT_SESSION_EXPIRE,
+                "metadata": {
+                    "user_id": user.id,
+                    "product_name": product.name,
+                    "plan": plan,
+                },
             },
         )
+        await acache_checkout_session(user.id, plan, checkout_session)
 
         return Response(
             {
@@ -60,7 +77,7 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class SubscriptionUserCancelView(APIView):
+class SubscriptionUserCancelView(AsyncAPIView):
     """
     Handles the cancelation of a subscription by the user.
 
@@ -68,14 +85,17 @@ class SubscriptionUserCancelView(APIView):
     It is called when the user requests to cancel their subscription.
     """
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
+        import stripe
+
         user = request.user
-        subscription = get_object_or_404(Subscription, user=user)
-        stripe.api_key = settings.STRIPE_API_KEY
+        subscription = await aget_object_or_404(Subscription, user=user)
 
         try:
-            stripe.Subscription.modify(
-                subscription.stripe_subscription_id, cancel_at_period_end=True
+            await acall_stripe(
+                get_stripe_client().subscriptions.update,
+                subscription.stripe_subscription_id,
+                params={"cancel_at_period_end": True},
             )
 
         except stripe.error.InvalidRequestError as e:
@@ -84,9 +104,27 @@ class SubscriptionUserCancelView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         subscription.cancel_at_period_end = True
-        subscription.save()
+        await subscription.asave()
 
         return Response(
             {"message": "Subscription canceled successfully"},
             status=status.HTTP_200_OK,
         )
+
+
+class InvoicePagination(pagination.CursorPagination):
+    """Keyset pagination, matching the `payment_invoice_history_idx` index."""
+
+    ordering = ("-created", "-id")
+    page_size = 20
+
+
+class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
+    """The user's billing history, served from the invoices stored by webhooks."""
+
+    queryset = Invoice.objects.all()
+    serializer_class = InvoiceSerializer
+    pagination_class = InvoicePagination
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
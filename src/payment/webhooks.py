@@ -1,27 +1,23 @@
 import logging
 
-import stripe
 from django.conf import settings
+from django.core.exceptions import BadRequest
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
-from .stripe_event_handlers import (
-    handle_checkout_session_completed,
-    handle_customer_subscription_deleted,
-    handle_customer_subscription_updated,
-    handle_default,
-    handle_invoice_paid,
-)
+from .models import StripeEvent
+from .stripe_event_handlers import process_event, store_event
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-stripe.api_key = settings.STRIPE_API_KEY
 STRIPE_WEBHOOK_SECRET = settings.STRIPE_WEBHOOK_SECRET
 
 
 @csrf_exempt
 def stripe_webhook(request):
+    import stripe
+
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
     event = None
@@ -33,13 +29,14 @@ def stripe_webhook(request):
     except ValueError as e:
         return HttpResponse(status=400, content=str(e))
 
-    handlers = {
-        "checkout.session.completed": handle_checkout_session_completed,
-        "customer.subscription.updated": handle_customer_subscription_updated,
-        "invoice.paid": handle_invoice_paid,
-        "customer.subscription.deleted": handle_customer_subscription_deleted,
-        "default": handle_default,
-    }
-    handler = handlers.get(event["type"], handlers["default"])
-    handler(event)
+    store_event(event)
+    if settings.STRIPE_WEBHOOK_PROCESS_INLINE:
+        # redeliveries of an already processed event are no-ops
+        pending = StripeEvent.objects.pending().filter(event_id=event["id"])
+        # a failure is recorded for the worker to retry it, an unknown customer
+        # or user still getting a 400 response
+        if stripe_event := pending.first():
+            process_event(stripe_event, raise_errors=(BadRequest,))
+    # otherwise acknowledges right away, the processing happening in
+    # `process_stripe_events` so a slow handler doesn't make Stripe time out
     return HttpResponse(status=200)
@@ -1,9 +1,12 @@
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.urls.base import reverse_lazy
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from payment.catalogue import invalidate_catalogue
+
 PASSWORD = "password1"
 FIRSTNAME = "John"
 LASTNAME = "Doe"
@@ -12,6 +15,21 @@ USERNAME = EMAIL
 EMAIL_HOST_USER = "support@ordopro.fr"
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Makes sure cached values don't leak from one test to another."""
+    yield
+    cache.clear()
+    invalidate_catalogue()
+
+
+@pytest.fixture
+def shared_cache(settings):
+    """Treats the cache as shared by the instances, see `is_cache_shared()`."""
+    # the local memory cache is still shared within the tests process
+    settings.CACHE_BACKEND = "database"
+
+
 @pytest.fixture
 def user(db):
     """Creates and yields a new user."""
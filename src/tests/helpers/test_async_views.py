@@ -0,0 +1,81 @@
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from rest_framework import exceptions, status, viewsets
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from helpers.async_views import AsyncAPIView, AsyncViewSetMixin
+
+factory = APIRequestFactory()
+
+
+class PingView(AsyncAPIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    async def get(self, request):
+        return Response({"pong": True})
+
+    def post(self, request):
+        return Response(request.data, status=status.HTTP_201_CREATED)
+
+    async def delete(self, request):
+        raise exceptions.NotFound()
+
+
+class PrivatePingView(PingView):
+    permission_classes = [IsAuthenticated]
+
+
+class PingViewSet(AsyncViewSetMixin, viewsets.ViewSet):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    async def list(self, request):
+        return Response([])
+
+    def retrieve(self, request, pk=None):
+        return Response({"id": pk})
+
+
+def test_async_api_view_is_async():
+    assert iscoroutinefunction(PingView.as_view())
+
+
+def test_async_api_view_async_handler():
+    response = async_to_sync(PingView.as_view())(factory.get("/"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {"pong": True}
+
+
+def test_async_api_view_sync_handler():
+    request = factory.post("/", {"ping": 1}, format="json")
+    response = async_to_sync(PingView.as_view())(request)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data == {"ping": 1}
+
+
+def test_async_api_view_exception():
+    response = async_to_sync(PingView.as_view())(factory.delete("/"))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_async_api_view_method_not_allowed():
+    response = async_to_sync(PingView.as_view())(factory.put("/"))
+    assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+def test_async_api_view_permission_denied():
+    response = async_to_sync(PrivatePingView.as_view())(factory.get("/"))
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_async_viewset():
+    view = PingViewSet.as_view({"get": "list"})
+    assert iscoroutinefunction(view)
+    response = async_to_sync(view)(factory.get("/"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == []
+    view = PingViewSet.as_view({"get": "retrieve"})
+    response = async_to_sync(view)(factory.get("/"), pk="1")
+    assert response.data == {"id": "1"}
@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+
+from helpers.cache import CacheNamespace, is_cache_shared
+
+namespace = CacheNamespace("test", version=2)
+
+
+def test_namespaced_and_versioned():
+    namespace.set("key", "value")
+    assert namespace.get("key") == "value"
+    assert cache.get("test:key", version=2) == "value"
+    assert CacheNamespace("other", version=2).get("key") is None
+    assert CacheNamespace("test", version=1).get("key") is None
+    namespace.delete("key")
+    assert namespace.get("key", "default") == "default"
+
+
+@pytest.mark.parametrize(
+    "backend, shared",
+    (("locmem", False), ("file", False), ("database", True), ("redis", True)),
+)
+def test_is_cache_shared(settings, backend, shared):
+    settings.CACHE_BACKEND = backend
+    assert is_cache_shared() is shared
+
+
+def test_get_many():
+    namespace.set_many({"a": 1, "b": 2})
+    assert cache.get("test:a", version=2) == 1
+    assert namespace.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+
+
+def test_async():
+    async_to_sync(namespace.aset)("key", "value")
+    assert async_to_sync(namespace.aget)("key") == "value"
+
+
+def test_lock():
+    with namespace.lock("key") as locked:
+        assert locked is True
+        assert cache.get("test:key:lock", version=2) is True
+        # held until released
+        with namespace.lock("key", timeout=0.1) as locked:
+            assert locked is False
+    assert cache.get("test:key:lock", version=2) is None
+
+
+def test_lock_wait():
+    """Waits for the current holder to release the lock."""
+    released = []
+
+    def hold():
+        with namespace.lock("key"):
+            started.set()
+            time.sleep(0.2)
+            released.append(1)
+
+    started = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(hold)
+        started.wait()
+        with namespace.lock("key") as locked:
+            assert locked is True
+            assert released == [1]
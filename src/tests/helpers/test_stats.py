@@ -0,0 +1,10 @@
+import pytest
+
+from helpers.stats import percentile
+
+
+@pytest.mark.parametrize(
+    "percent, expected", [(0, 1), (50, 5), (95, 10), (99, 10), (100, 10)]
+)
+def test_percentile(percent, expected):
+    assert percentile(list(range(1, 11)), percent) == expected
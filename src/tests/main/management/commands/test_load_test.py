@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from main.management.commands import _load_test
+
+
+def test_load_test(live_server):
+    latencies, errors, elapsed = _load_test.load_test(
+        live_server.url, ["/api/v1/version/"], concurrency=2, duration=0.2
+    )
+    assert len(latencies) >= 2
+    assert latencies == sorted(latencies)
+    assert errors == 0
+    assert elapsed >= 0.2
+
+
+def test_load_test_errors(live_server):
+    # the patients require authentication
+    latencies, errors, _ = _load_test.load_test(
+        live_server.url, ["/api/v1/patient/"], duration=0.2
+    )
+    assert errors == len(latencies)
+
+
+def test_get_connection_error():
+    # nothing listens on the port 1
+    connection = _load_test.make_connection("http://127.0.0.1:1")
+    assert _load_test.get(connection, "/", {}) is None
+
+
+def test_command(live_server):
+    stdout = StringIO()
+    call_command(
+        "load_test",
+        live_server.url,
+        "--duration",
+        "0.2",
+        "--concurrency",
+        "1",
+        stdout=stdout,
+    )
+    output = stdout.getvalue().splitlines()
+    assert output[0].split() == [
+        "requests",
+        "errors",
+        "req/s",
+        "p50",
+        "ms",
+        "p95",
+        "ms",
+        "p99",
+        "ms",
+    ]
+    assert output[1].split()[1] == "0"
@@ -0,0 +1,78 @@
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from main.management.commands import _startup_profile
+
+IMPORT_TIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       300 |        420 |   django.utils
+import time:      1000 |       1420 | django
+import time:      1848 |    1210028 | stripe
+import time:       200 |        200 |   stripe._error
+"""
+IMPORTS = [
+    ("_io", 2, 120, 120),
+    ("django.utils", 1, 300, 420),
+    ("django", 0, 1000, 1420),
+    ("stripe", 0, 1848, 1210028),
+    ("stripe._error", 1, 200, 200),
+]
+
+
+def test_parse_import_times():
+    assert _startup_profile.parse_import_times(IMPORT_TIME) == IMPORTS
+
+
+def test_get_import_time():
+    assert _startup_profile.get_import_time(IMPORTS) == 1420 + 1210028
+
+
+def test_get_package_times():
+    assert _startup_profile.get_package_times(IMPORTS) == {
+        "_io": 120,
+        "django": 1300,
+        "stripe": 2048,
+    }
+
+
+def test_profile_startup(monkeypatch):
+    monkeypatch.delenv("SENTRY_DSN", raising=False)
+    imports, elapsed = _startup_profile.profile_startup()
+    modules = {module for module, *_ in imports}
+    assert {"django", "main.wsgi", "nurse.views", "payment.views"} <= modules
+    assert elapsed > 0
+    # imported on first use
+    assert not {"onesignal_sdk", "sentry_sdk", "stripe"} & modules
+
+
+def test_profile_startup_error():
+    with pytest.raises(CommandError, match="ModuleNotFoundError"):
+        _startup_profile.profile_startup("import missing_module")
+
+
+@pytest.mark.parametrize("args", [[], ["--modules"]])
+def test_command(args):
+    out = StringIO()
+    with mock.patch(
+        "main.management.commands.startup_profile.profile_startup",
+        return_value=(IMPORTS, 1.5),
+    ):
+        call_command("startup_profile", *args, "--limit", "2", stdout=out)
+    lines = out.getvalue().splitlines()
+    assert lines[1].split()[0] == "stripe"
+    assert len(lines) == 4
+    assert lines[-1] == (
+        "Total: 1500.0 ms, of which 1211.4 ms importing 5 reported modules"
+    )
+
+
+def test_command_max_total_ms():
+    with mock.patch(
+        "main.management.commands.startup_profile.profile_startup",
+        return_value=(IMPORTS, 1.5),
+    ), pytest.raises(CommandError, match="Startup time 1500.0 ms exceeds 1000.0 ms"):
+        call_command("startup_profile", "--max-total-ms", "1000", stdout=StringIO())
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from main.management.commands import _memory
+
+SMAPS_ROLLUP = """\
+5601a74aa000-7fff80c18000 ---p 00000000 00:00 0                          [rollup]
+Rss:                1388 kB
+Pss:                 396 kB
+Pss_Anon:            104 kB
+Shared_Clean:       1244 kB
+Shared_Dirty:          0 kB
+Private_Clean:        40 kB
+Private_Dirty:       104 kB
+Referenced:         1388 kB
+"""
+
+
+@pytest.fixture
+def proc(tmp_path):
+    """A fake `/proc` with a master (1) and its workers (2 and 3)."""
+    for pid, ppid in ((1, 0), (2, 1), (3, 1), (4, 2)):
+        (tmp_path / str(pid)).mkdir()
+        (tmp_path / str(pid) / "smaps_rollup").write_text(SMAPS_ROLLUP)
+        (tmp_path / str(pid) / "stat").write_text(
+            f"{pid} (gunicorn: worker [main.wsgi]) S {ppid} {pid} {pid} 0"
+        )
+    return tmp_path
+
+
+def test_read_smaps_rollup(proc):
+    assert _memory.read_smaps_rollup(1, proc) == {
+        "Rss": 1388 * 1024,
+        "Pss": 396 * 1024,
+        "Shared_Clean": 1244 * 1024,
+        "Shared_Dirty": 0,
+        "Private_Clean": 40 * 1024,
+        "Private_Dirty": 104 * 1024,
+    }
+
+
+def test_get_children(proc):
+    assert _memory.get_children(1, proc) == [2, 3]
+    assert _memory.get_children(3, proc) == []
+
+
+def test_get_memory_usage(proc):
+    assert [pid for pid, _ in _memory.get_memory_usage(1, proc)] == [1, 2, 3]
+
+
+@pytest.mark.skipif(
+    not os.path.exists(f"/proc/{os.getpid()}/smaps_rollup"),
+    reason="requires Linux 4.14+",
+)
+def test_command():
+    with subprocess.Popen([sys.executable, "-c", "input()"], stdin=subprocess.PIPE):
+        stdout = StringIO()
+        call_command("worker_memory", os.getpid(), stdout=stdout)
+    output = stdout.getvalue().splitlines()
+    assert output[0].split()[:2] == ["pid", "role"]
+    assert output[1].split()[:2] == [str(os.getpid()), "master"]
+    assert output[2].split()[1] == "worker"
+    assert output[-2].startswith("Total PSS: ")
+    assert output[-1].startswith("Private per worker: ")
@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from main.db_routers import REPLICA, PrimaryReplicaRouter, use_replica
+from nurse.models import Patient
+
+router = PrimaryReplicaRouter()
+
+
+def test_db_for_read():
+    assert router.db_for_read(Patient) is None
+    token = use_replica.set(True)
+    try:
+        assert router.db_for_read(Patient) == REPLICA
+        assert router.db_for_read(User) == REPLICA
+        # so a token works right after it's issued
+        assert router.db_for_read(Token) is None
+    finally:
+        use_replica.reset(token)
+
+
+def test_db_for_write():
+    token = use_replica.set(True)
+    try:
+        assert router.db_for_write(Patient) is None
+    finally:
+        use_replica.reset(token)
+
+
+def test_allow_migrate():
+    assert router.allow_migrate("default", "nurse") is True
+    assert router.allow_migrate(REPLICA, "nurse") is False
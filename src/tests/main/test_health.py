@@ -0,0 +1,49 @@
+from unittest import mock
+
+import pytest
+from django.db import OperationalError
+
+from main import health
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    """Forgets the checks made by the previous tests."""
+    monkeypatch.setattr(health, "_result", None)
+    monkeypatch.setattr(health, "_migrated", False)
+
+
+@pytest.mark.django_db
+class TestReadiness:
+
+    def test_ready(self, django_assert_num_queries):
+        assert health.check_readiness() is None
+        assert health._migrated
+        # the migrations aren't checked again
+        with django_assert_num_queries(1):
+            assert health.check_readiness() is None
+
+    def test_database_unavailable(self):
+        with mock.patch(
+            "main.health.check_database", side_effect=OperationalError("refused")
+        ):
+            assert health.check_readiness() == "database unavailable"
+
+    def test_unapplied_migrations(self):
+        with mock.patch("main.health.has_unapplied_migrations", return_value=True):
+            assert health.check_readiness() == "unapplied migrations"
+        assert not health._migrated
+
+    def test_cached(self, settings, django_assert_num_queries):
+        settings.HEALTH_CHECK_CACHE_SECONDS = 5
+        assert health.get_cached_readiness() is health.MISSING
+        assert health.get_readiness() is None
+        with django_assert_num_queries(0):
+            assert health.get_readiness() is None
+        assert health.get_cached_readiness() is None
+        with mock.patch(
+            "main.health.time.monotonic", return_value=health._result[0] + 6
+        ):
+            assert health.get_cached_readiness() is health.MISSING
+            with django_assert_num_queries(1):
+                assert health.get_readiness() is None
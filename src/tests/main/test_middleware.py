@@ -0,0 +1,211 @@
+import copy
+from unittest import mock
+
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings as django_settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import OperationalError, connections
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from main import health
+from main.db_routers import REPLICA, use_replica
+from main.middleware import (
+    AsyncWhiteNoiseMiddleware,
+    HealthCheckMiddleware,
+    ReplicaRoutingMiddleware,
+)
+
+factory = RequestFactory()
+
+
+def get_response(request):
+    return HttpResponse("view")
+
+
+async def aget_response(request):
+    return HttpResponse("async view")
+
+
+def make_middleware(get_response, tmp_path, settings):
+    settings.WHITENOISE_AUTOREFRESH = False
+    middleware = AsyncWhiteNoiseMiddleware(get_response)
+    (tmp_path / "app.css").write_text("body {}")
+    middleware.add_files(tmp_path, prefix="static/")
+    return middleware
+
+
+def test_sync(tmp_path, settings):
+    middleware = make_middleware(get_response, tmp_path, settings)
+    assert not iscoroutinefunction(middleware)
+    assert middleware(factory.get("/api/v1/")).content == b"view"
+    response = middleware(factory.get("/static/app.css"))
+    assert b"".join(response.streaming_content) == b"body {}"
+
+
+def test_async(tmp_path, settings):
+    """Keeps the chain async rather than getting Django to adapt the views."""
+    middleware = make_middleware(aget_response, tmp_path, settings)
+    assert iscoroutinefunction(middleware)
+    response = async_to_sync(middleware)(factory.get("/api/v1/"))
+    assert response.content == b"async view"
+    response = async_to_sync(middleware)(factory.get("/static/app.css"))
+    assert b"".join(response.streaming_content) == b"body {}"
+
+
+@pytest.fixture
+def replica_settings(settings):
+    """Adds a replica, which is the primary test database under another alias."""
+    # the local memory cache is still shared within the tests process
+    settings.CACHE_BACKEND = "redis"
+    replica = copy.deepcopy(connections["default"].settings_dict)
+    with mock.patch.dict(django_settings.DATABASES, {REPLICA: replica}):
+        yield
+        if hasattr(connections._connections, REPLICA):
+            connections[REPLICA].close()
+            del connections[REPLICA]
+
+
+@pytest.fixture
+def replica(transactional_db, replica_settings):
+    # connecting upfront as the test case only allows the aliases it knows of
+    connections[REPLICA].connect()
+
+
+def use_replica_response(request):
+    return HttpResponse(str(use_replica.get()))
+
+
+async def ause_replica_response(request):
+    return HttpResponse(str(use_replica.get()))
+
+
+class TestReplicaRoutingMiddleware:
+    def test_not_used(self):
+        with pytest.raises(MiddlewareNotUsed):
+            ReplicaRoutingMiddleware(use_replica_response)
+
+    @pytest.mark.parametrize("backend", ("locmem", "file"))
+    def test_cache_not_shared(self, replica_settings, settings, backend):
+        settings.CACHE_BACKEND = backend
+        with pytest.raises(
+            ImproperlyConfigured,
+            match=(
+                "The read replica requires a cache shared by the instances, "
+                f"got CACHE_BACKEND={backend}, expected one of database, redis."
+            ),
+        ):
+            ReplicaRoutingMiddleware(use_replica_response)
+
+    @pytest.mark.parametrize(
+        "get_response", (use_replica_response, ause_replica_response)
+    )
+    def test_pinned_after_write(self, replica_settings, settings, get_response):
+        settings.DATABASE_REPLICA_PIN_SECONDS = 5
+        middleware = ReplicaRoutingMiddleware(get_response)
+        if iscoroutinefunction(middleware):
+            middleware = async_to_sync(middleware)
+        alice = {"HTTP_AUTHORIZATION": "Token alice"}
+        bob = {"HTTP_AUTHORIZATION": "Token bob"}
+        assert middleware(factory.get("/", **alice)).content == b"True"
+        assert middleware(factory.post("/", **alice)).content == b"False"
+        # reads her own writes
+        assert middleware(factory.get("/", **alice)).content == b"False"
+        assert middleware(factory.get("/", **bob)).content == b"True"
+        assert middleware(factory.get("/")).content == b"True"
+        assert use_replica.get() is False
+
+    def test_pin_expiry(self, replica_settings, settings):
+        settings.DATABASE_REPLICA_PIN_SECONDS = 0
+        middleware = ReplicaRoutingMiddleware(use_replica_response)
+        alice = {"HTTP_AUTHORIZATION": "Token alice"}
+        middleware(factory.post("/", **alice))
+        assert middleware(factory.get("/", **alice)).content == b"True"
+
+    def test_session_cookie(self, replica_settings):
+        middleware = ReplicaRoutingMiddleware(use_replica_response)
+        client_factory = RequestFactory()
+        client_factory.cookies[django_settings.SESSION_COOKIE_NAME] = "session"
+        middleware(client_factory.post("/"))
+        assert middleware(client_factory.get("/")).content == b"False"
+
+    def test_routing(self, replica, user):
+        """The reads of the API requests go to the replica, but after a write."""
+        client = APIClient()
+        client.force_authenticate(user)
+        client.credentials(HTTP_AUTHORIZATION="Token alice")
+        url = reverse("v1:patient-list")
+
+        def get_patient_queries(queries):
+            return [q for q in queries if 'FROM "nurse_patient"' in q["sql"]]
+
+        with CaptureQueriesContext(
+            connections["default"]
+        ) as primary_queries, CaptureQueriesContext(
+            connections[REPLICA]
+        ) as replica_queries:
+            assert client.get(url).status_code == status.HTTP_200_OK
+        assert get_patient_queries(primary_queries) == []
+        assert len(get_patient_queries(replica_queries)) == 1
+        response = client.post(
+            url, {"firstname": "John", "lastname": "Leen"}, format="json"
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        with CaptureQueriesContext(
+            connections["default"]
+        ) as primary_queries, CaptureQueriesContext(
+            connections[REPLICA]
+        ) as replica_queries:
+            response = client.get(url)
+        assert len(get_patient_queries(primary_queries)) == 1
+        assert replica_queries.captured_queries == []
+        assert [patient["firstname"] for patient in response.json()] == ["John"]
+
+
+@pytest.mark.django_db
+class TestHealthCheckMiddleware:
+
+    @pytest.fixture(autouse=True)
+    def fresh(self, monkeypatch):
+        monkeypatch.setattr(health, "_result", None)
+
+    @pytest.mark.parametrize("path", ["/healthz", "/readyz"])
+    def test_ok(self, client, path):
+        # not an allowed host, nor a session
+        response = client.get(path, HTTP_HOST="10.0.0.1")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == b"ok"
+        assert "Set-Cookie" not in response.headers
+
+    def test_not_ready(self, client):
+        with mock.patch("main.health.check_database", side_effect=OperationalError):
+            response = client.get("/readyz")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.content == b"database unavailable"
+
+    def test_cached(self, client, django_assert_num_queries):
+        client.get("/readyz")
+        with django_assert_num_queries(0):
+            assert client.get("/readyz").status_code == status.HTTP_200_OK
+
+    def test_other_paths(self):
+        middleware = HealthCheckMiddleware(get_response)
+        assert middleware(factory.get("/api/v1/")).content == b"view"
+        assert middleware(factory.get("/healthz/")).content == b"view"
+
+    def test_async(self):
+        middleware = HealthCheckMiddleware(aget_response)
+        assert iscoroutinefunction(middleware)
+        response = async_to_sync(middleware)(factory.get("/api/v1/"))
+        assert response.content == b"async view"
+        assert async_to_sync(middleware)(factory.get("/healthz")).content == b"ok"
+        # checked in a thread, then from the cache
+        assert async_to_sync(middleware)(factory.get("/readyz")).content == b"ok"
+        with mock.patch("main.middleware.get_readiness") as mock_get_readiness:
+            assert async_to_sync(middleware)(factory.get("/readyz")).content == b"ok"
+        mock_get_readiness.assert_not_called()
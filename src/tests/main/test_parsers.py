@@ -0,0 +1,29 @@
+import io
+
+import pytest
+from rest_framework.exceptions import ParseError
+
+from main.parsers import ORJSONParser
+
+
+def parse(body, encoding="utf-8"):
+    return ORJSONParser().parse(io.BytesIO(body), parser_context={"encoding": encoding})
+
+
+def test_parse():
+    assert parse('{"firstname": "Zoé", "patients": [1, 2]}'.encode()) == {
+        "firstname": "Zoé",
+        "patients": [1, 2],
+    }
+
+
+def test_parse_other_encoding():
+    assert parse('{"firstname": "Zoé"}'.encode("latin-1"), "latin-1") == {
+        "firstname": "Zoé"
+    }
+
+
+@pytest.mark.parametrize("body", [b"{", b'{"total_price": NaN}', b"\xff"])
+def test_parse_error(body):
+    with pytest.raises(ParseError, match="JSON parse error"):
+        parse(body)
@@ -0,0 +1,11 @@
+import sys
+
+from django.urls import get_resolver
+
+from main import preload
+
+
+def test_warm_up():
+    preload.warm_up()
+    assert set(preload.MODULES) <= set(sys.modules)
+    assert get_resolver()._populated
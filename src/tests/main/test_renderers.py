@@ -0,0 +1,49 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from main.renderers import ORJSONRenderer
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"firstname": "Zoé", "street": "1 rue de la Paix", "prescriptions": []},
+        [{"id": 1, "is_valid": True, "photo_prescription": None}],
+        {"total_price": decimal.Decimal("10.50")},
+        {"detail": gettext_lazy("Not found.")},
+        {"start_date": datetime.date(2024, 1, 1)},
+        {"created_at": datetime.datetime(2024, 1, 1, 8, 30, 15, 123456)},
+        {"created_at": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)},
+        {"time": datetime.time(8, 30)},
+        {"uuid": uuid.UUID(int=1)},
+        {1: "non string key"},
+        {"line separators": "\u2028\u2029"},
+    ],
+)
+def test_same_output(data):
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+def test_none():
+    assert ORJSONRenderer().render(None) == b""
+
+
+def test_indent():
+    renderer = ORJSONRenderer()
+    data = {"firstname": "John"}
+    assert renderer.render(data, "application/json; indent=4") == (
+        b'{\n    "firstname": "John"\n}'
+    )
+    assert renderer.render(data, renderer_context={"indent": 2}) == (
+        JSONRenderer().render(data, renderer_context={"indent": 2})
+    )
+
+
+def test_unsupported_type():
+    with pytest.raises(TypeError):
+        ORJSONRenderer().render({"object": object()})
@@ -0,0 +1,52 @@
+import pytest
+
+from main.sentry import get_traces_sampler
+
+RATES = {
+    "^/api/v1/payment/stripe/webhook/$": 1.0,
+    "^/api/v1/(patient|prescription)/$": 0.01,
+}
+
+
+@pytest.fixture
+def traces_sampler():
+    return get_traces_sampler(0.1, RATES)
+
+
+@pytest.mark.parametrize(
+    "path, rate",
+    [
+        ("/api/v1/payment/stripe/webhook/", 1.0),
+        ("/api/v1/patient/", 0.01),
+        ("/api/v1/prescription/", 0.01),
+        ("/api/v1/patient/1/", 0.1),
+        ("/api/v1/version/", 0),
+        ("/api/v2/version/", 0),
+        ("/healthz", 0),
+        ("/readyz", 0),
+    ],
+)
+def test_traces_sampler(traces_sampler, path, rate):
+    assert traces_sampler({"wsgi_environ": {"PATH_INFO": path}}) == rate
+    assert traces_sampler({"asgi_scope": {"path": path}}) == rate
+
+
+def test_traces_sampler_no_request(traces_sampler):
+    assert traces_sampler({"transaction_context": {"op": "task"}}) == 0.1
+
+
+@pytest.mark.parametrize("parent_sampled, rate", [(True, 1.0), (False, 0.0)])
+def test_traces_sampler_parent_sampled(traces_sampler, parent_sampled, rate):
+    sampling_context = {
+        "parent_sampled": parent_sampled,
+        "wsgi_environ": {"PATH_INFO": "/api/v1/patient/"},
+    }
+    assert traces_sampler(sampling_context) == rate
+
+
+def test_traces_sampler_parent_sampled_ignored_path(traces_sampler):
+    sampling_context = {
+        "parent_sampled": True,
+        "wsgi_environ": {"PATH_INFO": "/api/v1/version/"},
+    }
+    assert traces_sampler(sampling_context) == 0
@@ -3,6 +3,7 @@ from unittest import mock
 
 import httpx
 import pytest
+from asgiref.sync import async_to_sync
 from django.test import override_settings
 
 from nurse.management.commands import _notifications
@@ -17,7 +18,8 @@ from nurse.models import (
 
 ONESIGNAL_APP_ID = "test_app_id"
 ONESIGNAL_API_KEY = "test_api_key"
-client_path = "nurse.management.commands._notifications.Client"
+client_path = "onesignal_sdk.client.Client"
+async_client_path = "onesignal_sdk.client.AsyncClient"
 
 
 @pytest.fixture
@@ -137,6 +139,28 @@ class TestNotifications:
             _notifications.notify()
         assert mock_send_notification.call_count == 0
 
+    @pytest.mark.django_db
+    def test_anotify(self, base_prescriptions):
+        with mock.patch(
+            f"{async_client_path}.send_notification"
+        ) as mock_send_notification, override_settings(
+            ONESIGNAL_APP_ID="ONESIGNAL_APP_ID", ONESIGNAL_API_KEY="ONESIGNAL_API_KEY"
+        ):
+            async_to_sync(_notifications.anotify)()
+        assert mock_send_notification.await_count == 1
+        notification_body = mock_send_notification.call_args.args[0]
+        assert notification_body["include_subscription_ids"] == ["123", "456", "789"]
+
+    @pytest.mark.django_db
+    def test_anotify_no_subscription(self):
+        with mock.patch(
+            f"{async_client_path}.send_notification"
+        ) as mock_send_notification, override_settings(
+            ONESIGNAL_APP_ID="ONESIGNAL_APP_ID", ONESIGNAL_API_KEY="ONESIGNAL_API_KEY"
+        ):
+            async_to_sync(_notifications.anotify)()
+        assert mock_send_notification.call_count == 0
+
     def test_get_client_with_valid_settings(self):
         with override_settings(
             ONESIGNAL_APP_ID=ONESIGNAL_APP_ID,
@@ -0,0 +1,173 @@
+from datetime import date
+from io import BytesIO
+
+import boto3
+import pytest
+from django.core.files.base import ContentFile
+from moto import mock_aws
+from PIL import Image
+
+from nurse.management.commands import _photos
+from nurse.models import MAX_PHOTO_PROCESSING_ATTEMPTS, Patient, Prescription
+
+# EXIF orientation tag, 6 means the camera was rotated 90° clockwise
+ORIENTATION = 0x0112
+
+
+def make_photo(size=(4000, 3000), orientation=None):
+    image = Image.new("RGB", size, color="white")
+    exif = Image.Exif()
+    # camera metadata that shouldn't leak into the renditions
+    exif[0x010F] = "PhoneMaker"
+    if orientation:
+        exif[ORIENTATION] = orientation
+    output = BytesIO()
+    image.save(output, format="JPEG", exif=exif)
+    return output.getvalue()
+
+
+@pytest.fixture
+def s3_mock():
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="mynotif-prescription")
+        yield
+
+
+@pytest.fixture
+def prescription(db):
+    patient = Patient.objects.create(firstname="Patient 1")
+    return Prescription.objects.create(
+        prescribing_doctor="Dr A",
+        patient=patient,
+        start_date=date(2024, 1, 1),
+        end_date=date(2024, 1, 31),
+    )
+
+
+def attach_photo(prescription, content, name="photo.jpeg"):
+    prescription.photo_prescription.save(name, ContentFile(content))
+    return prescription
+
+
+@pytest.mark.django_db
+class TestProcessPendingPhotos:
+
+    def test_no_photo(self, prescription):
+        assert _photos.process_pending_photos() == 0
+
+    def test_process(self, s3_mock, prescription):
+        photo = make_photo(orientation=6)
+        attach_photo(prescription, photo)
+        assert list(Prescription.objects.pending_photo_processing()) == [prescription]
+        assert _photos.process_pending_photos() == 1
+        assert Prescription.objects.pending_photo_processing().count() == 0
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription_size == len(photo)
+        assert prescription.photo_prescription_web.name == (
+            "prescriptions/web/photo.jpg"
+        )
+        assert prescription.photo_prescription_thumbnail.name == (
+            "prescriptions/thumbnails/photo.jpg"
+        )
+        web = prescription.photo_prescription_web.read()
+        thumbnail = prescription.photo_prescription_thumbnail.read()
+        assert prescription.photo_prescription_web_size == len(web)
+        assert prescription.photo_prescription_thumbnail_size == len(thumbnail)
+        assert len(web) < len(photo)
+        with Image.open(BytesIO(web)) as image:
+            # the orientation got applied to the pixels
+            assert image.size == (1200, 1600)
+            assert dict(image.getexif()) == {}
+        with Image.open(BytesIO(thumbnail)) as image:
+            assert image.size == (240, 320)
+            assert dict(image.getexif()) == {}
+
+    def test_limit(self, s3_mock, prescription):
+        attach_photo(prescription, make_photo(size=(100, 100)))
+        other = Prescription.objects.get(id=prescription.id)
+        other.pk = None
+        other.save()
+        assert _photos.process_pending_photos(limit=1) == 1
+        assert _photos.process_pending_photos(limit=1) == 1
+        assert _photos.process_pending_photos(limit=1) == 0
+
+    def test_unsupported_format(self, s3_mock, prescription):
+        attach_photo(prescription, b"not an image", name="photo.pdf")
+        assert _photos.process_pending_photos() == 1
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription_size == len(b"not an image")
+        assert prescription.photo_prescription_web.name == ""
+        # not picked up again
+        assert _photos.process_pending_photos() == 0
+
+    def test_clear_photo_renditions(self, s3_mock, prescription):
+        attach_photo(prescription, make_photo(size=(100, 100)))
+        _photos.process_pending_photos()
+        prescription.refresh_from_db()
+        prescription.clear_photo_renditions()
+        prescription.save()
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription_web.name == ""
+        assert prescription.photo_prescription_thumbnail.name == ""
+        assert list(Prescription.objects.pending_photo_processing()) == [prescription]
+
+    def test_truncated_photo(self, s3_mock, prescription):
+        photo = make_photo(size=(100, 100))
+        attach_photo(prescription, photo[: len(photo) // 2])
+        assert _photos.process_pending_photos() == 1
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription_size == len(photo) // 2
+        assert prescription.photo_prescription_web.name == ""
+        # not picked up again
+        assert _photos.process_pending_photos() == 0
+
+    def test_missing_photo(self, s3_mock, prescription):
+        attach_photo(prescription, make_photo(size=(100, 100)))
+        prescription.photo_prescription.delete(save=False)
+        prescription.photo_prescription.name = "prescriptions/photo.jpeg"
+        prescription.save()
+        other = Prescription.objects.get(id=prescription.id)
+        other.pk = None
+        other.photo_prescription = None
+        other.save()
+        attach_photo(other, make_photo(size=(100, 100)), name="other.jpeg")
+        assert _photos.process_pending_photos(limit=1) == 1
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription_size is None
+        assert prescription.photo_prescription_processing_attempts == 1
+        # retried after the other photos rather than holding them up
+        assert _photos.process_pending_photos(limit=1) == 1
+        other.refresh_from_db()
+        assert other.photo_prescription_size is not None
+        for _ in range(MAX_PHOTO_PROCESSING_ATTEMPTS - 1):
+            assert _photos.process_pending_photos() == 1
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription_processing_attempts == (
+            MAX_PHOTO_PROCESSING_ATTEMPTS
+        )
+        # given up on
+        assert _photos.process_pending_photos() == 0
+        prescription.clear_photo_renditions()
+        assert prescription.photo_prescription_processing_attempts == 0
+
+
+@pytest.mark.django_db
+class TestProcessPhotoOnCommit:
+
+    @pytest.mark.parametrize("inline", (True, False))
+    def test_process_photo_on_commit(
+        self,
+        s3_mock,
+        prescription,
+        settings,
+        django_capture_on_commit_callbacks,
+        inline,
+    ):
+        settings.PHOTO_PROCESS_INLINE = inline
+        attach_photo(prescription, make_photo(size=(100, 100)))
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            _photos.process_photo_on_commit(prescription)
+        assert len(callbacks) == int(inline)
+        prescription.refresh_from_db()
+        assert (prescription.photo_prescription_size is not None) == inline
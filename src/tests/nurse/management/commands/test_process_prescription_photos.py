@@ -0,0 +1,14 @@
+from unittest import mock
+
+from django.core.management import call_command
+
+
+class TestCommand:
+    def test_process_pending_photos_called(self):
+        with mock.patch(
+            "nurse.management.commands.process_prescription_photos"
+            ".process_pending_photos",
+            return_value=2,
+        ) as mock_process:
+            call_command("process_prescription_photos", "--limit", "10")
+        assert mock_process.call_args_list == [mock.call(limit=10)]
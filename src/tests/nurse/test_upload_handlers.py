@@ -0,0 +1,73 @@
+import contextlib
+import hashlib
+
+import pytest
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.test import RequestFactory, override_settings
+
+from nurse.upload_handlers import (
+    HashingMemoryFileUploadHandler,
+    HashingTemporaryFileUploadHandler,
+    S3MultipartUploadHandler,
+    get_prescription_upload_handlers,
+)
+from nurse.utils.images import sniff_image_type
+
+CONTENT = b"prescription" * 1000
+
+
+def upload(handler, content, chunk_size=1024):
+    # raised by the in memory handler to take over the upload
+    with contextlib.suppress(StopFutureHandlers):
+        handler.new_file(
+            "photo_prescription", "photo.png", "image/png", len(content), None
+        )
+    for start in range(0, len(content), chunk_size):
+        handler.receive_data_chunk(content[start : start + chunk_size], start)
+    return handler.file_complete(len(content))
+
+
+@pytest.mark.parametrize(
+    "handler_class",
+    [HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler],
+)
+def test_content_hash(handler_class):
+    request = RequestFactory().post("/")
+    handler = handler_class(request)
+    # i.e. the upload is small enough to be kept in memory
+    handler.activated = True
+    file = upload(handler, CONTENT)
+    assert file.content_hash == hashlib.sha256(CONTENT).hexdigest()
+    file.seek(0)
+    assert file.read() == CONTENT
+
+
+@pytest.mark.parametrize(
+    "stream_to_s3, expected",
+    [
+        (True, [S3MultipartUploadHandler]),
+        (False, [HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler]),
+    ],
+)
+def test_get_prescription_upload_handlers(stream_to_s3, expected):
+    request = RequestFactory().post("/")
+    with override_settings(PRESCRIPTION_UPLOAD_STREAM_TO_S3=stream_to_s3):
+        handlers = get_prescription_upload_handlers(request)
+    assert [type(handler) for handler in handlers] == expected
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+        (b"\x89PNG\r\n\x1a\n\x00", "image/png"),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"\x00\x00\x00\x18ftypheic", "image/heic"),
+        (b"\x00\x00\x00\x18ftypmif1", "image/heif"),
+        (b"\x00\x00\x00\x18ftypmp42", None),
+        (b"%PDF-1.4", None),
+        (b"", None),
+    ],
+)
+def test_sniff_image_type(header, expected):
+    assert sniff_image_type(header) == expected
@@ -1,3 +1,4 @@
+import hashlib
 from datetime import date
 from pathlib import Path
 from unittest import mock
@@ -9,6 +10,7 @@ import rest_framework
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core import mail
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings
 from django.urls.base import reverse_lazy
@@ -19,6 +21,7 @@ from rest_framework.test import APIClient
 
 from nurse.models import Nurse, Patient, Prescription, UserOneSignalProfile
 from nurse.utils.constants import FREE_LIMIT_MESSAGE
+from nurse.utils.s3 import lock_photo
 from payment.models import Subscription
 from tests.conftest import (
     EMAIL,
@@ -32,7 +35,7 @@ from tests.conftest import (
 
 
 def patch_notify():
-    return mock.patch("nurse.views.notify")
+    return mock.patch("nurse.views.anotify")
 
 
 @pytest.fixture
@@ -80,6 +83,10 @@ def get_test_image():
     return SimpleUploadedFile(image.name, image.read())
 
 
+def get_test_image_hash():
+    return hashlib.sha256(get_test_image().read()).hexdigest()
+
+
 @pytest.fixture
 def s3_mock():
     with mock_aws():
@@ -345,6 +352,11 @@ class TestPatient:
                     "start_date": "2022-08-10",
                     "end_date": "2022-08-20",
                     "photo_prescription": None,
+                    "photo_prescription_size": None,
+                    "photo_prescription_web": None,
+                    "photo_prescription_web_size": None,
+                    "photo_prescription_thumbnail": None,
+                    "photo_prescription_thumbnail_size": None,
                     "is_valid": True,
                     "expiring_soon": False,
                 },
@@ -356,6 +368,11 @@ class TestPatient:
                     "start_date": "2022-08-01",
                     "end_date": "2022-08-10",
                     "photo_prescription": None,
+                    "photo_prescription_size": None,
+                    "photo_prescription_web": None,
+                    "photo_prescription_web_size": None,
+                    "photo_prescription_thumbnail": None,
+                    "photo_prescription_thumbnail_size": None,
                     "is_valid": False,
                     "expiring_soon": False,
                 },
@@ -432,6 +449,11 @@ class TestPatient:
                     "expiring_soon": True,
                     "patient": 1,
                     "photo_prescription": None,
+                    "photo_prescription_size": None,
+                    "photo_prescription_web": None,
+                    "photo_prescription_web_size": None,
+                    "photo_prescription_thumbnail": None,
+                    "photo_prescription_thumbnail_size": None,
                     "prescribing_doctor": "Dr Leen",
                     "email_doctor": "dr.a@example.com",
                     "start_date": "2024-05-14",
@@ -445,6 +467,11 @@ class TestPatient:
                     "expiring_soon": True,
                     "patient": 1,
                     "photo_prescription": None,
+                    "photo_prescription_size": None,
+                    "photo_prescription_web": None,
+                    "photo_prescription_web_size": None,
+                    "photo_prescription_thumbnail": None,
+                    "photo_prescription_thumbnail_size": None,
                     "prescribing_doctor": "Dr Leen",
                     "email_doctor": "dr.a@example.com",
                     "start_date": "2024-05-14",
@@ -456,6 +483,11 @@ class TestPatient:
                     "expiring_soon": False,
                     "patient": 1,
                     "photo_prescription": None,
+                    "photo_prescription_size": None,
+                    "photo_prescription_web": None,
+                    "photo_prescription_web_size": None,
+                    "photo_prescription_thumbnail": None,
+                    "photo_prescription_thumbnail_size": None,
                     "prescribing_doctor": "Dr Leen",
                     "email_doctor": "dr.a@example.com",
                     "start_date": "2022-08-01",
@@ -556,6 +588,11 @@ class TestPrescription:
                 "start_date": "2022-07-15",
                 "end_date": "2022-07-31",
                 "photo_prescription": None,
+                "photo_prescription_size": None,
+                "photo_prescription_web": None,
+                "photo_prescription_web_size": None,
+                "photo_prescription_thumbnail": None,
+                "photo_prescription_thumbnail_size": None,
                 "patient": patient.id,
                 "patient_firstname": "John",
                 "patient_lastname": "Leen",
@@ -564,6 +601,51 @@ class TestPrescription:
             }
         ]
 
+    def test_prescription_list_photo_url_cached(self, client, prescription):
+        """The photo URLs get signed once, then served from the cache."""
+        prescription.photo_prescription.name = "prescriptions/photo.png"
+        prescription.save()
+        signed_url = "https://mynotif-prescription.s3.amazonaws.com/signed"
+        with mock.patch(
+            "storages.backends.s3.S3Storage.url", return_value=signed_url
+        ) as mock_url:
+            for _ in range(2):
+                response = client.get(self.url)
+                assert response.json()[0]["photo_prescription"] == signed_url
+            response = client.get(reverse_lazy("v1:patient-list"))
+            patient = response.json()[0]
+            assert patient["prescriptions"][0]["photo_prescription"] == signed_url
+        assert mock_url.call_args_list == [mock.call("prescriptions/photo.png")]
+
+    def test_prescription_list_photo_urls_fetched_at_once(
+        self, s3_mock, client, prescription
+    ):
+        """A page reads its cached photo URLs, and caches the missing ones, at once."""
+        for name in ("prescriptions/a.png", "prescriptions/b.png"):
+            other = Prescription.objects.get(id=prescription.id)
+            other.pk = None
+            other.photo_prescription.name = name
+            other.photo_prescription_thumbnail.name = name.replace("/", "/thumb-")
+            other.save()
+        with mock.patch(
+            "helpers.cache.cache.get_many", wraps=cache.get_many
+        ) as mock_get_many, mock.patch(
+            "helpers.cache.cache.set_many", wraps=cache.set_many
+        ) as mock_set_many, mock.patch(
+            "nurse.serializers.get_photo_url"
+        ) as mock_get_photo_url:
+            for _ in range(2):
+                response = client.get(self.url)
+                assert response.status_code == status.HTTP_200_OK
+        assert mock_get_many.call_count == 2
+        assert mock_set_many.call_count == 1
+        assert len(mock_set_many.call_args.args[0]) == 4
+        # no lookup per photo
+        assert mock_get_photo_url.call_count == 0
+        assert response.json()[1]["photo_prescription_thumbnail"].startswith(
+            "https://mynotif-prescription.s3.amazonaws.com/prescriptions/thumb-a.png"
+        )
+
     def test_prescription_list_401(self):
         """The endpoint should be under authentication."""
         response = APIClient().get(self.url)
@@ -589,6 +671,11 @@ class TestPrescription:
             "start_date": "2022-07-15",
             "end_date": "2022-07-31",
             "photo_prescription": None,
+            "photo_prescription_size": None,
+            "photo_prescription_web": None,
+            "photo_prescription_web_size": None,
+            "photo_prescription_thumbnail": None,
+            "photo_prescription_thumbnail_size": None,
             "patient": patient.id,
             "patient_firstname": "John",
             "patient_lastname": "Leen",
@@ -638,15 +725,387 @@ class TestPrescription:
             "id": 1,
             "photo_prescription": mock.ANY,
         }
+        # photos are stored under their content hash
+        name = f"prescriptions/{get_test_image_hash()}.png"
         assert response.json()["photo_prescription"].startswith(
-            "https://mynotif-prescription.s3.amazonaws.com"
-            "/prescriptions/glyphicons-halflings.png"
+            f"https://mynotif-prescription.s3.amazonaws.com/{name}"
         )
         prescription.refresh_from_db()
-        assert prescription.photo_prescription.name.endswith(get_test_image().name)
+        assert prescription.photo_prescription.name == name
         # makes sure other fields didn't get overwritten
         assert prescription.prescribing_doctor == "Dr Leen"
 
+    @override_settings(PRESCRIPTION_UPLOAD_STREAM_TO_S3=False)
+    def test_prescription_upload_deduplication(self, s3_mock, client, prescription):
+        other = Prescription.objects.create(
+            patient=prescription.patient, **prescription_data
+        )
+        name = f"prescriptions/{get_test_image_hash()}.png"
+        for instance in (prescription, other):
+            with mock.patch(
+                "storages.backends.s3.S3Storage._save", side_effect=lambda name, _: name
+            ) as mock_save:
+                response = client.put(
+                    reverse_lazy("v1:prescription-upload", kwargs={"pk": instance.id}),
+                    {"photo_prescription": get_test_image()},
+                )
+            assert response.status_code == status.HTTP_200_OK
+            if instance == prescription:
+                assert mock_save.call_count == 1
+                boto3.client("s3", region_name="us-east-1").put_object(
+                    Bucket="mynotif-prescription", Key=name, Body=b""
+                )
+            else:
+                # the object already exists, no need to write it again
+                assert mock_save.call_count == 0
+        assert list(
+            Prescription.objects.filter(photo_prescription=name).order_by("id")
+        ) == [prescription, other]
+
+    def test_prescription_upload_stream_deduplication(
+        self, s3_mock, client, prescription
+    ):
+        other = Prescription.objects.create(
+            patient=prescription.patient, **prescription_data
+        )
+        name = f"prescriptions/{get_test_image_hash()}.png"
+        s3 = boto3.client("s3", region_name="us-east-1")
+        for instance in (prescription, other):
+            spy = mock.Mock(wraps=s3)
+            with mock.patch("nurse.upload_handlers.get_s3_client", return_value=spy):
+                response = client.put(
+                    reverse_lazy("v1:prescription-upload", kwargs={"pk": instance.id}),
+                    {"photo_prescription": get_test_image()},
+                )
+            assert response.status_code == status.HTTP_200_OK
+            # the second upload finds the object already stored
+            assert spy.put_object.call_count == (1 if instance == prescription else 0)
+        assert list(
+            Prescription.objects.filter(photo_prescription=name).order_by("id")
+        ) == [prescription, other]
+        assert s3.head_object(Bucket="mynotif-prescription", Key=name)[
+            "ContentType"
+        ] == ("image/png")
+
+    def test_prescription_upload_stream_multipart(self, s3_mock, client, prescription):
+        """Files bigger than a part go through a multipart upload."""
+        content = b"\x89PNG\r\n\x1a\n" + b"\0" * (6 * 2**20)
+        name = f"prescriptions/{hashlib.sha256(content).hexdigest()}.png"
+        response = client.put(
+            reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+            {"photo_prescription": SimpleUploadedFile("big.png", content)},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription.name == name
+        s3 = boto3.client("s3", region_name="us-east-1")
+        assert s3.head_object(Bucket="mynotif-prescription", Key=name)[
+            "ContentLength"
+        ] == len(content)
+        # the temporary upload object got cleaned up
+        keys = s3.list_objects_v2(Bucket="mynotif-prescription")["Contents"]
+        assert [key["Key"] for key in keys] == [name]
+        uploads = s3.list_multipart_uploads(Bucket="mynotif-prescription")
+        assert uploads.get("Uploads", []) == []
+
+    @override_settings(PRESCRIPTION_UPLOAD_MAX_SIZE=100)
+    def test_prescription_upload_stream_too_large(self, s3_mock, client, prescription):
+        """Oversized requests get rejected before reading the body."""
+        response = client.put(
+            reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+            {"photo_prescription": SimpleUploadedFile("big.png", b"\0" * 2**17)},
+        )
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert response.json() == {"detail": "The uploaded file is too large."}
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription.name == ""
+
+    @override_settings(PRESCRIPTION_UPLOAD_MAX_SIZE=5 * 2**20 + 1)
+    def test_prescription_upload_stream_too_large_aborted(
+        self, s3_mock, client, prescription
+    ):
+        """Files exceeding the limit mid-stream get their multipart upload aborted."""
+        content = b"\x89PNG\r\n\x1a\n" + b"\0" * (5 * 2**20 + 2**10)
+        response = client.put(
+            reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+            {"photo_prescription": SimpleUploadedFile("big.png", content)},
+        )
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        s3 = boto3.client("s3", region_name="us-east-1")
+        uploads = s3.list_multipart_uploads(Bucket="mynotif-prescription")
+        assert uploads.get("Uploads", []) == []
+        assert s3.list_objects_v2(Bucket="mynotif-prescription")["KeyCount"] == 0
+
+    def test_prescription_upload_stream_unsupported_type(
+        self, s3_mock, client, prescription
+    ):
+        """The type is sniffed from the content rather than trusting the name."""
+        response = client.put(
+            reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+            {"photo_prescription": SimpleUploadedFile("photo.png", b"%PDF-1.4")},
+        )
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        s3 = boto3.client("s3", region_name="us-east-1")
+        assert s3.list_objects_v2(Bucket="mynotif-prescription")["KeyCount"] == 0
+
+    def test_prescription_upload_stream_empty(self, s3_mock, client, prescription):
+        response = client.put(
+            reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+            {"photo_prescription": SimpleUploadedFile("photo.png", b"")},
+        )
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        s3 = boto3.client("s3", region_name="us-east-1")
+        assert s3.list_objects_v2(Bucket="mynotif-prescription")["KeyCount"] == 0
+
+    def test_prescription_upload_stream_invalid(
+        self,
+        s3_mock,
+        shared_cache,
+        client,
+        prescription,
+        django_capture_on_commit_callbacks,
+    ):
+        """The photo streamed to the bucket gets deleted if the request is invalid."""
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.put(
+                reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+                {"other": get_test_image()},
+            )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {"photo_prescription": ["No file was submitted."]}
+        s3 = boto3.client("s3", region_name="us-east-1")
+        assert s3.list_objects_v2(Bucket="mynotif-prescription")["KeyCount"] == 0
+
+    def test_prescription_upload_stream_kept(
+        self, s3_mock, client, prescription, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.put(
+                reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+                {"photo_prescription": get_test_image()},
+            )
+        assert response.status_code == status.HTTP_200_OK
+        name = f"prescriptions/{get_test_image_hash()}.png"
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.head_object(Bucket="mynotif-prescription", Key=name)
+
+    def test_prescription_delete_releases_photo(
+        self,
+        s3_mock,
+        shared_cache,
+        client,
+        prescription,
+        django_capture_on_commit_callbacks,
+    ):
+        other = Prescription.objects.create(
+            patient=prescription.patient, **prescription_data
+        )
+        for instance in (prescription, other):
+            client.put(
+                reverse_lazy("v1:prescription-upload", kwargs={"pk": instance.id}),
+                {"photo_prescription": get_test_image()},
+            )
+        name = f"prescriptions/{get_test_image_hash()}.png"
+        s3 = boto3.client("s3", region_name="us-east-1")
+        prescription.refresh_from_db()
+        other.refresh_from_db()
+        with django_capture_on_commit_callbacks(execute=True):
+            prescription.delete()
+        # still referenced by the other prescription
+        s3.head_object(Bucket="mynotif-prescription", Key=name)
+        with django_capture_on_commit_callbacks(execute=True):
+            other.delete()
+        with pytest.raises(s3.exceptions.ClientError, match="Not Found"):
+            s3.head_object(Bucket="mynotif-prescription", Key=name)
+
+    def test_prescription_delete_photo_locked(
+        self,
+        s3_mock,
+        shared_cache,
+        client,
+        prescription,
+        django_capture_on_commit_callbacks,
+    ):
+        """The photo is kept while an upload of the same one holds its lock."""
+        client.put(
+            reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+            {"photo_prescription": get_test_image()},
+        )
+        name = f"prescriptions/{get_test_image_hash()}.png"
+        prescription.refresh_from_db()
+        with lock_photo(name), mock.patch("helpers.cache.LOCK_TIMEOUT", 0.1):
+            with django_capture_on_commit_callbacks(execute=True):
+                prescription.delete()
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.head_object(Bucket="mynotif-prescription", Key=name)
+
+    def test_prescription_delete_cache_not_shared(
+        self, s3_mock, client, prescription, django_capture_on_commit_callbacks
+    ):
+        """The photo is kept as the lock doesn't hold across the instances."""
+        client.put(
+            reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+            {"photo_prescription": get_test_image()},
+        )
+        name = f"prescriptions/{get_test_image_hash()}.png"
+        prescription.refresh_from_db()
+        with django_capture_on_commit_callbacks(execute=True):
+            prescription.delete()
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.head_object(Bucket="mynotif-prescription", Key=name)
+
+    def test_prescription_upload_same_photo(self, s3_mock, client, prescription):
+        """Uploading the same photo again keeps its renditions."""
+        url = reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id})
+        client.put(url, {"photo_prescription": get_test_image()})
+        Prescription.objects.filter(id=prescription.id).update(
+            photo_prescription_size=1,
+            photo_prescription_web="prescriptions/web/photo.jpg",
+        )
+        response = client.put(url, {"photo_prescription": get_test_image()})
+        assert response.status_code == status.HTTP_200_OK
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription_size == 1
+        assert prescription.photo_prescription_web.name == (
+            "prescriptions/web/photo.jpg"
+        )
+
+    def test_prescription_upload_stream_released(self, s3_mock, client, prescription):
+        """The streamed photo got released by a concurrent request meanwhile."""
+        with mock.patch("nurse.serializers.object_exists", return_value=False):
+            response = client.put(
+                reverse_lazy("v1:prescription-upload", kwargs={"pk": prescription.id}),
+                {"photo_prescription": get_test_image()},
+            )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {
+            "photo_prescription": ["The photo got deleted, upload it again."]
+        }
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription.name == ""
+
+
+@pytest.mark.django_db
+class TestPrescriptionDirectUpload:
+    data = {"filename": "ordonnance.JPG", "content_type": "image/jpeg"}
+
+    def upload_url(self, pk):
+        return reverse_lazy("v1:prescription-upload-url", kwargs={"pk": pk})
+
+    def confirm_url(self, pk):
+        return reverse_lazy("v1:prescription-upload-confirm", kwargs={"pk": pk})
+
+    def test_endpoints(self):
+        assert self.upload_url(1) == "/api/v1/prescription/1/upload-url/"
+        assert self.confirm_url(1) == "/api/v1/prescription/1/upload-confirm/"
+
+    def test_upload_url(self, s3_mock, client, prescription):
+        response = client.post(self.upload_url(prescription.id), self.data)
+        assert response.status_code == status.HTTP_201_CREATED
+        data = response.json()
+        assert data["url"] == "https://mynotif-prescription.s3.amazonaws.com/"
+        assert data["key"].startswith("prescriptions/uploads/")
+        assert data["key"].endswith(".jpg")
+        assert data["fields"]["key"] == data["key"]
+        assert data["fields"]["Content-Type"] == "image/jpeg"
+        assert "policy" in data["fields"]
+        assert data["upload_token"]
+
+    def test_upload_url_content_type(self, client, prescription):
+        data = {**self.data, "content_type": "application/pdf"}
+        response = client.post(self.upload_url(prescription.id), data)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {
+            "content_type": ['"application/pdf" is not a valid choice.']
+        }
+
+    def test_upload_url_not_owned(self, client, user2):
+        patient = Patient.objects.create(**patient_data)
+        nurse, _ = Nurse.objects.get_or_create(user=user2)
+        nurse.patients.add(patient)
+        prescription = Prescription.objects.create(patient=patient, **prescription_data)
+        response = client.post(self.upload_url(prescription.id), self.data)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def list_keys(self):
+        s3 = boto3.client("s3", region_name="us-east-1")
+        contents = s3.list_objects_v2(Bucket="mynotif-prescription")["Contents"]
+        return [item["Key"] for item in contents]
+
+    def upload(self, client, prescription):
+        """Simulates the client uploading the test image, returns the upload token."""
+        response = client.post(self.upload_url(prescription.id), self.data)
+        key, upload_token = response.json()["key"], response.json()["upload_token"]
+        boto3.client("s3", region_name="us-east-1").put_object(
+            Bucket="mynotif-prescription", Key=key, Body=get_test_image().read()
+        )
+        return key, upload_token
+
+    def test_confirm(self, s3_mock, client, prescription):
+        key, upload_token = self.upload(client, prescription)
+        response = client.post(
+            self.confirm_url(prescription.id), {"upload_token": upload_token}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        name = f"prescriptions/{get_test_image_hash()}.jpg"
+        assert response.json()["photo_prescription"].startswith(
+            f"https://mynotif-prescription.s3.amazonaws.com/{name}"
+        )
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription.name == name
+        # moved to its content addressed key
+        assert self.list_keys() == [name]
+
+    def test_confirm_duplicate(self, s3_mock, client, prescription):
+        """The same photo uploaded for another prescription is stored once."""
+        other = Prescription.objects.create(
+            patient=prescription.patient, **prescription_data
+        )
+        for instance in (prescription, other):
+            _, upload_token = self.upload(client, instance)
+            response = client.post(
+                self.confirm_url(instance.id), {"upload_token": upload_token}
+            )
+            assert response.status_code == status.HTTP_200_OK
+        name = f"prescriptions/{get_test_image_hash()}.jpg"
+        prescription.refresh_from_db()
+        other.refresh_from_db()
+        assert prescription.photo_prescription.name == name
+        assert other.photo_prescription.name == name
+        assert self.list_keys() == [name]
+
+    def test_confirm_not_uploaded(self, s3_mock, client, prescription):
+        response = client.post(self.upload_url(prescription.id), self.data)
+        upload_token = response.json()["upload_token"]
+        response = client.post(
+            self.confirm_url(prescription.id), {"upload_token": upload_token}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {"upload_token": ["The file wasn't uploaded."]}
+        prescription.refresh_from_db()
+        assert prescription.photo_prescription.name == ""
+
+    def test_confirm_other_prescription(self, s3_mock, client, prescription):
+        other = Prescription.objects.create(
+            patient=prescription.patient, **prescription_data
+        )
+        response = client.post(self.upload_url(other.id), self.data)
+        upload_token = response.json()["upload_token"]
+        response = client.post(
+            self.confirm_url(prescription.id), {"upload_token": upload_token}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {
+            "upload_token": ["Upload token issued for another prescription."]
+        }
+
+    def test_confirm_invalid_token(self, client, prescription):
+        response = client.post(
+            self.confirm_url(prescription.id), {"upload_token": "forged"}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {"upload_token": ["Invalid or expired upload token."]}
+
 
 @pytest.mark.django_db
 class TestNurse:
@@ -0,0 +1,13 @@
+from unittest import mock
+
+from django.core.management import call_command
+
+
+class TestCommand:
+    def test_process_pending_events_called(self):
+        with mock.patch(
+            "payment.management.commands.process_stripe_events.process_pending_events",
+            return_value=2,
+        ) as mock_process:
+            call_command("process_stripe_events", "--limit", "10")
+        assert mock_process.call_args_list == [mock.call(limit=10)]
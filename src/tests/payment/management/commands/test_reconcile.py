@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import User
+
+from payment.management.commands import _reconcile
+from payment.models import Subscription
+
+
+def make_stripe_subscription(subscription_id, status="active", **kwargs):
+    return {
+        "id": subscription_id,
+        "status": status,
+        "cancel_at_period_end": False,
+        "current_period_start": 1731848765,
+        "current_period_end": 1734440765,
+        "trial_end": None,
+        **kwargs,
+    }
+
+
+def patch_stripe(stripe_subscriptions):
+    """Stubs the Stripe subscriptions listing, filtered by status."""
+
+    def list_subscriptions(params):
+        page = mock.Mock()
+        page.auto_paging_iter.return_value = iter(
+            subscription
+            for subscription in stripe_subscriptions
+            if params["status"] in ("all", subscription["status"])
+        )
+        return page
+
+    client = mock.Mock()
+    client.subscriptions.list.side_effect = list_subscriptions
+    return mock.patch.object(_reconcile, "get_stripe_client", return_value=client)
+
+
+@pytest.fixture
+def subscriptions(db):
+    """Local subscriptions, in sync with `make_stripe_subscription()` defaults."""
+    return [
+        Subscription.objects.create(
+            user=User.objects.create(username=f"user{i}"),
+            stripe_subscription_id=f"sub_{i}",
+            status="active",
+            active=True,
+            current_period_start=datetime(2024, 11, 17, 13, 6, 5, tzinfo=timezone.utc),
+            current_period_end=datetime(2024, 12, 17, 13, 6, 5, tzinfo=timezone.utc),
+        )
+        for i in range(3)
+    ]
+
+
+@pytest.mark.django_db
+class TestReconcileSubscriptions:
+
+    @pytest.mark.parametrize("workers", [None, 2])
+    def test_reconcile(self, subscriptions, workers, django_assert_num_queries):
+        stripe_subscriptions = [
+            make_stripe_subscription("sub_0"),
+            make_stripe_subscription("sub_1", status="canceled"),
+            make_stripe_subscription(
+                "sub_2", cancel_at_period_end=True, trial_end=1731935139
+            ),
+            # not known locally, left to the webhooks
+            make_stripe_subscription("sub_unknown"),
+        ]
+        with patch_stripe(stripe_subscriptions) as mock_get_stripe_client:
+            # fetching the local rows, then a single batch update
+            with django_assert_num_queries(2):
+                assert _reconcile.reconcile_subscriptions(workers=workers) == (4, 2)
+        list_calls = (
+            mock_get_stripe_client.return_value.subscriptions.list.call_args_list
+        )
+        expected_statuses = _reconcile.STATUSES if workers else ("all",)
+        assert list_calls == [
+            mock.call(params={"status": status, "limit": 100})
+            for status in expected_statuses
+        ]
+        for subscription in subscriptions:
+            subscription.refresh_from_db()
+        assert [
+            (subscription.status, subscription.active) for subscription in subscriptions
+        ] == [("active", True), ("canceled", False), ("active", True)]
+        assert subscriptions[2].cancel_at_period_end is True
+        assert subscriptions[2].trial_end == datetime(
+            2024, 11, 18, 13, 5, 39, tzinfo=timezone.utc
+        )
+        assert subscriptions[2].updated_at > subscriptions[2].created_at
+        # in sync now
+        with patch_stripe(stripe_subscriptions):
+            assert _reconcile.reconcile_subscriptions() == (4, 0)
+
+    def test_batches(self, subscriptions, django_assert_num_queries):
+        stripe_subscriptions = [
+            make_stripe_subscription(f"sub_{i}", status="past_due") for i in range(3)
+        ]
+        with patch_stripe(stripe_subscriptions):
+            with mock.patch.object(
+                Subscription.objects,
+                "bulk_update",
+                wraps=Subscription.objects.bulk_update,
+            ) as mock_bulk_update:
+                assert _reconcile.reconcile_subscriptions(batch_size=2) == (3, 3)
+        assert [len(call.args[0]) for call in mock_bulk_update.call_args_list] == [
+            2,
+            1,
+        ]
+        assert set(Subscription.objects.values_list("status", flat=True)) == {
+            "past_due"
+        }
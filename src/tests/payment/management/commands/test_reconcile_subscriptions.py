@@ -0,0 +1,17 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+
+class TestCommand:
+    def test_reconcile_subscriptions_called(self):
+        stdout = StringIO()
+        with mock.patch(
+            "payment.management.commands.reconcile_subscriptions"
+            ".reconcile_subscriptions",
+            return_value=(10, 2),
+        ) as mock_reconcile:
+            call_command("reconcile_subscriptions", "--workers", "4", stdout=stdout)
+        assert mock_reconcile.call_args_list == [mock.call(workers=4, batch_size=500)]
+        assert stdout.getvalue().startswith("Scanned 10 subscription(s), changed 2 in ")
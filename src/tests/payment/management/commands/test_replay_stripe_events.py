@@ -0,0 +1,102 @@
+import json
+from io import StringIO
+from unittest import mock
+
+import pytest
+import stripe
+from django.core.management import call_command
+
+from payment.management.commands import _replay
+from payment.models import StripeEvent
+
+EVENTS = [
+    {
+        "id": "evt_1",
+        "type": "customer.created",
+        "created": 1731848700,
+        "data": {"object": {"id": "cus_1"}},
+    },
+    {
+        "id": "evt_2",
+        "type": "customer.subscription.deleted",
+        "created": 1731848800,
+        "data": {"object": {"customer": "cus_1", "status": "canceled"}},
+    },
+]
+
+
+@pytest.fixture
+def events_path(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text("".join(f"{json.dumps(event)}\n" for event in EVENTS))
+    return path
+
+
+def test_sign_payload():
+    payload = json.dumps(EVENTS[0])
+    signature = _replay.sign_payload(payload, "whsec_test")
+    assert stripe.WebhookSignature.verify_header(payload, signature, "whsec_test")
+
+
+@pytest.mark.django_db
+class TestCommand:
+
+    def test_in_process(self, events_path):
+        stdout = StringIO()
+        call_command(
+            "replay_stripe_events",
+            str(events_path),
+            "--secret",
+            "",
+            "--repeat",
+            "2",
+            "--unique-ids",
+            stdout=stdout,
+        )
+        output = stdout.getvalue().splitlines()
+        assert output[0].split() == [
+            "event",
+            "type",
+            "events",
+            "errors",
+            "p50",
+            "ms",
+            "p95",
+            "ms",
+            "p99",
+            "ms",
+            "events/s",
+        ]
+        assert output[1].split()[:3] == ["customer.created", "2", "0"]
+        assert output[2].split()[:3] == ["customer.subscription.deleted", "2", "0"]
+        assert output[3].startswith("Replayed 4 event(s) in ")
+        assert output[3].endswith(", 0 error(s)")
+        assert sorted(StripeEvent.objects.values_list("event_id", flat=True)) == [
+            "evt_1_0",
+            "evt_1_1",
+            "evt_2_0",
+            "evt_2_1",
+        ]
+
+    def test_http(self, events_path):
+        with mock.patch.object(
+            _replay, "post_http", return_value=400
+        ) as mock_post_http:
+            stdout = StringIO()
+            call_command(
+                "replay_stripe_events",
+                str(events_path),
+                "--url",
+                "http://localhost:8000/api/v1/payment/stripe/webhook/",
+                "--secret",
+                "whsec_test",
+                "--concurrency",
+                "2",
+                stdout=stdout,
+            )
+        assert mock_post_http.call_count == 2
+        url, payload, signature = mock_post_http.call_args_list[0].args
+        assert url == "http://localhost:8000/api/v1/payment/stripe/webhook/"
+        assert stripe.WebhookSignature.verify_header(payload, signature, "whsec_test")
+        assert stdout.getvalue().splitlines()[-1].endswith(", 2 error(s)")
+        assert StripeEvent.objects.count() == 0
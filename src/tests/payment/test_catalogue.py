@@ -0,0 +1,78 @@
+from unittest import mock
+
+import pytest
+from django.http import Http404
+
+from payment import catalogue
+from payment.models import StripeProduct
+
+
+@pytest.fixture
+def product(db):
+    return StripeProduct.objects.create(
+        name="Essentiel",
+        product_id="prod_1",
+        monthly_price_id="price_monthly",
+        annual_price_id="price_annual",
+    )
+
+
+@pytest.mark.django_db
+class TestCatalogue:
+
+    def test_loaded_once(self, product, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            for _ in range(3):
+                assert catalogue.get_catalogue() == {"Essentiel": product}
+
+    @pytest.mark.parametrize(
+        "plan, expected", [("monthly", "price_monthly"), ("annual", "price_annual")]
+    )
+    def test_get_price_id(self, product, plan, expected):
+        assert catalogue.get_price_id("Essentiel", plan) == expected
+
+    def test_get_product_not_found(self):
+        with pytest.raises(Http404, match="No StripeProduct matches the given query."):
+            catalogue.get_product("Essentiel")
+
+    def test_invalidated_on_save(self, product, django_capture_on_commit_callbacks):
+        assert catalogue.get_product("Essentiel").monthly_price_id == "price_monthly"
+        product.monthly_price_id = "price_monthly_2"
+        with django_capture_on_commit_callbacks(execute=True):
+            product.save()
+        assert catalogue.get_product("Essentiel").monthly_price_id == "price_monthly_2"
+
+    def test_invalidated_on_delete(self, product):
+        assert catalogue.get_product("Essentiel") == product
+        product.delete()
+        with pytest.raises(Http404):
+            catalogue.get_product("Essentiel")
+
+    def test_expired(self, product, django_assert_num_queries):
+        catalogue.get_catalogue()
+        with mock.patch(
+            "payment.catalogue.time.monotonic",
+            return_value=catalogue._loaded_at + catalogue.CATALOGUE_TTL + 1,
+        ), django_assert_num_queries(1):
+            catalogue.get_catalogue()
+
+    def test_not_shared(self, product):
+        """The products are kept in process, without a cache round trip."""
+        catalogue.get_catalogue()
+        with mock.patch.object(catalogue.stripe_products, "get") as mock_get:
+            assert catalogue.get_catalogue() == {"Essentiel": product}
+        assert mock_get.call_count == 0
+
+    def test_invalidated_by_another_process(self, product, django_assert_num_queries):
+        catalogue.get_catalogue()
+        # as done by `invalidate_catalogue()` in another process
+        catalogue.stripe_products.set("version", "other", timeout=None)
+        with django_assert_num_queries(0):
+            catalogue.get_catalogue()
+        with mock.patch(
+            "payment.catalogue.time.monotonic",
+            return_value=catalogue._checked_at + catalogue.CATALOGUE_CHECK_INTERVAL + 1,
+        ), django_assert_num_queries(1):
+            catalogue.get_catalogue()
+            # checked again after the interval only
+            catalogue.get_catalogue()
@@ -0,0 +1,71 @@
+import threading
+from unittest import mock
+
+import pytest
+import stripe
+from asgiref.sync import async_to_sync
+
+from payment import constants
+from payment.stripe_client import acall_stripe, get_stripe_client
+
+
+@pytest.fixture(autouse=True)
+def clear_stripe_client():
+    get_stripe_client.cache_clear()
+    yield
+    get_stripe_client.cache_clear()
+
+
+def test_get_stripe_client(settings):
+    settings.STRIPE_API_KEY = "sk_test_123"
+    settings.STRIPE_TIMEOUT = 5
+    settings.STRIPE_MAX_NETWORK_RETRIES = 3
+    client = get_stripe_client()
+    assert isinstance(client, stripe.StripeClient)
+    requestor = client._requestor
+    assert requestor.api_key == "sk_test_123"
+    assert requestor._options.stripe_version == constants.STRIPE_API_VERSION
+    assert requestor._client._timeout == 5
+    assert requestor._options.max_network_retries == 3
+    assert isinstance(requestor._client, stripe.RequestsClient)
+    # shared, so are its HTTP connections
+    assert get_stripe_client() is client
+    # the global configuration is left untouched
+    assert stripe.api_key is None
+
+
+def test_acall_stripe():
+    """The sync client is called in a thread, reusing its pooled connections."""
+    method = mock.Mock(side_effect=lambda *args, **kwargs: threading.get_ident())
+
+    async def call():
+        return await acall_stripe(method, "sub_1", params={"a": 1})
+
+    assert async_to_sync(call)() != threading.get_ident()
+    assert method.call_args_list == [mock.call("sub_1", params={"a": 1})]
+
+
+def test_acall_stripe_reuses_session(settings):
+    """
+    The calls from different event loops, e.g. the async views under WSGI, share
+    the thread local `requests` session, so its connections.
+    """
+    settings.STRIPE_API_KEY = "sk_test_123"
+    sessions = []
+
+    def request(session, *args, **kwargs):
+        sessions.append(session)
+        return mock.Mock(
+            status_code=200,
+            content=b'{"id": "cus_1", "object": "customer"}',
+            headers={},
+        )
+
+    async def call():
+        return await acall_stripe(get_stripe_client().customers.retrieve, "cus_1")
+
+    with mock.patch("requests.Session.request", request):
+        for _ in range(2):
+            assert async_to_sync(call)().id == "cus_1"
+    assert len(sessions) == 2
+    assert sessions[0] is sessions[1]
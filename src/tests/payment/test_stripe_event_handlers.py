@@ -0,0 +1,196 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from django.core.exceptions import BadRequest
+
+from payment import stripe_event_handlers
+from payment.checkout import (
+    checkout_sessions,
+    get_checkout_session_cache_key,
+    get_open_checkout_session,
+)
+from payment.models import CustomerDetail, Invoice, Subscription
+
+CUSTOMER_ID = "cus_REbNQXKKFCRF2c"
+
+EVENTS = {
+    "customer.subscription.updated": {
+        "current_period_end": 1734440765,
+        "current_period_start": 1731848765,
+        "customer": CUSTOMER_ID,
+        "status": "active",
+        "cancel_at_period_end": True,
+        "trial_end": None,
+        "items": {"data": [{"plan": {"active": True}}]},
+    },
+    "invoice.paid": {
+        "id": "in_1",
+        "amount_paid": 990,
+        "created": 1731848775,
+        "currency": "eur",
+        "customer": CUSTOMER_ID,
+        "hosted_invoice_url": "https://stripe.com/invoice/test123",
+        "invoice_pdf": "https://stripe.com/invoice/test123.pdf",
+        "number": "A1B2C3D4-0001",
+        "status": "paid",
+        "subscription": "sub_1",
+    },
+    "customer.subscription.deleted": {
+        "customer": CUSTOMER_ID,
+        "status": "canceled",
+    },
+}
+
+
+def make_event(event_type, created=1731848800):
+    return {
+        "id": f"evt_{event_type}",
+        "type": event_type,
+        "created": created,
+        "data": {"object": EVENTS[event_type]},
+    }
+
+
+@pytest.fixture
+def subscription(user):
+    CustomerDetail.objects.create(user=user, stripe_customer_id=CUSTOMER_ID)
+    return Subscription.objects.create(
+        user=user, stripe_subscription_id="sub_1", status="active"
+    )
+
+
+@pytest.mark.django_db
+class TestHandlers:
+
+    @pytest.mark.parametrize(
+        "event_type, num_queries",
+        [
+            ("customer.subscription.updated", 1),
+            # and the invoice upsert
+            ("invoice.paid", 2),
+            ("customer.subscription.deleted", 1),
+        ],
+    )
+    def test_single_query(
+        self, subscription, event_type, num_queries, django_assert_num_queries
+    ):
+        """Subscription events get applied in a single UPDATE statement."""
+        with django_assert_num_queries(num_queries) as context:
+            stripe_event_handlers.handle_event(make_event(event_type))
+        assert context.captured_queries[0]["sql"].startswith("UPDATE")
+
+    def test_invoice_paid(self, subscription):
+        """The invoice gets upserted in the billing history."""
+        stripe_event_handlers.handle_event(make_event("invoice.paid"))
+        event = make_event("invoice.paid")
+        event["data"]["object"] = {**EVENTS["invoice.paid"], "status": "void"}
+        stripe_event_handlers.handle_event(event)
+        invoice = Invoice.objects.get()
+        assert invoice.user == subscription.user
+        assert invoice.stripe_invoice_id == "in_1"
+        assert invoice.stripe_subscription_id == "sub_1"
+        assert invoice.number == "A1B2C3D4-0001"
+        assert invoice.amount_paid == Decimal("9.90")
+        assert invoice.currency == "eur"
+        assert invoice.status == "void"
+        assert invoice.created == datetime(2024, 11, 17, 13, 6, 15, tzinfo=timezone.utc)
+
+    @pytest.mark.parametrize("event_type", EVENTS)
+    def test_unknown_customer(self, db, event_type):
+        with pytest.raises(BadRequest, match="CustomerDetail does not exist."):
+            stripe_event_handlers.handle_event(make_event(event_type))
+
+    def test_stale_event(self, subscription, django_assert_num_queries):
+        """Stale events only cost the extra customer existence check."""
+        stripe_event_handlers.handle_event(
+            make_event("customer.subscription.deleted", created=2)
+        )
+        with django_assert_num_queries(2):
+            stripe_event_handlers.handle_event(
+                make_event("customer.subscription.updated", created=1)
+            )
+        subscription.refresh_from_db()
+        assert subscription.status == "canceled"
+        assert subscription.cancel_at_period_end is False
+
+    def test_same_second_events(self, subscription):
+        """A subscription updated within the deletion second stays canceled."""
+        for event_type in (
+            "customer.subscription.updated",
+            "customer.subscription.deleted",
+            "customer.subscription.updated",
+        ):
+            stripe_event_handlers.handle_event(make_event(event_type))
+        subscription.refresh_from_db()
+        assert subscription.status == "canceled"
+        assert subscription.active is False
+        assert subscription.last_stripe_event_created == 1731848800
+
+    def test_checkout_session_completed_forgets_open_session(self, user):
+        cache_key = get_checkout_session_cache_key(user.id, "annual")
+        checkout_sessions.set(
+            cache_key, {"id": "cs_1", "url": "https://checkout.stripe.com/c"}
+        )
+        session = {
+            "amount_total": 9900,
+            "customer": CUSTOMER_ID,
+            "customer_details": {
+                "address": {
+                    "city": "Paris",
+                    "country": "FR",
+                    "line1": "1 Rue de Rivoli",
+                    "postal_code": "75001",
+                },
+                "email": "nurse@example.com",
+            },
+            "metadata": {
+                "product_name": "Essentiel",
+                "user_id": str(user.id),
+                "plan": "annual",
+            },
+            "payment_status": "paid",
+            "status": "complete",
+            "subscription": "sub_1",
+        }
+        stripe_event_handlers.handle_event(
+            {"type": "checkout.session.completed", "data": {"object": session}}
+        )
+        assert get_open_checkout_session(user.id, "annual") is None
+        assert Subscription.objects.get(user=user).stripe_subscription_id == "sub_1"
+
+
+@pytest.mark.parametrize(
+    "status, active",
+    [
+        ("active", True),
+        ("trialing", True),
+        ("past_due", False),
+        ("unpaid", False),
+        ("canceled", False),
+    ],
+)
+def test_get_subscription_fields(status, active):
+    """The webhooks and the reconciliation share the same mapping."""
+    stripe_subscription = {
+        **EVENTS["customer.subscription.updated"],
+        "status": status,
+        "trial_end": 1731848765,
+    }
+    assert stripe_event_handlers.get_subscription_fields(stripe_subscription) == {
+        "status": status,
+        "active": active,
+        "cancel_at_period_end": True,
+        "current_period_start": datetime(2024, 11, 17, 13, 6, 5, tzinfo=timezone.utc),
+        "current_period_end": datetime(2024, 12, 17, 13, 6, 5, tzinfo=timezone.utc),
+        "trial_end": datetime(2024, 11, 17, 13, 6, 5, tzinfo=timezone.utc),
+    }
+
+
+@pytest.mark.parametrize(
+    "payment_status, status",
+    [("paid", "active"), ("no_payment_required", "trialing"), ("unpaid", "incomplete")],
+)
+def test_get_checkout_subscription_status(payment_status, status):
+    session = {"payment_status": payment_status, "status": "complete"}
+    assert stripe_event_handlers.get_checkout_subscription_status(session) == status
@@ -1,12 +1,19 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from unittest import mock
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock
 
 import pytest
 import stripe
+from django.contrib.auth.models import User
 from django.urls.base import reverse_lazy
+from freezegun import freeze_time
 from rest_framework import status
+from rest_framework.test import APIClient
 
-from payment.models import StripeProduct, Subscription
+from payment.models import Invoice, StripeProduct, Subscription
+from payment.stripe_event_handlers import handle_event
+from payment.views import InvoicePagination
 
 
 @pytest.fixture
@@ -18,11 +25,28 @@ def essentiel_product():
     )
 
 
+def make_checkout_session(session_id="session_id_example"):
+    checkout_session = MagicMock()
+    checkout_session.id = session_id
+    checkout_session.url = f"https://checkout.stripe.com/pay/{session_id}"
+    # i.e. 35 minutes after the frozen time
+    checkout_session.expires_at = 1731850839
+    return checkout_session
+
+
 @pytest.fixture
 def client(authenticated_client):
     return authenticated_client
 
 
+@pytest.fixture
+def stripe_client():
+    with mock.patch(
+        "payment.views.get_stripe_client", return_value=mock.Mock()
+    ) as mock_get_stripe_client:
+        yield mock_get_stripe_client.return_value
+
+
 @pytest.mark.django_db
 class TestSubscriptionViewSet:
     create_url = reverse_lazy("v1:payment:subscription-list")
@@ -32,50 +56,116 @@ class TestSubscriptionViewSet:
         assert self.create_url == "/api/v1/payment/subscription/"
         assert self.retrieve_url == "/api/v1/payment/subscription/1/"
 
-    @patch("payment.views.stripe.checkout.Session.create")
+    @freeze_time("2024-11-17 13:05:39")
     def test_create_subscription_success(
-        self, mock_create_session, client, user, essentiel_product
+        self, stripe_client, client, user, essentiel_product
     ):
         client.force_login(user)
         data = {"plan": "monthly"}
-        mock_checkout_session = MagicMock()
-        mock_checkout_session.id = "session_id_example"
-        mock_checkout_session.url = "https://checkout.stripe.com/pay/example"
+        mock_checkout_session = make_checkout_session()
+        mock_create_session = stripe_client.checkout.sessions.create
         mock_create_session.return_value = mock_checkout_session
         response = client.post(self.create_url, data, format="json")
         assert response.status_code == status.HTTP_201_CREATED
         assert response.data["sessionId"] == "session_id_example"
         assert (
-            response.data["checkout_url"] == "https://checkout.stripe.com/pay/example"
+            response.data["checkout_url"]
+            == "https://checkout.stripe.com/pay/session_id_example"
         )
+        assert mock_create_session.call_count == 1
+        params = mock_create_session.call_args.kwargs["params"]
+        assert params["line_items"] == [
+            {"price": essentiel_product.monthly_price_id, "quantity": 1}
+        ]
+        assert params["metadata"] == {
+            "user_id": user.id,
+            "product_name": "Essentiel",
+            "plan": "monthly",
+        }
+        assert params["expires_at"] == 1731850839
 
-    @patch("payment.views.stripe.checkout.Session.create")
-    def test_create_subscription_product_not_found(
-        self, mock_get_product, client, user
+    @freeze_time("2024-11-17 13:05:39")
+    def test_create_subscription_reuses_open_session(
+        self, stripe_client, client, user, essentiel_product
     ):
+        """Repeat requests get the open session rather than a new one."""
+        mock_create_session = stripe_client.checkout.sessions.create
+        mock_create_session.side_effect = [
+            make_checkout_session("cs_monthly"),
+            make_checkout_session("cs_annual"),
+            make_checkout_session("cs_monthly_2"),
+            make_checkout_session("cs_annual_2"),
+        ]
+        for plan, session_id in (
+            ("monthly", "cs_monthly"),
+            ("monthly", "cs_monthly"),
+            ("annual", "cs_annual"),
+            ("annual", "cs_annual"),
+        ):
+            response = client.post(self.create_url, {"plan": plan}, format="json")
+            assert response.status_code == status.HTTP_201_CREATED
+            assert response.data == {
+                "sessionId": session_id,
+                "checkout_url": f"https://checkout.stripe.com/pay/{session_id}",
+            }
+        assert mock_create_session.call_count == 2
+        # the session expired, a later checkout needs a new one
+        handle_event(
+            {
+                "type": "checkout.session.expired",
+                "data": {
+                    "object": {"metadata": {"user_id": str(user.id), "plan": "monthly"}}
+                },
+            }
+        )
+        response = client.post(self.create_url, {"plan": "monthly"}, format="json")
+        assert response.data["sessionId"] == "cs_monthly_2"
+        # shortly before it expires, the session is no longer handed out
+        with freeze_time("2024-11-17 13:39:40"):
+            response = client.post(self.create_url, {"plan": "annual"}, format="json")
+        assert response.data["sessionId"] == "cs_annual_2"
+        assert mock_create_session.call_count == 4
+
+    @freeze_time("2024-11-17 13:05:39")
+    def test_create_subscription_cache_follows_expires_at(
+        self, stripe_client, client, user, essentiel_product
+    ):
+        """The session is cached until the expiry Stripe returned."""
+        checkout_session = make_checkout_session("cs_short")
+        # i.e. 10 minutes after the frozen time
+        checkout_session.expires_at = 1731848739 + 10 * 60
+        mock_create_session = stripe_client.checkout.sessions.create
+        mock_create_session.side_effect = [
+            checkout_session,
+            make_checkout_session("cs_next"),
+        ]
+        response = client.post(self.create_url, {"plan": "monthly"}, format="json")
+        assert response.data["sessionId"] == "cs_short"
+        with freeze_time("2024-11-17 13:14:40"):
+            response = client.post(self.create_url, {"plan": "monthly"}, format="json")
+        assert response.data["sessionId"] == "cs_next"
+
+    def test_create_subscription_product_not_found(self, stripe_client, client, user):
         client.force_login(user)
         data = {"plan": "monthly"}
-        mock_get_product.side_effect = StripeProduct.DoesNotExist
         response = client.post(self.create_url, data, format="json")
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.data == {"detail": "No StripeProduct matches the given query."}
 
-    @patch("payment.views.stripe.checkout.Session.create")
     def test_create_subscription_stripe_session_creation_failed(
-        self, mock_create_session, client, user, essentiel_product
+        self, stripe_client, client, user, essentiel_product
     ):
         client.force_login(user)
         client.raise_request_exception = False
         data = {"plan": "monthly"}
-        mock_create_session.side_effect = Exception("Error during session creation")
+        stripe_client.checkout.sessions.create.side_effect = Exception(
+            "Error during session creation"
+        )
         response = client.post(self.create_url, data, format="json")
         assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
         assert response.json() == {"error": "Server Error (500)"}
 
-    @patch("payment.views.stripe.checkout.Session.create")
-    def test_retrieve_subscription_success(
-        self, mock_create_session, client, user, essentiel_product
-    ):
+    def test_retrieve_subscription_success(self, client, user, essentiel_product):
         client.force_login(user)
         Subscription.objects.create(
             user=user, stripe_subscription_id="session_id_example"
@@ -102,7 +192,7 @@ class TestSubscriptionUserCancelView:
     def test_endpoint(self):
         assert self.url == "/api/v1/payment/subscriptions/user/cancel/"
 
-    def test_subscription_user_cancel_view(self, client, user):
+    def test_subscription_user_cancel_view(self, stripe_client, client, user):
         client.force_login(user)
 
         subscription = Subscription.objects.create(
@@ -111,12 +201,17 @@ class TestSubscriptionUserCancelView:
             cancel_at_period_end=False,
         )
 
-        with mock.patch("stripe.Subscription.modify") as mock_stripe_modify:
-            mock_stripe_modify.return_value = {
-                "id": "sub_1FgsVx2R1LZ5sbG0fFqkg9Jz",
-                "cancel_at_period_end": True,
-            }
-            response = client.post(self.url, data={}, format="json")
+        mock_stripe_update = stripe_client.subscriptions.update
+        mock_stripe_update.return_value = {
+            "id": "sub_1FgsVx2R1LZ5sbG0fFqkg9Jz",
+            "cancel_at_period_end": True,
+        }
+        response = client.post(self.url, data={}, format="json")
+        assert mock_stripe_update.call_args_list == [
+            mock.call(
+                "sub_1FgsVx2R1LZ5sbG0fFqkg9Jz", params={"cancel_at_period_end": True}
+            )
+        ]
 
         assert response.status_code == status.HTTP_200_OK
         assert response.data == {"message": "Subscription canceled successfully"}
@@ -125,7 +220,7 @@ class TestSubscriptionUserCancelView:
         assert subscription.cancel_at_period_end is True
         assert subscription.active is False
 
-    def test_subscription_user_cancel_stripe_error(self, client, user):
+    def test_subscription_user_cancel_stripe_error(self, stripe_client, client, user):
         client.force_login(user)
 
         subscription = Subscription.objects.create(
@@ -134,14 +229,70 @@ class TestSubscriptionUserCancelView:
             cancel_at_period_end=False,
         )
 
-        with mock.patch("stripe.Subscription.modify") as mock_stripe_modify:
-            mock_stripe_modify.side_effect = stripe.error.InvalidRequestError(
-                "Invalid subscription ID", "param"
-            )
-            response = client.post(self.url, data={}, format="json")
+        stripe_client.subscriptions.update.side_effect = (
+            stripe.error.InvalidRequestError("Invalid subscription ID", "param")
+        )
+        response = client.post(self.url, data={}, format="json")
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert response.data == {"error": "Stripe error: Invalid subscription ID"}
 
         subscription.refresh_from_db()
         assert subscription.cancel_at_period_end is False
+
+
+@pytest.mark.django_db
+class TestInvoiceViewSet:
+    url = reverse_lazy("v1:payment:invoice-list")
+
+    def test_endpoint(self):
+        assert self.url == "/api/v1/payment/invoice/"
+
+    def test_list(self, client, user):
+        created = datetime(2024, 11, 17, tzinfo=timezone.utc)
+        for i in range(3):
+            Invoice.objects.create(
+                user=user,
+                stripe_invoice_id=f"in_{i}",
+                amount_paid=Decimal("9.90"),
+                currency="eur",
+                status="paid",
+                # two invoices at the same time, tie broken on the id
+                created=created + timedelta(days=min(i, 1)),
+            )
+        # someone else's invoice
+        Invoice.objects.create(
+            user=User.objects.create(username="other"),
+            stripe_invoice_id="in_other",
+            amount_paid=Decimal("9.90"),
+            currency="eur",
+            status="paid",
+            created=created,
+        )
+        stripe_invoice_ids = []
+        url = self.url
+        with mock.patch.object(InvoicePagination, "page_size", 2):
+            while url:
+                response = client.get(url)
+                assert response.status_code == status.HTTP_200_OK
+                data = response.json()
+                stripe_invoice_ids += [
+                    invoice["stripe_invoice_id"] for invoice in data["results"]
+                ]
+                url = data["next"]
+        assert stripe_invoice_ids == ["in_2", "in_1", "in_0"]
+        assert data["results"][0] == {
+            "id": mock.ANY,
+            "stripe_invoice_id": "in_0",
+            "number": None,
+            "amount_paid": "9.90",
+            "currency": "eur",
+            "status": "paid",
+            "hosted_invoice_url": None,
+            "invoice_pdf": None,
+            "created": "2024-11-17T00:00:00Z",
+        }
+
+    def test_list_401(self):
+        response = APIClient().get(self.url)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
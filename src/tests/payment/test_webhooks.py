@@ -12,7 +12,8 @@ from django.urls import reverse_lazy
 from django.utils import timezone
 from rest_framework import status
 
-from payment.models import CustomerDetail, Subscription
+from payment import stripe_event_handlers
+from payment.models import CustomerDetail, Invoice, StripeEvent, Subscription
 
 STRIPE_WEBHOOK_SECRET = "whsec_testsecret"
 
@@ -25,6 +26,8 @@ def client():
 @pytest.fixture
 def customer_subscription_deleted_payload():
     return {
+        "id": "evt_1QTnDeleted",
+        "created": 1731848800,
         "type": "customer.subscription.deleted",
         "data": {
             "object": {
@@ -38,12 +41,22 @@ def customer_subscription_deleted_payload():
 @pytest.fixture
 def invoice_paid_payload():
     return {
+        "id": "evt_1QTnInvoicePaid",
+        "created": 1731848780,
         "type": "invoice.paid",
         "data": {
             "object": {
+                "id": "in_1QTnInvoice",
+                "object": "invoice",
+                "amount_paid": 990,
+                "created": 1731848775,
+                "currency": "eur",
                 "customer": "cus_REbNQXKKFCRF2c",
                 "hosted_invoice_url": "https://stripe.com/invoice/test123",
                 "invoice_pdf": "https://stripe.com/invoice/test123.pdf",
+                "number": "A1B2C3D4-0001",
+                "status": "paid",
+                "subscription": "sub_1QTmqQKlp91vayS3kwoCFUvT",
             }
         },
     }
@@ -52,12 +65,15 @@ def invoice_paid_payload():
 @pytest.fixture
 def customer_subscription_updated_payload():
     return {
+        "id": "evt_1QTnUpdated",
+        "created": 1731848770,
         "type": "customer.subscription.updated",
         "data": {
             "object": {
                 "current_period_end": 1734440765,  # Timestamp for period end
                 "current_period_start": 1731848765,  # Timestamp for period start
                 "customer": "cus_REbNQXKKFCRF2c",
+                "status": "active",
                 "cancel_at_period_end": False,
                 "trial_end": "null",  # No trial
                 "items": {
@@ -78,6 +94,8 @@ def customer_subscription_updated_payload():
 def checkout_session_completed_payload():
     """Fixture to generate a 'checkout.session.completed' event payload."""
     return {
+        "id": "evt_1QTnCompleted",
+        "created": 1731848760,
         "type": "checkout.session.completed",
         "data": {
             "object": {
@@ -133,6 +151,10 @@ def generate_stripe_signature(payload, secret):
 class TestStripeWebhook:
     url = reverse_lazy("v1:payment:stripe-webhook")
 
+    @pytest.fixture(autouse=True)
+    def process_inline(self, settings):
+        settings.STRIPE_WEBHOOK_PROCESS_INLINE = True
+
     def test_endpoint(self):
         assert self.url == "/api/v1/payment/stripe/webhook/"
 
@@ -245,10 +267,9 @@ class TestStripeWebhook:
             subscription.stripe_subscription_id
             == checkout_session_completed_payload["data"]["object"]["subscription"]
         )
-        assert (
-            subscription.status
-            == checkout_session_completed_payload["data"]["object"]["status"]
-        )
+        # of the subscription, the session being paid
+        assert subscription.status == "active"
+        assert subscription.active is True
         assert (
             subscription.payment_status
             == checkout_session_completed_payload["data"]["object"]["payment_status"]
@@ -286,8 +307,33 @@ class TestStripeWebhook:
                 content_type="application/json",
                 HTTP_STRIPE_SIGNATURE=sig_header,
             )
+        # the failure is still recorded for the event to be retried
         assert response.status_code == status.HTTP_400_BAD_REQUEST
-        assert response.json() == {"error": "Bad Request (400)"}
+        stripe_event = StripeEvent.objects.get()
+        assert stripe_event.processed_at is None
+        assert stripe_event.attempts == 1
+        assert stripe_event.last_error == "BadRequest: User does not exist."
+
+    def test_customer_subscription_updated_customer_does_not_exist(
+        self, customer_subscription_updated_payload, client
+    ):
+        sig_header = generate_stripe_signature(
+            customer_subscription_updated_payload, STRIPE_WEBHOOK_SECRET
+        )
+        with mock.patch(
+            "stripe.Webhook.construct_event",
+            return_value=customer_subscription_updated_payload,
+        ):
+            response = client.post(
+                self.url,
+                data=json.dumps(customer_subscription_updated_payload),
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=sig_header,
+            )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        stripe_event = StripeEvent.objects.get()
+        assert stripe_event.processed_at is None
+        assert stripe_event.last_error == "BadRequest: CustomerDetail does not exist."
 
     def test_customer_subscription_updated(
         self, customer_subscription_updated_payload, client, user
@@ -361,11 +407,8 @@ class TestStripeWebhook:
         )
 
         assert subscription.trial_end == expected_trial_end
-        assert subscription.active == bool(
-            customer_subscription_updated_payload["data"]["object"]["items"]["data"][0][
-                "plan"
-            ]["active"]
-        )
+        assert subscription.status == "active"
+        assert subscription.active is True
 
     def test_invoice_paid(self, invoice_paid_payload, client, user):
         """
@@ -408,6 +451,9 @@ class TestStripeWebhook:
             subscription.invoice_pdf
             == invoice_paid_payload["data"]["object"]["invoice_pdf"]
         )
+        # and recorded in the billing history
+        invoice = Invoice.objects.get(user=user)
+        assert invoice.stripe_invoice_id == "in_1QTnInvoice"
 
     def test_customer_subscription_deleted(
         self, customer_subscription_deleted_payload, client, user
@@ -450,6 +496,7 @@ class TestStripeWebhook:
 
     def test_unknown_event_type(self, client):
         unknown_payload = {
+            "id": "evt_1QTnUnknown",
             "type": "unknown_event",
             "data": {
                 "object": {
@@ -471,3 +518,157 @@ class TestStripeWebhook:
             )
 
         assert response.status_code == status.HTTP_200_OK
+
+    def test_customer_subscription_updated_out_of_order(
+        self,
+        client,
+        user,
+        customer_subscription_updated_payload,
+        customer_subscription_deleted_payload,
+    ):
+        """An `updated` event delivered after a newer `deleted` one gets ignored."""
+        CustomerDetail.objects.create(
+            user=user, stripe_customer_id="cus_REbNQXKKFCRF2c"
+        )
+        Subscription.objects.create(user=user, status="active", active=True)
+        for payload in (
+            customer_subscription_deleted_payload,
+            customer_subscription_updated_payload,
+        ):
+            sig_header = generate_stripe_signature(payload, STRIPE_WEBHOOK_SECRET)
+            with mock.patch("stripe.Webhook.construct_event", return_value=payload):
+                response = client.post(
+                    self.url,
+                    data=json.dumps(payload),
+                    content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE=sig_header,
+                )
+            assert response.status_code == status.HTTP_200_OK
+        subscription = Subscription.objects.get(user=user)
+        assert subscription.status == "canceled"
+        assert subscription.active is False
+        assert subscription.current_period_end is None
+        assert subscription.last_stripe_event_created == 1731848800
+        # both events were still processed successfully
+        assert StripeEvent.objects.pending().count() == 0
+
+    def test_event_redelivered(self, client, invoice_paid_payload):
+        """Redelivered events don't run their handler again."""
+        sig_header = generate_stripe_signature(
+            invoice_paid_payload, STRIPE_WEBHOOK_SECRET
+        )
+        with mock.patch(
+            "stripe.Webhook.construct_event", return_value=invoice_paid_payload
+        ), mock.patch(
+            "payment.stripe_event_handlers.HANDLERS", {"invoice.paid": mock.Mock()}
+        ) as handlers:
+            for _ in range(2):
+                response = client.post(
+                    self.url,
+                    data=json.dumps(invoice_paid_payload),
+                    content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE=sig_header,
+                )
+                assert response.status_code == status.HTTP_200_OK
+        assert handlers["invoice.paid"].call_count == 1
+        assert StripeEvent.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestStripeWebhookDeferred:
+    url = reverse_lazy("v1:payment:stripe-webhook")
+
+    def post_event(self, client, payload):
+        sig_header = generate_stripe_signature(payload, STRIPE_WEBHOOK_SECRET)
+        with mock.patch("stripe.Webhook.construct_event", return_value=payload):
+            return client.post(
+                self.url,
+                data=json.dumps(payload),
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=sig_header,
+            )
+
+    def test_event_stored(self, client, invoice_paid_payload):
+        """The event is only stored, not processed, by the webhook."""
+        with mock.patch(
+            "payment.stripe_event_handlers.handle_invoice_paid"
+        ) as mock_handler:
+            response = self.post_event(client, invoice_paid_payload)
+        assert response.status_code == status.HTTP_200_OK
+        assert mock_handler.call_count == 0
+        stripe_event = StripeEvent.objects.get()
+        assert stripe_event.event_id == "evt_1QTnInvoicePaid"
+        assert stripe_event.type == "invoice.paid"
+        assert stripe_event.created == 1731848780
+        assert stripe_event.payload == invoice_paid_payload
+        assert stripe_event.processed_at is None
+        assert list(StripeEvent.objects.pending()) == [stripe_event]
+
+    def test_event_redelivered(
+        self, client, invoice_paid_payload, django_assert_num_queries
+    ):
+        """Redeliveries cost a single insert-or-ignore and are never reprocessed."""
+        self.post_event(client, invoice_paid_payload)
+        StripeEvent.objects.update(processed_at=timezone.now(), attempts=1)
+        with django_assert_num_queries(1):
+            stripe_event_handlers.store_event(invoice_paid_payload)
+        response = self.post_event(client, invoice_paid_payload)
+        assert response.status_code == status.HTTP_200_OK
+        stripe_event = StripeEvent.objects.get()
+        assert stripe_event.attempts == 1
+        assert StripeEvent.objects.pending().count() == 0
+
+    def test_process_pending_events(
+        self, client, user, invoice_paid_payload, customer_subscription_deleted_payload
+    ):
+        CustomerDetail.objects.create(
+            user=user, stripe_customer_id="cus_REbNQXKKFCRF2c"
+        )
+        Subscription.objects.create(user=user, status="active", active=True)
+        # received out of order, processed in the order Stripe created them
+        self.post_event(client, customer_subscription_deleted_payload)
+        self.post_event(client, invoice_paid_payload)
+        handlers = {
+            "invoice.paid": mock.Mock(wraps=stripe_event_handlers.handle_invoice_paid),
+            "customer.subscription.deleted": mock.Mock(
+                wraps=stripe_event_handlers.handle_customer_subscription_deleted
+            ),
+        }
+        manager = mock.Mock()
+        for name, handler in handlers.items():
+            manager.attach_mock(handler, name.replace(".", "_"))
+        with mock.patch.dict(stripe_event_handlers.HANDLERS, handlers):
+            assert stripe_event_handlers.process_pending_events() == 2
+        assert [call[0] for call in manager.mock_calls] == [
+            "invoice_paid",
+            "customer_subscription_deleted",
+        ]
+        assert StripeEvent.objects.pending().count() == 0
+        subscription = Subscription.objects.get(user=user)
+        assert subscription.invoice_pdf == "https://stripe.com/invoice/test123.pdf"
+        assert subscription.status == "canceled"
+        # nothing left to process
+        assert stripe_event_handlers.process_pending_events() == 0
+
+    def test_process_pending_events_retry(self, client, user, invoice_paid_payload):
+        """Failing events are retried on the next runs, up to `MAX_ATTEMPTS`."""
+        self.post_event(client, invoice_paid_payload)
+        for attempt in range(1, StripeEvent.objects.MAX_ATTEMPTS + 1):
+            assert stripe_event_handlers.process_pending_events() == 0
+            stripe_event = StripeEvent.objects.get()
+            assert stripe_event.attempts == attempt
+            assert stripe_event.last_error == (
+                "BadRequest: CustomerDetail does not exist."
+            )
+        # given up on
+        assert StripeEvent.objects.pending().count() == 0
+        # recovers once the data it depends on is there
+        CustomerDetail.objects.create(
+            user=user, stripe_customer_id="cus_REbNQXKKFCRF2c"
+        )
+        Subscription.objects.create(user=user, status="active")
+        StripeEvent.objects.update(attempts=0)
+        assert stripe_event_handlers.process_pending_events() == 1
+        stripe_event.refresh_from_db()
+        assert stripe_event.processed_at is not None
+        assert stripe_event.last_error == ""
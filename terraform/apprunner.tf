@@ -1,3 +1,50 @@
+# shared by the App Runner service and the workers (workers.tf)
+locals {
+  env_backend = {
+    SECRET_KEY                  = data.aws_ssm_parameter.secret_key.value
+    TIME_ZONE                   = var.env_time_zone
+    ALLOWED_HOSTS               = jsonencode(var.env_allowed_hosts)
+    CSRF_TRUSTED_ORIGINS        = jsonencode(var.env_csrf_trusted_origins)
+    CORS_ALLOWED_ORIGINS        = jsonencode(var.env_cors_allowed_origins)
+    CORS_ALLOWED_ORIGIN_REGEXES = jsonencode(var.env_cors_allowed_origin_regexes)
+    PRODUCTION                  = var.env_production
+    SENTRY_DSN                  = data.aws_ssm_parameter.sentry_dsn.value
+    SENTRY_TRACES_SAMPLE_RATE   = var.env_sentry_traces_sample_rate
+    SENTRY_TRACES_SAMPLE_RATES  = jsonencode(var.env_sentry_traces_sample_rates)
+    SENTRY_PROFILES_SAMPLE_RATE = var.env_sentry_profiles_sample_rate
+    # Database
+    DATABASE_ENGINE   = var.env_database_engine
+    DATABASE_NAME     = data.aws_ssm_parameter.database_name.value
+    DATABASE_USER     = data.aws_ssm_parameter.database_user.value
+    DATABASE_PASSWORD = data.aws_ssm_parameter.database_password.value
+    DATABASE_HOST     = data.aws_ssm_parameter.database_host.value
+    DATABASE_PORT     = var.env_database_port
+    # Cache
+    CACHE_BACKEND = var.env_cache_backend
+    # Email
+    EMAIL_USE_SSL       = var.env_email_use_ssl
+    EMAIL_HOST          = data.aws_ssm_parameter.email_host.value
+    EMAIL_PORT          = var.env_email_port
+    EMAIL_HOST_USER     = data.aws_ssm_parameter.email_host_user.value
+    EMAIL_HOST_PASSWORD = data.aws_ssm_parameter.email_host_password.value
+    # S3
+    AWS_ACCESS_KEY_ID     = data.aws_ssm_parameter.aws_access_key_id.value
+    AWS_SECRET_ACCESS_KEY = data.aws_ssm_parameter.aws_secret_access_key.value
+    # Djoser
+    PASSWORD_RESET_CONFIRM_URL = var.env_password_reset_confirm_url
+    TEMPLATED_MAIL_DOMAIN      = local.env_templated_mail_domain
+    TEMPLATED_SITE_NAME        = var.env_templated_site_name
+    # OneSignal
+    ONESIGNAL_APP_ID  = data.aws_ssm_parameter.onesignal_api_id.value
+    ONESIGNAL_API_KEY = data.aws_ssm_parameter.onesignal_api_key.value
+    # Stripe
+    STRIPE_API_KEY        = data.aws_ssm_parameter.stripe_api_key.value
+    STRIPE_WEBHOOK_SECRET = data.aws_ssm_parameter.stripe_webhook_secret.value
+    # Frontend URL
+    FRONTEND_URL = var.frontend_url
+  }
+}
+
 resource "aws_apprunner_auto_scaling_configuration_version" "backend" {
   auto_scaling_configuration_name = "${var.app_name}-${var.environment}"
   min_size                        = 1
@@ -11,6 +58,16 @@ resource "aws_apprunner_service" "backend" {
     cpu    = "0.25 vCPU"
     memory = "0.5 GB"
   }
+  # liveness only, failing on a database outage would get the instances replaced,
+  # `/readyz` also checks the database and the migrations
+  health_check_configuration {
+    protocol            = "HTTP"
+    path                = "/healthz"
+    interval            = 10
+    timeout             = 2
+    healthy_threshold   = 1
+    unhealthy_threshold = 5
+  }
   source_configuration {
     auto_deployments_enabled = false
     authentication_configuration {
@@ -18,45 +75,8 @@ resource "aws_apprunner_service" "backend" {
     }
     image_repository {
       image_configuration {
-        port = "8000"
-        runtime_environment_variables = {
-          SECRET_KEY                  = data.aws_ssm_parameter.secret_key.value
-          TIME_ZONE                   = var.env_time_zone
-          ALLOWED_HOSTS               = jsonencode(var.env_allowed_hosts)
-          CSRF_TRUSTED_ORIGINS        = jsonencode(var.env_csrf_trusted_origins)
-          CORS_ALLOWED_ORIGINS        = jsonencode(var.env_cors_allowed_origins)
-          CORS_ALLOWED_ORIGIN_REGEXES = jsonencode(var.env_cors_allowed_origin_regexes)
-          PRODUCTION                  = var.env_production
-          SENTRY_DSN                  = data.aws_ssm_parameter.sentry_dsn.value
-          # Database
-          DATABASE_ENGINE   = var.env_database_engine
-          DATABASE_NAME     = data.aws_ssm_parameter.database_name.value
-          DATABASE_USER     = data.aws_ssm_parameter.database_user.value
-          DATABASE_PASSWORD = data.aws_ssm_parameter.database_password.value
-          DATABASE_HOST     = data.aws_ssm_parameter.database_host.value
-          DATABASE_PORT     = var.env_database_port
-          # Email
-          EMAIL_USE_SSL       = var.env_email_use_ssl
-          EMAIL_HOST          = data.aws_ssm_parameter.email_host.value
-          EMAIL_PORT          = var.env_email_port
-          EMAIL_HOST_USER     = data.aws_ssm_parameter.email_host_user.value
-          EMAIL_HOST_PASSWORD = data.aws_ssm_parameter.email_host_password.value
-          # S3
-          AWS_ACCESS_KEY_ID     = data.aws_ssm_parameter.aws_access_key_id.value
-          AWS_SECRET_ACCESS_KEY = data.aws_ssm_parameter.aws_secret_access_key.value
-          # Djoser
-          PASSWORD_RESET_CONFIRM_URL = var.env_password_reset_confirm_url
-          TEMPLATED_MAIL_DOMAIN      = local.env_templated_mail_domain
-          TEMPLATED_SITE_NAME        = var.env_templated_site_name
-          # OneSignal
-          ONESIGNAL_APP_ID  = data.aws_ssm_parameter.onesignal_api_id.value
-          ONESIGNAL_API_KEY = data.aws_ssm_parameter.onesignal_api_key.value
-          # Stripe
-          STRIPE_API_KEY        = data.aws_ssm_parameter.stripe_api_key.value
-          STRIPE_WEBHOOK_SECRET = data.aws_ssm_parameter.stripe_webhook_secret.value
-          # Frontend URL
-          FRONTEND_URL = var.frontend_url
-        }
+        port                          = "8000"
+        runtime_environment_variables = local.env_backend
       }
       image_repository_type = "ECR"
       image_identifier      = "${aws_ecr_repository.this.repository_url}:latest"
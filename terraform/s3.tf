@@ -4,3 +4,24 @@ resource "aws_s3_bucket" "prescription" {
     Name = "Prescription files"
   }
 }
+
+resource "aws_s3_bucket_lifecycle_configuration" "prescription" {
+  bucket = aws_s3_bucket.prescription.id
+
+  # the temporary objects of the uploads streamed to the bucket, see
+  # `S3MultipartUploadHandler`, left over by the requests that didn't complete, and
+  # the presigned uploads never confirmed, see `PrescriptionUploadConfirmView`
+  rule {
+    id     = "uploads"
+    status = "Enabled"
+    filter {
+      prefix = "prescriptions/uploads/"
+    }
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+    expiration {
+      days = 1
+    }
+  }
+}
@@ -105,6 +105,13 @@ variable "env_database_port" {
   default     = 5432
 }
 
+# shared by the App Runner instances and the workers, which the photo locks require
+variable "env_cache_backend" {
+  type        = string
+  description = "locmem, file, database (the `cache` table) or redis"
+  default     = "database"
+}
+
 variable "env_email_use_ssl" {
   type        = string
   description = "https://docs.djangoproject.com/en/4.2/ref/settings/#email-use-ssl"
@@ -154,6 +161,27 @@ variable "env_production" {
   default     = "true"
 }
 
+variable "env_sentry_traces_sample_rate" {
+  type        = number
+  description = "Share of the transactions traced by Sentry, unless a per path rate applies"
+  default     = 0.1
+}
+
+variable "env_sentry_traces_sample_rates" {
+  type        = map(number)
+  description = "Share of the transactions traced by Sentry per path regex, the first match applies"
+  default = {
+    "^/api/v1/payment/stripe/webhook/$"       = 1.0
+    "^/api/v1/(patient|prescription|nurse)/$" = 0.01
+  }
+}
+
+variable "env_sentry_profiles_sample_rate" {
+  type        = number
+  description = "Share of the traced transactions also profiled by Sentry"
+  default     = 0
+}
+
 variable "env_password_reset_confirm_url" {
   type    = string
   default = "reset/password/{uid}/{token}"
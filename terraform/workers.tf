@@ -0,0 +1,105 @@
+# the background workers, running the backend image with one management command each
+locals {
+  workers = {
+    photos        = ["process_prescription_photos", "--interval", "5"]
+    stripe-events = ["process_stripe_events", "--interval", "5"]
+  }
+}
+
+data "aws_vpc" "default" {
+  default = true
+}
+
+data "aws_subnets" "default" {
+  filter {
+    name   = "vpc-id"
+    values = [data.aws_vpc.default.id]
+  }
+}
+
+resource "aws_ecs_cluster" "workers" {
+  name = "${var.app_name}-workers-${var.environment}"
+}
+
+resource "aws_cloudwatch_log_group" "workers" {
+  name              = "/ecs/${var.app_name}-workers-${var.environment}"
+  retention_in_days = 30
+}
+
+resource "aws_iam_role" "workers_execution_role" {
+  name = "${var.app_name}-workers-execution-role-${var.environment}"
+  assume_role_policy = jsonencode({
+    "Version" : "2012-10-17",
+    "Statement" : [
+      {
+        "Action" : "sts:AssumeRole",
+        "Principal" : {
+          "Service" : [
+            "ecs-tasks.amazonaws.com",
+          ]
+        },
+        "Effect" : "Allow",
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "workers_execution_role" {
+  role       = aws_iam_role.workers_execution_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AmazonECSTaskExecutionRolePolicy"
+}
+
+# outbound only, to the database, S3 and the third party APIs
+resource "aws_security_group" "workers" {
+  name   = "${var.app_name}-workers-${var.environment}"
+  vpc_id = data.aws_vpc.default.id
+  egress {
+    from_port   = 0
+    to_port     = 0
+    protocol    = "-1"
+    cidr_blocks = ["0.0.0.0/0"]
+  }
+}
+
+resource "aws_ecs_task_definition" "workers" {
+  for_each                 = local.workers
+  family                   = "${var.app_name}-${each.key}-${var.environment}"
+  requires_compatibilities = ["FARGATE"]
+  network_mode             = "awsvpc"
+  cpu                      = 256
+  memory                   = 512
+  execution_role_arn       = aws_iam_role.workers_execution_role.arn
+  container_definitions = jsonencode([
+    {
+      name      = each.key
+      image     = "${aws_ecr_repository.this.repository_url}:latest"
+      essential = true
+      command   = concat(["/app/venv/bin/python", "src/manage.py"], each.value)
+      environment = [
+        for name, value in local.env_backend : { name = name, value = tostring(value) }
+      ]
+      logConfiguration = {
+        logDriver = "awslogs"
+        options = {
+          awslogs-group         = aws_cloudwatch_log_group.workers.name
+          awslogs-region        = var.aws_region
+          awslogs-stream-prefix = each.key
+        }
+      }
+    }
+  ])
+}
+
+resource "aws_ecs_service" "workers" {
+  for_each        = local.workers
+  name            = each.key
+  cluster         = aws_ecs_cluster.workers.id
+  task_definition = aws_ecs_task_definition.workers[each.key].arn
+  launch_type     = "FARGATE"
+  desired_count   = 1
+  network_configuration {
+    subnets          = data.aws_subnets.default.ids
+    security_groups  = [aws_security_group.workers.id]
+    assign_public_ip = true
+  }
+}